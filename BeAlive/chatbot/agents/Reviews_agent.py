@@ -1,12 +1,15 @@
 from typing import List
 from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables.base import Runnable
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_agent_prompt_template
 from BeAlive.chatbot.tools.review_users import ReviewUsersTool
 from BeAlive.chatbot.tools.review_activity import ReviewActivityTool
+from BeAlive.chatbot.agents.base import arun_agent, run_agent
+from BeAlive.data.tracing import traced
 
 
+@traced("agent")
 class ReviewsAgent(Runnable):
     """
     An agent responsible for managing reviews related to users and activities,
@@ -18,6 +21,9 @@ class ReviewsAgent(Runnable):
         The language model instance used for processing the queries.
     tools : List
         A list of tools that interact with the company database.
+    intent_tools : Dict[str, BaseTool]
+        The tool of every intent of the agent, called directly with the
+        fields of the RouteExtraction when they are complete.
     prompt : PromptTemplate
         The prompt template that defines the system and human inputs for the
         agent's interaction.
@@ -28,16 +34,22 @@ class ReviewsAgent(Runnable):
 
     Methods:
     -------
-    __init__(self, llm: ChatOpenAI):
+    __init__(self, llm=None):
         Initializes the agent with the provided language model and sets up the
         required tools and prompt template.
 
     invoke(self, inputs: dict, config=None, **kwargs):
         Executes the agent with the provided inputs and returns the output
         generated by the language model or an error message.
+
+    ainvoke(self, inputs: dict, config=None, **kwargs):
+        Asynchronous version of invoke.
     """
 
-    def __init__(self, llm: ChatOpenAI = ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo')):
+    # The answer when the agent fails.
+    error_message = "An error occurred while invoking the agent. Be more clear."
+
+    def __init__(self, llm=None):
         """
         Initializes the agent with the provided language model and sets up the
         required tools and prompt template.
@@ -49,10 +61,12 @@ class ReviewsAgent(Runnable):
 
         """
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         review_users = ReviewUsersTool()
         review_activity = ReviewActivityTool()
         self.tools: List = [review_users, review_activity]
+        self.intent_tools = {"review_user": review_users,
+                             "review_activity": review_activity}
 
         # Define the prompt template for product identification
         prompt_template = PromptTemplate(
@@ -96,13 +110,26 @@ class ReviewsAgent(Runnable):
             The output generated by the language model or an error message.
         """
 
-        try:
-            raw_response = self._agent_executor.invoke({
-                            "user_input": inputs["user_input"],
-                            "chat_history": []
-                            }, config)
+        return run_agent(self._agent_executor, inputs, config,
+                         self.error_message, self.intent_tools)
+
+    async def ainvoke(self, inputs: dict, config=None, **kwargs):
+        """
+        Asynchronously executes the agent with the provided inputs, the tools
+        run their asynchronous version.
 
-            return raw_response['output']
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user input.
+        config : dict, optional
+            Additional configuration parameters for the agent.
+
+        Returns:
+        -------
+        str
+            The output generated by the language model or an error message.
+        """
 
-        except:
-            return "An error occurred while invoking the agent. Be more clear."
+        return await arun_agent(self._agent_executor, inputs, config,
+                                self.error_message, self.intent_tools)
@@ -0,0 +1,138 @@
+from typing import Any, Dict, Mapping, Optional, Tuple
+from BeAlive.chatbot.session import current_user_id
+
+# The field of the RouteExtraction read for an argument of a tool, when it
+# is not the field with the same name. The check tools resolve the activity
+# from their user_input.
+EXTRACTION_FIELDS = {"user": "username", "user_input": "activity_name"}
+
+# The arguments of the tools filled with the user of the session.
+USER_ARGUMENTS = ("host_id", "user_id")
+
+
+def agent_inputs(inputs: dict) -> Dict[str, Any]:
+    """
+    The inputs of the AgentExecutor of an agent, from the inputs of the
+    chatbot. The history is left out, the route extract chain already
+    resolved it into the user input.
+
+    Parameters:
+    ----------
+    inputs : dict
+        The inputs given to the agent by the chatbot.
+
+    Returns:
+    -------
+    Dict[str, Any]
+        The inputs of the AgentExecutor.
+    """
+    return {"user_input": inputs["user_input"], "chat_history": []}
+
+
+def tool_arguments(tool, extraction) -> Optional[Dict[str, Any]]:
+    """
+    The arguments of a tool from the typed fields extracted by the
+    RouteExtractChain.
+
+    Parameters:
+    ----------
+    tool : BaseTool
+        The tool of the intent.
+    extraction : RouteExtraction
+        The intent and the fields extracted from the user input.
+
+    Returns:
+    -------
+    Dict[str, Any], optional
+        The arguments, None when a required one was not extracted.
+    """
+    arguments = {}
+    for name, field in tool.get_input_schema().model_fields.items():
+        if name in USER_ARGUMENTS:
+            if field.is_required():
+                arguments[name] = current_user_id()
+            continue
+
+        value = getattr(extraction, EXTRACTION_FIELDS.get(name, name), None)
+        if value is not None:
+            arguments[name] = value
+        elif field.is_required():
+            return None
+
+    return arguments
+
+
+def _tool_call(inputs: dict, intent_tools: Mapping[str, Any]
+               ) -> Tuple[Optional[Any], Optional[Dict[str, Any]]]:
+    """
+    The tool of the intent and its arguments, when the extraction has every
+    field the tool needs, or (None, None).
+    """
+    extraction = inputs.get("extraction")
+    tool = intent_tools.get(inputs.get("intention"))
+    if extraction is None or tool is None:
+        return None, None
+
+    arguments = tool_arguments(tool, extraction)
+    return (tool, arguments) if arguments is not None else (None, None)
+
+
+def run_agent(agent_executor, inputs: dict, config, error_message: str,
+              intent_tools: Optional[Mapping[str, Any]] = None) -> str:
+    """
+    Runs an agent and returns its output, or the error message of the agent
+    if it fails.
+
+    The intent was classified and its fields extracted by the
+    RouteExtractChain, so when they are complete the tool of the intent is
+    called directly with them. The LLM of the agent is only asked to choose
+    the tool and parse its arguments from the text otherwise.
+
+    Parameters:
+    ----------
+    agent_executor : AgentExecutor
+        The executor of the agent.
+    inputs : dict
+        The inputs given to the agent by the chatbot, with the intention and
+        the RouteExtraction.
+    config : dict, optional
+        Configuration parameters for the executor.
+    error_message : str
+        The answer when the agent fails.
+    intent_tools : Mapping[str, BaseTool], optional
+        The tool of every intent of the agent.
+
+    Returns:
+    -------
+    str
+        The output of the tool or of the agent, or the error message.
+    """
+    try:
+        tool, arguments = _tool_call(inputs, intent_tools or {})
+        if tool is not None:
+            return tool.invoke(arguments, config)
+
+        return agent_executor.invoke(agent_inputs(inputs), config)["output"]
+
+    except:
+        return error_message
+
+
+async def arun_agent(agent_executor, inputs: dict, config,
+                     error_message: str,
+                     intent_tools: Optional[Mapping[str, Any]] = None) -> str:
+    """
+    Asynchronous version of run_agent, the tools run their asynchronous
+    version.
+    """
+    try:
+        tool, arguments = _tool_call(inputs, intent_tools or {})
+        if tool is not None:
+            return await tool.ainvoke(arguments, config)
+
+        raw_response = await agent_executor.ainvoke(agent_inputs(inputs),
+                                                    config)
+        return raw_response["output"]
+
+    except:
+        return error_message
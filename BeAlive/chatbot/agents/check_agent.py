@@ -1,13 +1,16 @@
 from typing import List
 from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_openai import ChatOpenAI
 from langchain_core.runnables.base import Runnable
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_agent_prompt_template
 from BeAlive.chatbot.tools.check_activity_reservation import CheckActivityReservationTool
 from BeAlive.chatbot.tools.check_activity_reviews import CheckActivityReviewsTool
 from BeAlive.chatbot.tools.check_number_participants import CheckActivityNumberParticipantsTool
+from BeAlive.chatbot.agents.base import arun_agent, run_agent
+from BeAlive.data.tracing import traced
 
 
+@traced("agent")
 class CheckAgent(Runnable):
     """
     An agent responsible for interacting with a company database to answer
@@ -19,6 +22,9 @@ class CheckAgent(Runnable):
         The language model instance used for processing the queries.
     tools : List
         A list of tools that interact with the company database.
+    intent_tools : Dict[str, BaseTool]
+        The tool of every intent of the agent, called directly with the
+        fields of the RouteExtraction when they are complete.
     prompt : PromptTemplate
         The prompt template that defines the system and human inputs for the
         agent's interaction.
@@ -29,16 +35,22 @@ class CheckAgent(Runnable):
 
     Methods:
     -------
-    __init__(self, llm: ChatOpenAI):
+    __init__(self, llm=None):
         Initializes the agent with the provided language model and sets up the
         required tools and prompt template.
 
     invoke(self, inputs: dict, config=None, **kwargs):
         Executes the agent with the provided inputs and returns the output
         generated by the language model or an error message.
+
+    ainvoke(self, inputs: dict, config=None, **kwargs):
+        Asynchronous version of invoke.
     """
 
-    def __init__(self, llm: ChatOpenAI = ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo')):
+    # The answer when the agent fails.
+    error_message = "An error occurred."
+
+    def __init__(self, llm=None):
         """
         Initializes the agent with the provided language model
         and sets up the required tools.
@@ -50,13 +62,17 @@ class CheckAgent(Runnable):
 
         """
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         check_activity_reservations = CheckActivityReservationTool()
         check_activity_reviews = CheckActivityReviewsTool()
         check_activity_number_participants = CheckActivityNumberParticipantsTool()
         self.tools: List = [check_activity_reservations,
                             check_activity_reviews,
                             check_activity_number_participants]
+        self.intent_tools = {
+            "check_reservations": check_activity_reservations,
+            "check_reviews": check_activity_reviews,
+            "check_number_reservations": check_activity_number_participants}
 
         # Define the prompt template for product identification
         prompt_template = PromptTemplate(
@@ -105,12 +121,26 @@ class CheckAgent(Runnable):
 
         """
 
-        try:
-            raw_response = self._agent_executor.invoke({
-                            "user_input": inputs["user_input"],
-                            "chat_history": []
-                            }, config)
+        return run_agent(self._agent_executor, inputs, config,
+                         self.error_message, self.intent_tools)
+
+    async def ainvoke(self, inputs: dict, config=None, **kwargs):
+        """
+        Asynchronously executes the agent with the provided inputs, the tools
+        run their asynchronous version.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user input.
+        config : dict, optional
+            Additional configuration parameters for the agent.
+
+        Returns:
+        -------
+        str
+            The output generated by the language model or an error message.
+        """
 
-            return raw_response['output']
-        except:
-            return "An error occurred."
+        return await arun_agent(self._agent_executor, inputs, config,
+                                self.error_message, self.intent_tools)
@@ -1,16 +1,15 @@
 # Import necessary classes and modules for chatbot functionality
-from typing import Callable, Dict, Optional
-from langchain_openai import ChatOpenAI
+import asyncio
+import logging
+from typing import Callable, Dict, Iterator, Optional
 from langchain.memory import CombinedMemory, ConversationBufferWindowMemory, ConversationSummaryMemory
-from BeAlive.chatbot.agents.check_agent import CheckAgent
-from BeAlive.chatbot.agents.reservation_agent import ReservationAgent
-from BeAlive.chatbot.agents.Reviews_agent import ReviewsAgent
-from BeAlive.chatbot.chains.company_info import CompanyInfoChain
-from BeAlive.chatbot.chains.delete_activity import DeleteActivityChain
-from BeAlive.chatbot.chains.chit_chat import ChitChatChain
-from BeAlive.chatbot.chains.activity_search import ActivitySearchChain
-from BeAlive.chatbot.chains.router_chain import RouterChain
-from BeAlive.chatbot.chains.reasoning_chain import ReasoningChain
+from BeAlive.chatbot.memory import BackgroundSummaryMemory
+from BeAlive.chatbot.registry import (AGENT_INTENTS, CHAIN_INTENTS,
+                                      ComponentRegistry,
+                                      get_component_registry)
+from BeAlive.data.tracing import current_span, span, start_trace
+
+logger = logging.getLogger(__name__)
 
 # Falta mudar a memoria, o o unknown handler
 
@@ -22,25 +21,36 @@ class MainChatbot:
     Attributes:
     -----------
 
+    registry : ComponentRegistry
+        The registry that builds the chains and agents on their first use,
+        shared by every session of the process.
     llm : ChatOpenAI
         The language model used for generating responses.
     chat_memory : ConversationBufferWindowMemory
         The memory object that stores the conversation history.
     summary_memory : ConversationSummaryMemory
         The memory object that stores the summary of the conversation history.
+        With memory_mode="background" a BackgroundSummaryMemory that only
+        summarizes the interactions that leave the chat_memory window, in a
+        background worker.
     memory : CombinedMemory
         The combined memory object that combines the chat and summary memories.
-    chain_map : Dict[str, Callable[[Dict[str, str]], str]]
-        A dictionary mapping intent names to their corresponding reasoning and
+    chain_map : Mapping[str, Callable[[Dict[str, str]], str]]
+        A lazy mapping of intent names to their corresponding reasoning and
         response chains.
-    agent_map : Dict[str, Callable[[Dict[str, str]], str]]
-        A dictionary mapping agent names to their corresponding agents.
+    agent_map : Mapping[str, Callable[[Dict[str, str]], str]]
+        A lazy mapping of intent names to their corresponding agents, the
+        intents of an agent share one instance.
     intent_handler : Callable[[Dict[str, str]], str]
         A dictionary mapping intent names to their corresponding handlers.
+    last_trace : Trace
+        The trace of the last processed user input, its spans break down
+        the latency of the turn. None before the first one or when tracing
+        is disabled.
 
     Methods:
     --------
-    __init__()
+    __init__(memory_mode: str = "background", registry=None)
         Initializes the bot with session and language model configurations.
     clear_memory()
         Clears the memory of the bot.
@@ -90,50 +100,57 @@ class MainChatbot:
         response.
     process_user_input(user_input: Dict)
         Processes the user input and provides a response based on the intent.
+    stream_user_input(user_input: Dict)
+        Processes the user input and yields the response as it is generated.
+    aprocess_user_input(user_input: Dict)
+        Asynchronous version of process_user_input.
     """
 
-    def __init__(self):
+    def __init__(self, memory_mode: str = "background",
+                 registry: Optional[ComponentRegistry] = None):
         """
         Initialize the bot with session and language model configurations.
+        Only the memories belong to the session, the chains and agents are
+        built by the registry when an intent first needs them.
+
+        Parameters:
+        ----------
+            memory_mode: str
+                "background" to summarize only the interactions that leave
+                the window memory, off the request path, or "summary" to
+                summarize every interaction before returning.
+            registry: ComponentRegistry, optional
+                The registry of the chains and agents, by default the one
+                shared by the process.
         """
 
-        # Configure the language model with specific parameters for response generation
-        self.llm = ChatOpenAI(temperature=0.0, model="gpt-4o")
+        self.registry = registry or get_component_registry()
+
+        # The language model shared by the components
+        self.llm = self.registry.llm
 
         # Initialize the memory to manage session history
         self.chat_memory = ConversationBufferWindowMemory(return_messages=True, memory_key="buffer_history", k=4)
-        self.summary_memory = ConversationSummaryMemory(llm=self.llm,
-                                                        memory_key="summary")
+        if memory_mode == "background":
+            self.summary_memory = BackgroundSummaryMemory(llm=self.llm,
+                                                          memory_key="summary",
+                                                          k=self.chat_memory.k)
+        elif memory_mode == "summary":
+            self.summary_memory = ConversationSummaryMemory(llm=self.llm,
+                                                            memory_key="summary")
+        else:
+            raise ValueError(f"Unknown memory mode: {memory_mode}")
 
         self.memory = CombinedMemory(memories=[self.chat_memory,
                                                self.summary_memory])
 
-        # Map intent names to their corresponding reasoning and response chains
-
-        self.chain_map = {
-
-            "Reasoning": ReasoningChain(llm=self.llm),
-
-            "chitchat":  ChitChatChain(llm=self.llm),
-
-            "company_information": CompanyInfoChain(llm=self.llm, index_name = 'company-info-rag', embeding = 'text-embedding-3-small'),
+        # The trace of the last turn, for the debug view of the page
+        self.last_trace = None
 
-            "delete_activities":  DeleteActivityChain(llm=self.llm, index_name='activities', embeding = 'text-embedding-3-small'),
-
-            "activity_search":  ActivitySearchChain(llm=self.llm, index_name='activities', embeding = 'text-embedding-3-small'),
-
-            "router": RouterChain(llm=self.llm)}
-
-        self.agent_map = {
-            "review_user": ReviewsAgent(llm=self.llm),
-            "review_activity": ReviewsAgent(llm=self.llm),
-            "accept_reservation": ReservationAgent(llm=self.llm),
-            "reject_reservation": ReservationAgent(llm=self.llm),
-            "make_reservation": ReservationAgent(llm=self.llm),
-            "check_reservations":  CheckAgent(llm=self.llm),
-            "check_reviews": CheckAgent(llm=self.llm),
-            "check_number_reservations": CheckAgent(llm=self.llm),
-        }
+        # Map intent names to their corresponding reasoning and response
+        # chains and agents, built on their first use
+        self.chain_map = self.registry.intents(CHAIN_INTENTS)
+        self.agent_map = self.registry.intents(AGENT_INTENTS)
 
         # Map of intentions to their corresponding handlers
         self.intent_handlers: Dict[Optional[str], Callable[[Dict[str, str]], str]] = {
@@ -451,6 +468,88 @@ class MainChatbot:
 
         return response
 
+    def _turn_inputs(self, user_input: Dict[str, str]) -> Dict:
+        """
+        The inputs of the router: the user input and the chat history.
+        """
+        # Collect the information based on chat_history and current input.
+        return {"user_input": user_input["user_input"],
+                "chat_history": [self.memory.memories[1].load_memory_variables({}),
+                                 self.memory.memories[0].load_memory_variables({}),
+                                 ]}
+
+    @staticmethod
+    def _set_route(inputs: Dict, route: Dict, router_span=None):
+        """
+        Records the route of the local router on its span, and keeps its
+        intent for the route extract chain when it is confident.
+        """
+        if router_span is not None:
+            router_span.set(**route)
+        inputs["intention"] = (route["intent"] if route["source"] == "local"
+                               else None)
+
+    @staticmethod
+    def _set_extraction(inputs: Dict, route: Dict, extraction) -> Dict:
+        """
+        Completes the inputs of the chain or agent with the intent and the
+        fields extracted by the route extract chain.
+        """
+        logger.debug("Intent: %s | Route: %s", extraction.intent,
+                     route["source"])
+
+        # The agents call the tool of the intent with the typed fields, the
+        # text is the input of the chains and of the agents' fallback
+        inputs["intention"] = extraction.intent
+        inputs["extraction"] = extraction
+        inputs["user_input"] = extraction.to_text()
+
+        # The root span of the turn
+        turn = current_span()
+        if turn is not None:
+            turn.set(intent=extraction.intent)
+
+        return inputs
+
+    def _route_inputs(self, user_input: Dict[str, str]) -> Dict:
+        """
+        Classify the intention of the user input and extract its fields.
+
+        Parameters:
+        ----------
+            user_input: Dict[str, str]
+                The input text from the user.
+
+        Returns:
+        -------
+            The inputs of the chain or agent of the intention.
+        """
+        inputs = self._turn_inputs(user_input)
+
+        # Classify the user's intent locally (None if not confident)
+        with span("LocalRouterChain", "router") as router_span:
+            route = self.get_chain("router").route(inputs["user_input"])
+            self._set_route(inputs, route, router_span)
+
+        # Classify (if needed) and extract the fields in one LLM call
+        extraction = self.get_chain("route_extract").invoke(inputs)
+        return self._set_extraction(inputs, route, extraction)
+
+    async def _aroute_inputs(self, user_input: Dict[str, str]) -> Dict:
+        """
+        Asynchronous version of _route_inputs, the local router runs in a
+        worker thread.
+        """
+        inputs = self._turn_inputs(user_input)
+
+        with span("LocalRouterChain", "router") as router_span:
+            route = await asyncio.to_thread(self.get_chain("router").route,
+                                            inputs["user_input"])
+            self._set_route(inputs, route, router_span)
+
+        extraction = await self.get_chain("route_extract").ainvoke(inputs)
+        return self._set_extraction(inputs, route, extraction)
+
     def process_user_input(self, user_input: Dict[str, str]) -> str:
         """
         Process user input by routing through the appropriate
@@ -465,25 +564,77 @@ class MainChatbot:
         -------
             The content of the response after processing through the chains.
         """
-        # Collect the information based on chat_history and current input.
+        with start_trace("process_user_input") as trace:
+            self.last_trace = trace
+            inputs = self._route_inputs(user_input)
+
+            # Route the input based on the identified intention
+            handler = self.intent_handlers.get(inputs["intention"])
+
+            with span(f"handler {inputs['intention']}", "handler",
+                      intent=inputs["intention"]):
+                return handler(inputs)
+
+    def stream_user_input(self, user_input: Dict[str, str]) -> Iterator[str]:
+        """
+        Process user input by routing through the appropriate intention
+        pipeline and yield the response as it is generated.
+
+        The chitchat, company information and activity search chains stream
+        the tokens of their final LLM call, the other intentions yield their
+        response at once.
+
+        Parameters:
+        ----------
+            user_input: Dict[str, str]
+                The input text from the user.
 
-        inputs = {"user_input": user_input["user_input"],
-                  "chat_history": [self.memory.memories[1].load_memory_variables({}),
-                                   self.memory.memories[0].load_memory_variables({}),
-                                   ]}
+        Yields:
+        -------
+            The chunks of the response.
+        """
+        with start_trace("stream_user_input") as trace:
+            self.last_trace = trace
+            inputs = self._route_inputs(user_input)
 
-        # Classify the user's intent based on their input
-        user_intention = self.get_chain("router").invoke(inputs)
+            if inputs["intention"] in self.agent_map:
+                runnable = self.get_agent(inputs["intention"])
+            else:
+                runnable = self.get_chain(inputs["intention"])
 
-        print("Intent:", user_intention.intent)
+            with span(f"handler {inputs['intention']}", "handler",
+                      intent=inputs["intention"]):
+                yield from runnable.stream(inputs)
 
-        inputs["intention"] = user_intention.intent
+    async def aprocess_user_input(self, user_input: Dict[str, str]) -> str:
+        """
+        Asynchronously process user input by routing through the appropriate
+        intention pipeline. The local router runs in a worker thread and the
+        chains and agents are awaited, so the event loop is never blocked.
 
-        input_processed = self.get_chain("Reasoning").invoke(inputs)
+        Parameters:
+        ----------
+            user_input: Dict[str, str]
+                The input text from the user.
+
+        Returns:
+        -------
+            The content of the response after processing through the chains.
+        """
+        with start_trace("aprocess_user_input") as trace:
+            self.last_trace = trace
+            return await self._aprocess_user_input(user_input)
 
-        inputs["user_input"] = input_processed
+    async def _aprocess_user_input(self, user_input: Dict[str, str]) -> str:
+        """
+        The turn of aprocess_user_input, inside its trace.
+        """
+        inputs = await self._aroute_inputs(user_input)
+        intention = inputs["intention"]
 
         # Route the input based on the identified intention
-        handler = self.intent_handlers.get(user_intention.intent)
+        with span(f"handler {intention}", "handler", intent=intention):
+            if intention in self.agent_map:
+                return await self.get_agent(intention).ainvoke(inputs)
 
-        return handler(inputs)
+            return await self.get_chain(intention).ainvoke(inputs)
@@ -1,13 +1,16 @@
-import sqlite3
+import asyncio
 from datetime import datetime
-from pinecone import Pinecone
-import streamlit as st
+from typing import Iterator, Optional
 from langchain.schema.runnable.base import Runnable
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+from BeAlive.chatbot.session import current_user_id
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.activity_search_info import GetDesiredActivityInfoChain
-from BeAlive.chatbot.chains.process_query_output import QueryProcessingChain
+from BeAlive.chatbot.rendering import (QueryResult, arender_result,
+                                        render_result, stream_result)
 from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.data.connection import db_cursor
+from BeAlive.data.vector_store import get_vector_store
+from BeAlive.data.tracing import traced
 
 
 def format_request(age: int, interests: str, message: str) -> str:
@@ -33,6 +36,7 @@ def format_request(age: int, interests: str, message: str) -> str:
     )
 
 
+@traced()
 class ActivitySearchChain(Runnable):
     """
     A class to search for activities based on user input.
@@ -43,19 +47,15 @@ class ActivitySearchChain(Runnable):
         The function to get the path to the SQLite database.
     llm : ChatOpenAI
         The language model used to process user input and generate output.
-    pc : Pinecone
-        The Pinecone client.
-    index : Pinecone.Index
-        The Pinecone index.
     embedding : OpenAIEmbeddings
         The OpenAI embeddings model.
-    vectorstore : PineconeVectorStore
-        The vector store that holds and retrieves vectors from the Pinecone
-        index.
+    vectorstore : VectorStore
+        The vector store that holds and retrieves the vectors of the
+        activities (Pinecone or local, see get_vector_store).
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), db_path=func, index_name=str):
+    __init__(self, llm=None, db_path=func, index_name=str):
         Initializes the system with the specified language model, database
         path, and Pinecone index.
 
@@ -63,10 +63,16 @@ class ActivitySearchChain(Runnable):
         Processes the user's input, retrieves user data and activitys
         information, and returns recommended activities or an error message.
 
+    ainvoke(self, inputs: dict, config=None, user_id: int):
+        Asynchronous version of invoke.
+
+    stream(self, inputs: dict, config=None, user_id: int):
+        Yields the recommended activities token by token.
+
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  db_path=get_sqlite_database_path(),
                  index_name='activities',
                  embeding='text-embedding-3-small'
@@ -93,17 +99,107 @@ class ActivitySearchChain(Runnable):
         """
         super().__init__()
         self.db_path = db_path
-        self.llm = llm
+        self.llm = llm or get_chat_model()
+
+        # Set up the vector store of the index
+        self.vectorstore = get_vector_store(index_name, embeding)
+        self.embedding = self.vectorstore.embeddings
+
+    def _fetch_request_info(self, user_id: int, user_input: str):
+        """
+        Get the location of the user and the request for the vector search,
+        formatted with the age and interests of the user.
+        """
+        today = datetime.today().date()
+        with db_cursor(self.db_path) as cursor:
+            cursor.execute("""SELECT birthday, interests, location
+                              FROM users
+                              WHERE user_id = ?""",  (user_id,))
+            user_info = cursor.fetchone()
+            user_age = (today.year - datetime.strptime(user_info[0], '%Y-%m-%d').year)
+            return user_info[2], format_request(user_age, user_info[1], user_input)
+
+    def _fetch_open_activity_ids(self, city: str, date_range_start: str,
+                                 date_range_end: str) -> list:
+        """
+        Get the ids (as str, like the pinecone ids) of the open activities in
+        a city and date range.
+        """
+        with db_cursor(self.db_path) as cursor:
+            cursor.execute("""SELECT activity_id
+                            FROM activities
+                            WHERE city = ? and date_begin > ? and
+                            date_finish < ? and activity_state = 'open'""",
+                           (city, date_range_start, date_range_end))
+            return [str(res[0]) for res in cursor.fetchall()]
+
+    def _fetch_activities(self, recommended_ids: list) -> QueryResult:
+        """
+        Get the information of the recommended activities.
+        """
+        with db_cursor(self.db_path) as cursor:
+            aux = {1: '(?)', 2: '(?,?)', 3: '(?,?,?)'}
+            query = """SELECT activity_name, activity_description, location,
+                    number_participants, max_participants, city, date_begin,
+                    date_finish
+                    FROM activities
+                    WHERE activity_id IN """ + aux[len(recommended_ids)]
+            cursor.execute(query, (tuple(recommended_ids)))
+            return QueryResult.from_cursor(cursor)
+
+    def _get_retriever(self, id_list: list):
+        """
+        Configure the retriever with similarity search and score threshold,
+        filtered to the given activity ids.
+        """
+        return self.vectorstore.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={
+                "k": 3,
+                "filter": {"pinecone_id": {"$in": id_list}},
+                "score_threshold": 0.5
+                },
+        )
+
+    def _search(self, inputs: dict, config, user_id: int):
+        """
+        Retrieves the recommended activities, returns their rows or an error
+        message.
+        """
+        user_input = inputs['user_input']
+        activity_search_info = GetDesiredActivityInfoChain(self.llm).invoke({
+            'user_input': user_input},
+            config
+            )
+
+        try:
+            user_location, request_info = self._fetch_request_info(
+                user_id, user_input)
+        except:
+            return "There was a database error while obtaining your information"
+
+        city = (user_location if activity_search_info.city == 'None'
+                else activity_search_info.city)
+        try:
+            id_list = self._fetch_open_activity_ids(
+                city,
+                activity_search_info.date_range_start,
+                activity_search_info.date_range_end)
+            if len(id_list) == 0:
+                return "No activity was found with those characteristics"
+        except:
+            return "There was a database error while obtaining activities"
 
-        # Initialize Pinecone and set up the index
-        self.pc = Pinecone()
-        self.index = self.pc.Index(index_name)
+        retriever = self._get_retriever(id_list)
+        recommended_ids = [int(response.id) for response in retriever.invoke(request_info)]
 
-        self.embedding = OpenAIEmbeddings(model=embeding)
-        self.vectorstore = PineconeVectorStore(index=self.index, embedding=self.embedding)
+        try:
+            return self._fetch_activities(recommended_ids)
+        except:
+            return f"There was a database error while obtaining recommened activities."
 
     def invoke(self, inputs: dict, config=None,
-               user_id: int = st.session_state.user_id):
+               user_id: Optional[int] = None):
 
         """
         Retrieves user details from the database, checks for
@@ -127,104 +223,102 @@ class ActivitySearchChain(Runnable):
             Or an error message if any error occurs during execution.
 
         """
+        user_id = current_user_id(user_id)
+        search = self._search(inputs, config, user_id)
+        if isinstance(search, str):
+            return search
+
+        return render_result(search, "activity_search", llm=self.llm)
+
+    def stream(self, inputs: dict, config=None,
+               user_id: Optional[int] = None) -> Iterator[str]:
+
+        """
+        Retrieves the recommended activities and yields their description
+        token by token, as it is generated.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing user input data.
+        config : Optional
+            Configuration settings for the execution.
+        user_id : int
+            The unique identifier of the user.
+
+        Yields:
+        -------
+        str
+            The tokens of the recommended activities.
+            Or an error message if any error occurs during execution.
+
+        """
+        user_id = current_user_id(user_id)
+        search = self._search(inputs, config, user_id)
+        if isinstance(search, str):
+            yield search
+            return
+
+        yield from stream_result(search, "activity_search", llm=self.llm)
+
+    async def ainvoke(self, inputs: dict, config=None,
+                      user_id: Optional[int] = None):
+
+        """
+        Asynchronously retrieves the recommended activities. The database is
+        accessed in worker threads and the LLM and the vector store are
+        awaited.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing user input data.
+        config : Optional
+            Configuration settings for the execution.
+        user_id : int
+            The unique identifier of the user.
+
+        Returns:
+        -------
+        str
+            A string containing the recommended activities.
+            Or an error message if any error occurs during execution.
+
+        """
+        user_id = current_user_id(user_id)
         user_input = inputs['user_input']
-        today = datetime.today().date()
-        activity_search_info = GetDesiredActivityInfoChain(self.llm).invoke({
+        activity_search_info = await GetDesiredActivityInfoChain(self.llm).ainvoke({
             'user_input': user_input},
             config
             )
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""SELECT birthday, interests, location
-                              FROM users
-                              WHERE user_id = ?""",  (user_id,))
-            user_info = cursor.fetchone()
-            user_age = (today.year - datetime.strptime(user_info[0], '%Y-%m-%d').year)
-            request_info = format_request(user_age, user_info[1], user_input)
+            user_location, request_info = await asyncio.to_thread(
+                self._fetch_request_info, user_id, user_input)
         except:
             return "There was a database error while obtaining your information"
 
-        finally:
-            cursor.close()
-            conn.close()
-
-        if activity_search_info.city == 'None':
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-
-                cursor.execute("""SELECT activity_id
-                                FROM activities
-                                WHERE city = ? and date_begin > ? and
-                                date_finish < ? and activity_state = 'open'""",
-                               (user_info[2],
-                                activity_search_info.date_range_start,
-                                activity_search_info.date_range_end))
-                id_list = [str(res[0]) for res in cursor.fetchall()]
-                if len(id_list) == 0:
-                    return "No activity was found with those characteristics"
-            except:
-                return "There was a database error while obtaining activities"
-
-            finally:
-                cursor.close()
-                conn.close()
-
-        else:
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-
-                cursor.execute("""SELECT activity_id
-                                FROM activities
-                                WHERE city = ? and date_begin > ? and
-                               date_finish < ? and activity_state = 'open'""",
-                               (activity_search_info.city,
-                                activity_search_info.date_range_start,
-                                activity_search_info.date_range_end))
-                id_list = [str(res[0]) for res in cursor.fetchall()]
-                if len(id_list) == 0:
-                    return "No activity was found with those characteristics"
-            except:
-                return "There was a database error while obtaining activities"
-
-            finally:
-                cursor.close()
-                conn.close()
-
-        # Configure the retriever with similarity search and score threshold
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity_score_threshold",
-            search_kwargs={
-                "k": 3,
-                "filter": {"pinecone_id": {"$in": id_list}},
-                "score_threshold": 0.5
-                },
-        )
-        recommended_ids = [int(response.id) for response in retriever.invoke(request_info)]
+        city = (user_location if activity_search_info.city == 'None'
+                else activity_search_info.city)
+        try:
+            id_list = await asyncio.to_thread(
+                self._fetch_open_activity_ids,
+                city,
+                activity_search_info.date_range_start,
+                activity_search_info.date_range_end)
+            if len(id_list) == 0:
+                return "No activity was found with those characteristics"
+        except:
+            return "There was a database error while obtaining activities"
+
+        retriever = self._get_retriever(id_list)
+        recommended_ids = [int(response.id) for response in await retriever.ainvoke(request_info)]
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            aux = {1: '(?)', 2: '(?,?)', 3: '(?,?,?)'}
-            query = """SELECT activity_name, activity_description, location,
-                    number_participants, max_participants, city, date_begin,
-                    date_finish
-                    FROM activities
-                    WHERE activity_id IN """ + aux[len(recommended_ids)]
-            cursor.execute(query, (tuple(recommended_ids)))
-            recommended_activities = cursor.fetchall()
+            recommended_activities = await asyncio.to_thread(
+                self._fetch_activities, recommended_ids)
         except:
             return f"There was a database error while obtaining recommened activities."
 
-        finally:
-            cursor.close()
-            conn.close()
-
-        return QueryProcessingChain().invoke({
-                "user_input": str(recommended_activities),
-                "sql_query": query
-                })
+        return await arender_result(recommended_activities, "activity_search",
+                                    llm=self.llm)
@@ -2,8 +2,9 @@ from datetime import datetime
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable.base import Runnable
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class ActivitySearchInfo(BaseModel):
@@ -26,6 +27,7 @@ class ActivitySearchInfo(BaseModel):
     date_range_end: datetime
 
 
+@traced()
 class GetDesiredActivityInfoChain(Runnable):
 
     """
@@ -52,7 +54,7 @@ class GetDesiredActivityInfoChain(Runnable):
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), memory=False):
+    __init__(self, llm=None, memory=False):
         Initializes the chain by setting up the language model, prompt
         template, output parser, and format instructions.
 
@@ -60,9 +62,12 @@ class GetDesiredActivityInfoChain(Runnable):
         Executes the chain with the provided inputs, processes the user query,
         and returns the parsed activity search information.
 
+    ainvoke(self, inputs: dict, config=None, **kwargs):
+        Asynchronous version of invoke.
+
     """
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False):
 
         """
@@ -78,7 +83,7 @@ class GetDesiredActivityInfoChain(Runnable):
         """
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""You are part of the customer support team.
                 Your task is to identify if in the user has mentioned
@@ -144,3 +149,36 @@ class GetDesiredActivityInfoChain(Runnable):
             )
         except:
             return "Error during execution:"
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+
+        """
+        Asynchronously retrieves the desired activity search information from
+        the user's input.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        ActivitySearchInfo
+            The parsed activity search information.
+
+        """
+
+        try:
+            return await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "today": datetime.now(),
+                    "format_instructions": self.format_instructions
+                }, config
+            )
+        except:
+            return "Error during execution:"
@@ -1,7 +1,5 @@
-from datetime import datetime
-import sqlite3
-from pinecone import Pinecone
 from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.chatbot.services.lifecycle import sweep
 
 
 class UpdateActivitiesChain():
@@ -22,7 +20,8 @@ class UpdateActivitiesChain():
 
     UpdateActivities(self):
         Process the date and change the state of the activity to "finished" if
-        the date is in the past.
+        the date is in the past. Runs the lifecycle sweep on demand, it is
+        also run on a schedule by the LifecycleSweeper.
 
     """
 
@@ -53,50 +52,11 @@ class UpdateActivitiesChain():
 
         """
 
-        today = datetime.now()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
         try:
-            cursor.execute("""SELECT activity_id
-                              FROM activities
-                              WHERE (activity_state = 'open'
-                              or activity_state = 'full')
-                              AND date_finish < ?""", (today,))
-            finished_activities = [str(row[0]) for row in cursor.fetchall()]
-
-        except:
-            return "Error: Failed to retrieve finished activities."
-
-        finally:
-            cursor.close()
-            conn.close()
-
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
-            cursor.execute(""" UPDATE activities
-                           SET activity_state = 'finished', pinecone_id = NULL
-                           WHERE (activity_state = 'open'
-                           or activity_state = 'full')
-                           AND date_finish < ?""", (today,))
-            conn.commit()
+            # Incremental, and skipped when another process is sweeping
+            sweep(self.db_path)
 
         except:
             return "Error: Failed to update the activity state."
 
-        finally:
-            cursor.close()
-            conn.close()
-
-        try:
-            pinecone = Pinecone()
-            pinecone_index = pinecone.Index("activities")
-            if finished_activities:
-                pinecone_index.delete(ids=finished_activities)
-
-        except:
-            return "Error: Failed to remove finished activities."
-
         return "Activity state updated successfully."
@@ -1,8 +1,9 @@
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable.base import Runnable
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class ActivityID(BaseModel):
@@ -17,6 +18,7 @@ class ActivityID(BaseModel):
     activity_id: int
 
 
+@traced()
 class GetActivityIDChain(Runnable):
     """
     A chain for identifying the most similar activity name from a
@@ -39,7 +41,7 @@ class GetActivityIDChain(Runnable):
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), memory=False):
+    __init__(self, llm=None, memory=False):
         Initializes the GetActivityIDChain with the language model and memory
         settings.
 
@@ -48,9 +50,12 @@ class GetActivityIDChain(Runnable):
         activity name
         and return its ID.
 
+    ainvoke(self, inputs: dict):
+        Asynchronous version of invoke.
+
     """
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False):
 
         """
@@ -68,7 +73,7 @@ class GetActivityIDChain(Runnable):
 
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""You are part of the customer support team.
                 Your task is to identify the most similar 'activity_name' from
@@ -127,3 +132,30 @@ class GetActivityIDChain(Runnable):
             )
         except:
             return "Error during execution:"
+
+    async def ainvoke(self, inputs):
+        """
+        Asynchronously processes the user's input and activity list to find the
+        most similar activity name and return its ID.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input and the list of
+            activities.
+
+        Returns:
+        --------
+                The activity ID of the most similar activity name.
+        """
+
+        try:
+            return await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "activity_list": inputs["activity_list"],
+                    "format_instructions": self.format_instructions
+                }
+            )
+        except:
+            return "Error during execution:"
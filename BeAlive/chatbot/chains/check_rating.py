@@ -1,8 +1,9 @@
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable.base import Runnable
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class Rating(BaseModel):
@@ -17,6 +18,7 @@ class Rating(BaseModel):
     rating: int
 
 
+@traced()
 class GetRatingChain(Runnable):
     """
     A chain for identifying and extracting a rating from a
@@ -39,7 +41,7 @@ class GetRatingChain(Runnable):
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), memory=False):
+    __init__(self, llm=None, memory=False):
         Initializes the GetRatingChain with the language model and memory
         settings.
 
@@ -47,8 +49,11 @@ class GetRatingChain(Runnable):
         Processes the user's input to extract the rating from it and
         returns the parsed rating.
 
+    ainvoke(self, inputs: dict):
+        Asynchronous version of invoke.
+
     """
-    def __init__(self, llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+    def __init__(self, llm=None,
                  memory=False):
 
         """
@@ -66,7 +71,7 @@ class GetRatingChain(Runnable):
 
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""
             You are a part of the customer support team.
@@ -116,3 +121,53 @@ class GetRatingChain(Runnable):
             )
         except:
             return "Error during execution:"
+
+    async def ainvoke(self, inputs):
+        """
+        Asynchronously processes the user's input to extract the rating and
+        returns it.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input and the list of
+            activities.
+
+        Returns:
+        ----------
+        str
+            The extracted rating or an error message stating that
+            something went wrong.
+        """
+
+        try:
+            return await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "format_instructions": self.format_instructions
+                }
+            )
+        except:
+            return "Error during execution:"
+
+
+def resolve_rating(value) -> Rating:
+    """
+    Returns the rating as is when it is already an integer from 1 to 5, as
+    extracted by the RouteExtractChain, and only asks the GetRatingChain to
+    find it in the value otherwise.
+
+    Parameters:
+    ----------
+    value : int or str
+        The rating given to the tool.
+
+    Returns:
+    -------
+    Rating
+        The rating, -1 when there is none.
+    """
+    if isinstance(value, int) and 1 <= value <= 5:
+        return Rating(rating=value)
+
+    return GetRatingChain().invoke({"user_input": value})
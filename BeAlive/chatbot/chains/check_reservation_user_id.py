@@ -1,8 +1,9 @@
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable.base import Runnable
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class UserID(BaseModel):
@@ -17,6 +18,7 @@ class UserID(BaseModel):
     user_id: int
 
 
+@traced()
 class GetReservationUserIDChain(Runnable):
     """
     A chain for identifying and extracting the most similar user ID from
@@ -39,17 +41,20 @@ class GetReservationUserIDChain(Runnable):
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), memory=False):
+    __init__(self, llm=None, memory=False):
         Initializes the GetReservationUserIDChain with the language model and
         memory settings.
 
     invoke(self, inputs: dict):
         Processes the user's input and reservation list to find the most
         similar user ID and returns it.
+
+    ainvoke(self, inputs: dict):
+        Asynchronous version of invoke.
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False):
 
         """
@@ -67,7 +72,7 @@ class GetReservationUserIDChain(Runnable):
 
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""
             You are part of the customer support team.
@@ -125,4 +130,34 @@ class GetReservationUserIDChain(Runnable):
                 }
             )
         except:
-            return "Error during execution."
\ No newline at end of file
+            return "Error during execution."
+
+    async def ainvoke(self, inputs):
+
+        """
+        Asynchronously processes the user's input and reservation list to find
+        the most similar user ID and return it.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input and the list of
+            activities.
+
+        Returns:
+        -------
+        str
+            The extracted user ID or an error message stating that
+            something went wrong.
+        """
+
+        try:
+            return await self.chain.ainvoke(
+               {
+                    "user_input": inputs["user_input"],
+                    "reservation_list": inputs["reservation_list"],
+                    "format_instructions": self.format_instructions
+                }
+            )
+        except:
+            return "Error during execution."
@@ -1,8 +1,9 @@
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable.base import Runnable
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class Review(BaseModel):
@@ -16,6 +17,7 @@ class Review(BaseModel):
     review: str
 
 
+@traced()
 class GetReviewChain(Runnable):
     """
     A chain for identifying and extracting a review from a
@@ -38,7 +40,7 @@ class GetReviewChain(Runnable):
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), memory=False):
+    __init__(self, llm=None, memory=False):
         Initializes the GetReviewChain with the language model and memory
         settings.
 
@@ -46,8 +48,11 @@ class GetReviewChain(Runnable):
         Processes the user's input to extract the review from it and
         returns the parsed review.
 
+    ainvoke(self, inputs: dict):
+        Asynchronous version of invoke.
+
     """
-    def __init__(self, llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+    def __init__(self, llm=None,
                   memory=False):
         """
         Initializes the GetReviewChain with a language model and memory
@@ -63,7 +68,7 @@ class GetReviewChain(Runnable):
         """
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""
             Your task is to directly extract a review from the user input,
@@ -113,3 +118,30 @@ class GetReviewChain(Runnable):
 
         except:
             return "Error during execution:"
+
+    async def ainvoke(self, inputs):
+        """
+        Asynchronously processes the user's input to extract the review and
+        returns it.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+
+        Returns:
+        ----------
+        str
+            The extracted review or an error message stating that
+            something went wrong.
+        """
+        try:
+            return await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "format_instructions": self.format_instructions
+                }
+            )
+
+        except:
+            return "Error during execution:"
@@ -1,10 +1,13 @@
+from typing import Iterator
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain.schema.runnable.base import Runnable
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import (PromptTemplate,
                                          generate_prompt_templates)
+from BeAlive.data.tracing import traced
 
 
+@traced()
 class ChitChatChain(Runnable):
     """
     A chain for answering user inputs with a polite tone,
@@ -27,17 +30,23 @@ class ChitChatChain(Runnable):
 
     Methods:
     -------
-    __init__(self, llm=ChatOpenAI(), memory=False):
+    __init__(self, llm=None, memory=False):
         Initializes the ChitChatChain with the language model and memory
         settings.
 
     invoke(self, inputs, config=None, **kwargs):
         Processes the user's input and generates a polite
         response based on it.
+
+    ainvoke(self, inputs, config=None, **kwargs):
+        Asynchronous version of invoke.
+
+    stream(self, inputs, config=None, **kwargs):
+        Yields the response tokens as they are generated.
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False):
 
         """
@@ -55,7 +64,7 @@ class ChitChatChain(Runnable):
 
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
 
         prompt_template = PromptTemplate(
             system_template="""
@@ -103,3 +112,63 @@ class ChitChatChain(Runnable):
             )
         except:
             return "Error during execution:"
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+
+        """
+        Asynchronously processes the user's input and generates a polite
+        response to it.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        str
+            The response generated from the language model or an error message
+            stating that something went wrong.
+        """
+
+        try:
+            return await self.chain.ainvoke(
+                inputs,
+                config
+            )
+        except:
+            return "Error during execution:"
+
+    def stream(self, inputs, config=None, **kwargs) -> Iterator[str]:
+
+        """
+        Processes the user's input and yields the polite response token by
+        token, as it is generated by the language model.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Yields:
+        -------
+        str
+            The tokens of the response or an error message stating that
+            something went wrong.
+        """
+
+        try:
+            yield from self.chain.stream(
+                inputs,
+                config
+            )
+        except:
+            yield "Error during execution:"
@@ -1,13 +1,17 @@
+import time
+from typing import Iterator
 from langchain_core.output_parsers import StrOutputParser
 from langchain.schema.runnable.base import Runnable, RunnableLambda
 from langchain_core.runnables import RunnablePassthrough
-from pinecone import Pinecone
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import (PromptTemplate,
                                          generate_prompt_templates)
+from BeAlive.data.vector_store import get_vector_store
+from BeAlive.chatbot.services.answer_cache import get_answer_cache
+from BeAlive.data.tracing import traced
 
 
+@traced()
 class CompanyInfoChain(Runnable):
     """
     A chain for answering user inputs by retrieving relevant
@@ -27,23 +31,23 @@ class CompanyInfoChain(Runnable):
     chain : Runnable
         The chain combining the prompt, language model, and output parser to
         process inputs.
-    pc : Pinecone
-        An instance for interacting with the Pinecone vector database.
-    index : PineconeIndex
-        The Pinecone index used for retrieving company documents.
     embedding : OpenAIEmbeddings
         Embedding model used for generating document embeddings.
-    vectorstore : PineconeVectorStore
-        A store for indexing and retrieving documents based on embeddings.
+    vectorstore : VectorStore
+        A store for indexing and retrieving documents based on embeddings
+        (Pinecone or local, see get_vector_store).
     retriever : Retriever
         A component that searches similarity between documents.
     company_info : Runnable
         A sequence of actions to retrieve and format company information.
+    answer_cache : SemanticAnswerCache
+        The answers of similar questions, shared by the process (None when
+        disabled).
 
     Methods:
     -------
     __init__(self,
-                 llm=ChatOpenAI(),
+                 llm=None,
                  memory=False,
                  index_name='company-info-rag'):
         Initializes the ChitChatChain with the language model, memory
@@ -52,13 +56,20 @@ class CompanyInfoChain(Runnable):
     invoke(self, inputs: dict, config=None, **kwargs):
         Processes the user's input, retrieves relevant company information
         and generates a response.
+
+    ainvoke(self, inputs: dict, config=None, **kwargs):
+        Asynchronous version of invoke.
+
+    stream(self, inputs: dict, config=None, **kwargs):
+        Yields the response tokens as they are generated.
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False,
                  index_name='company-info-rag',
-                 embeding='text-embedding-3-small'):
+                 embeding='text-embedding-3-small',
+                 use_cache=True):
 
         """
         Initializes the ChitChatChain with the language model, memory
@@ -76,18 +87,22 @@ class CompanyInfoChain(Runnable):
              retrieve information.
         embeding : str
              The name of the embedding used.
+        use_cache : bool
+             Whether to reuse the answers of similar questions. The answers
+             depend on the chat history with memory, so they are only
+             cached without it.
         """
 
         super().__init__()
 
-        # Initialize Pinecone and set up the index
-        self.pc = Pinecone()
-        self.index = self.pc.Index(index_name)
+        self.llm = llm or get_chat_model()
 
-        self.llm = llm
+        # Set up the vector store of the index
+        self.vectorstore = get_vector_store(index_name, embeding)
+        self.embedding = self.vectorstore.embeddings
 
-        self.embedding = OpenAIEmbeddings(model=embeding)
-        self.vectorstore = PineconeVectorStore(index=self.index, embedding=self.embedding)
+        self.answer_cache = (get_answer_cache(index_name, self.embedding)
+                             if use_cache and not memory else None)
 
         # Configure the retriever with similarity search and score threshold
         self.retriever = self.vectorstore.as_retriever(
@@ -132,6 +147,69 @@ class CompanyInfoChain(Runnable):
             | StrOutputParser()  # Parses the output
         )
 
+    @staticmethod
+    def _question(inputs: dict) -> str:
+        """
+        The key of the answer cache: the question extracted by the route
+        extract chain, without the intention line of the user input.
+        """
+        extraction = inputs.get("extraction")
+        if extraction is not None and extraction.query:
+            return extraction.query
+        return inputs["user_input"]
+
+    def _lookup(self, question: str) -> tuple:
+        """
+        The cached answer of a similar question, None when there is none or
+        the cache fails, so the chain answers it, and the corpus version of
+        the cache, given back to _store.
+        """
+        if self.answer_cache is None:
+            return None, None
+        try:
+            answer = self.answer_cache.lookup(question)
+            return answer, self.answer_cache.version
+        except:
+            return None, None
+
+    async def _alookup(self, question: str) -> tuple:
+        """
+        Asynchronous version of _lookup.
+        """
+        if self.answer_cache is None:
+            return None, None
+        try:
+            answer = await self.answer_cache.alookup(question)
+            return answer, self.answer_cache.version
+        except:
+            return None, None
+
+    def _store(self, question: str, answer: str, start: float, version):
+        """
+        Caches the answer, a failure of the cache leaves the answer as is.
+        """
+        if self.answer_cache is None:
+            return
+        try:
+            self.answer_cache.store(question, answer,
+                                    time.perf_counter() - start, version)
+        except:
+            pass
+
+    async def _astore(self, question: str, answer: str, start: float,
+                      version):
+        """
+        Asynchronous version of _store.
+        """
+        if self.answer_cache is None:
+            return
+        try:
+            await self.answer_cache.astore(question, answer,
+                                           time.perf_counter() - start,
+                                           version)
+        except:
+            pass
+
     def invoke(self, inputs: dict, config=None, **kwargs) -> str:
 
         """
@@ -153,7 +231,90 @@ class CompanyInfoChain(Runnable):
             stating that something went wrong.
         """
 
+        question = self._question(inputs)
+        answer, version = self._lookup(question)
+        if answer is not None:
+            return answer
+
+        try:
+            start = time.perf_counter()
+            answer = self.chain.invoke(inputs, config)
+        except:
+            return "Error during execution:"
+
+        self._store(question, answer, start, version)
+        return answer
+
+    async def ainvoke(self, inputs: dict, config=None, **kwargs) -> str:
+
+        """
+        Asynchronously processes the user's input, retrieves relevant company
+        information and generates a response.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+            The response generated from the language model or an error message
+            stating that something went wrong.
+        """
+
+        question = self._question(inputs)
+        answer, version = await self._alookup(question)
+        if answer is not None:
+            return answer
+
         try:
-            return self.chain.invoke(inputs, config)
+            start = time.perf_counter()
+            answer = await self.chain.ainvoke(inputs, config)
         except:
             return "Error during execution:"
+
+        await self._astore(question, answer, start, version)
+        return answer
+
+    def stream(self, inputs: dict, config=None, **kwargs) -> Iterator[str]:
+
+        """
+        Processes the user's input, retrieves relevant company information
+        and yields the response token by token, as it is generated.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Yields:
+        -------
+            The tokens of the response or an error message stating that
+            something went wrong.
+        """
+
+        question = self._question(inputs)
+        answer, version = self._lookup(question)
+        if answer is not None:
+            yield answer
+            return
+
+        try:
+            start = time.perf_counter()
+            tokens = []
+            for token in self.chain.stream(inputs, config):
+                tokens.append(token)
+                yield token
+        except:
+            yield "Error during execution:"
+            return
+
+        self._store(question, "".join(tokens), start, version)
@@ -1,5 +1,10 @@
+from BeAlive.chatbot.session import current_user_id
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.data.connection import transaction
+from BeAlive.data.outbox import enqueue_upsert, notify_outbox
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 from langchain.schema.runnable.base import Runnable
 from langchain.output_parsers import PydanticOutputParser
@@ -10,12 +15,8 @@ from langchain.prompts import (
     HumanMessagePromptTemplate,
     PromptTemplate
 )
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.documents import Document
-import sqlite3
-import streamlit as st
-from pinecone import Index, Pinecone
-from langchain_pinecone import PineconeVectorStore
+import asyncio
+from BeAlive.data.tracing import traced
 
 
 class CreateActvityInput(BaseModel):
@@ -68,10 +69,13 @@ def format_activity(activity: CreateActvityInput) -> str:
     )
 
 
+@traced()
 class CreateActivityChain(Runnable):
     """
     A chain for processing user inputs, validating activity details and
-    saving them to a database and Pinecone vector store.
+    saving them to a database and Pinecone vector store. The vector is
+    written by the outbox worker, recorded in the transaction of the
+    activity.
 
     Attributes:
     ----------
@@ -93,7 +97,7 @@ class CreateActivityChain(Runnable):
     Methods:
     -------
     __init__(self,
-                 llm=ChatOpenAI(),
+                 llm=None,
                  db_path=get_sqlite_database_path()):
         Initializes the CreateActivityChain with the language model and
         database path.
@@ -102,12 +106,22 @@ class CreateActivityChain(Runnable):
         Processes the input content, validates activity details, saves them to
         the database and integrates them into Pinecone.
 
-    _store_activity_in_pinecone(self, parsed_output, act_id):
-        Stores the activity in Pinecone.
+    ainvoke(self, content: str) -> str:
+        Asynchronous version of invoke.
+
+    validate(parsed_output) -> Optional[str]:
+        Returns the error of the activity details, or None if they are
+        valid.
+
+    vector_text(self, parsed_output) -> str:
+        Transforms the activity into the text stored in Pinecone.
+
+    avector_text(self, parsed_output) -> str:
+        Asynchronous version of vector_text.
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  db_path=get_sqlite_database_path(),
                  ):
 
@@ -125,7 +139,7 @@ class CreateActivityChain(Runnable):
 
         """
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         self.db_path = db_path
 
         # Define the prompt template for translation
@@ -149,6 +163,67 @@ class CreateActivityChain(Runnable):
             pydantic_object=CreateActvityInput)
         self.input_chain = self.input_prompt | self.llm | self.output_parser
 
+    @staticmethod
+    def validate(parsed_output: CreateActvityInput) -> Optional[str]:
+        """
+        Validate the activity details, returns the error message or None if
+        the activity is valid. Also used by the bulk import.
+
+        Parameters:
+        ----------
+        parsed_output : CreateActvityInput
+            The parsed activity details.
+
+        Returns:
+        -------
+        str, optional
+            The error message shown to the user.
+        """
+        if parsed_output.max_participants == 0:
+            return """The maximum number of participants has been inserted
+            incorrectly, please fill the form again and re-submit it."""
+        if parsed_output.date_begin > parsed_output.date_finish:
+            return """The end date for the activity is before the start
+            date, please fill the form again and re-submit it."""
+        if datetime.now() > parsed_output.date_begin or datetime.now() > parsed_output.date_finish:
+            return """The start and/or end dates for the activity are set
+            to a date that has already passed, please fill the form again
+            and re-submit it."""
+        if len(parsed_output.activity_description) > 400:
+            return """The activity description exceeds the maximum limit of
+            400 characters, please fill the form again and re-submit it."""
+
+        return None
+
+    def _insert_activity(self, parsed_output: CreateActvityInput,
+                         page_content: str) -> int:
+        """
+        Save the activity to the database, linked to its Pinecone vector,
+        and record the upsert of the vector in the same transaction.
+        Returns its ID.
+        """
+        with transaction(self.db_path) as cursor:
+            cursor.execute(
+                """INSERT INTO activities
+                (host_id, activity_name, activity_description, location,
+                  city, max_participants, date_begin, date_finish)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (current_user_id(), parsed_output.activity_name,
+                 parsed_output.activity_description,
+                 parsed_output.location,
+                 parsed_output.city, parsed_output.max_participants,
+                 parsed_output.date_begin, parsed_output.date_finish),
+            )
+            act_id = int(cursor.lastrowid)
+
+            cursor.execute("""UPDATE activities SET pinecone_id = ?
+                            WHERE activity_id = ?""", (act_id, act_id))
+            enqueue_upsert(cursor, "activities", str(act_id), page_content,
+                           {"pinecone_id": str(act_id)})
+
+        notify_outbox()
+        return act_id
+
     def invoke(self, content: str) -> str:
         """
         Processes the input content and execute the activity creation logic.
@@ -170,67 +245,71 @@ class CreateActivityChain(Runnable):
             parsed_output = self.input_chain.invoke({"content": content})
 
             # Validation checks
-            if parsed_output.max_participants == 0:
-                return """The maximum number of participants has been inserted
-                incorrectly, please fill the form again and re-submit it."""
-            if parsed_output.date_begin > parsed_output.date_finish:
-                return """The end date for the activity is before the start
-                date, please fill the form again and re-submit it."""
-            if datetime.now() > parsed_output.date_begin or datetime.now() > parsed_output.date_finish:
-                return """The start and/or end dates for the activity are set
-                to a date that has already passed, please fill the form again
-                and re-submit it."""
-            if len(parsed_output.activity_description) > 400:
-                return """The activity description exceeds the maximum limit of
-                400 characters, please fill the form again and re-submit it."""
+            error = self.validate(parsed_output)
+            if error is not None:
+                return error
 
             # Save to database
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
             try:
-                cursor.execute(
-                    """INSERT INTO activities
-                    (host_id, activity_name, activity_description, location,
-                      city, max_participants, date_begin, date_finish)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (st.session_state.user_id, parsed_output.activity_name,
-                     parsed_output.activity_description,
-                     parsed_output.location,
-                     parsed_output.city, parsed_output.max_participants,
-                     parsed_output.date_begin, parsed_output.date_finish),
-                )
-                conn.commit()
-                act_id = int(cursor.lastrowid)
-
                 # Pinecone integration
-                self._store_activity_in_pinecone(parsed_output, act_id)
+                page_content = self.vector_text(parsed_output)
 
-                cursor.execute("""UPDATE activities SET pinecone_id = ?
-                                WHERE activity_id = ?""", (act_id, act_id))
-                conn.commit()
+                act_id = self._insert_activity(parsed_output, page_content)
 
             except:
                 return "An error occurred while saving the activity"
 
-            finally:
-                cursor.close()
-                conn.close()
-
             return f"""Activity created successfully, with ID: {act_id}, please remove the file uploaded by clicling the X"""
 
         except:
             return "An error occurred, resubmit againg with correct format"
 
-    def _store_activity_in_pinecone(self, parsed_output, act_id):
+    async def ainvoke(self, content: str) -> str:
         """
-        Store the activity details in Pinecone for vector search.
+        Asynchronously processes the input content and execute the activity
+        creation logic. The database is accessed in worker threads.
 
         Parameters:
         ----------
-        parsed_output : CreateActvityInput
-            The validated and parsed activity details.
-        act_id : int
-            The activity ID in the database.
+        content : str
+            The user's input describing the activity.
+
+        Returns:
+        -------
+        str
+            Either a success or error message, based on the outcome
+            of the operation.
+        """
+
+        try:
+            # Process the input through the chain
+            parsed_output = await self.input_chain.ainvoke({"content": content})
+
+            # Validation checks
+            error = self.validate(parsed_output)
+            if error is not None:
+                return error
+
+            # Save to database
+            try:
+                # Pinecone integration
+                page_content = await self.avector_text(parsed_output)
+
+                act_id = await asyncio.to_thread(self._insert_activity,
+                                                 parsed_output, page_content)
+
+            except:
+                return "An error occurred while saving the activity"
+
+            return f"""Activity created successfully, with ID: {act_id}, please remove the file uploaded by clicling the X"""
+
+        except:
+            return "An error occurred, resubmit againg with correct format"
+
+    def _pinecone_chain(self):
+        """
+        Chain that transforms the activity details into the text stored in
+        Pinecone.
         """
         pinecone_prompt_template = PromptTemplate(
             input_variables=["activity"],
@@ -242,17 +321,24 @@ class CreateActivityChain(Runnable):
 
             Human-Readable Text:"""
         )
-        pinecone_chain = (pinecone_prompt_template | self.llm | 
-                          StrOutputParser())
-        pc = Pinecone()
-        index: Index = pc.Index("activities")
-        vector_store = PineconeVectorStore(
-            index=index, embedding=OpenAIEmbeddings(
-                model="text-embedding-3-small")
-        )
+        return (pinecone_prompt_template | self.llm | StrOutputParser())
+
+    def vector_text(self, parsed_output: CreateActvityInput) -> str:
+        """
+        Transform the activity details into the text of its Pinecone vector.
+        Also used by the bulk import.
 
-        doc_activity = Document(page_content=pinecone_chain.invoke(
-            {"activity": format_activity(parsed_output)}),
-            metadata={"pinecone_id": str(act_id)})
+        Parameters:
+        ----------
+        parsed_output : CreateActvityInput
+            The validated and parsed activity details.
+        """
+        return self._pinecone_chain().invoke(
+            {"activity": format_activity(parsed_output)})
 
-        vector_store.add_documents(documents=[doc_activity], ids=[str(act_id)])
+    async def avector_text(self, parsed_output: CreateActvityInput) -> str:
+        """
+        Asynchronous version of vector_text.
+        """
+        return await self._pinecone_chain().ainvoke(
+            {"activity": format_activity(parsed_output)})
@@ -1,12 +1,13 @@
-import sqlite3
+import asyncio
 from pydantic import BaseModel
 from langchain.schema.runnable.base import Runnable
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-import streamlit as st
-from pinecone import Index, Pinecone
-from langchain_pinecone import PineconeVectorStore
+from BeAlive.chatbot.session import current_user_id
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor, transaction
+from BeAlive.data.outbox import enqueue_delete, notify_outbox
+from BeAlive.chatbot.resolvers.activity_index import aresolve_activity_id, resolve_activity_id
+from BeAlive.data.tracing import traced
 
 
 class DeleteActvityInput(BaseModel):
@@ -16,6 +17,7 @@ class DeleteActvityInput(BaseModel):
     activity_name: str
 
 
+@traced()
 class DeleteActivityChain(Runnable):
     """
 
@@ -45,13 +47,16 @@ class DeleteActivityChain(Runnable):
             Processes the input content, fetches the activity details, and
             executes the deletion logic.
 
-        _remove_activity_in_pinecone(act_id):
-            Deletes the specified activity's data from the Pinecone vector
-            database.
+        ainvoke(inputs, config=None, **kwargs):
+            Asynchronous version of invoke.
+
+        _delete_activity_rows(act_id):
+            Deletes the activity and its reservations, and records the
+            deletion of its Pinecone vector in the outbox.
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  db_path=get_sqlite_database_path(),
                  index_name='activities',
                  embeding='text-embedding-3-small'):
@@ -75,11 +80,48 @@ class DeleteActivityChain(Runnable):
         """
 
         super().__init__()
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         self.db_path = db_path
         self.index = index_name
         self.embedding = embeding
 
+    def _fetch_host_activities(self, host_id: int) -> list:
+        """
+        Get the (activity_id, activity_name) of the activities of the host
+        that did not finish.
+        """
+        with db_cursor(self.db_path) as cursor:
+            cursor.execute("""SELECT activity_id, activity_name
+                              FROM activities
+                              WHERE host_id = ? and activity_state != 'finished'""",  (host_id,))
+            return cursor.fetchall()
+
+    def _fetch_activity_state(self, act_id: int) -> str:
+        """
+        Get the state of an activity.
+        """
+        with db_cursor(self.db_path) as cursor:
+            cursor.execute("""SELECT activity_state
+                              FROM activities
+                              WHERE activity_id = ?""",  (act_id,))
+            return cursor.fetchone()[0]
+
+    def _delete_activity_rows(self, act_id: int):
+        """
+        Delete the activity and its reservations from the database, and
+        record the deletion of its Pinecone vector in the same transaction.
+        """
+        with transaction(self.db_path) as cursor:
+            cursor.execute("""DELETE FROM activities
+                            WHERE activity_id = ?""",
+                           (act_id,))
+            cursor.execute("""DELETE FROM reservations
+                           WHERE activity_id = ?""",
+                           (act_id,))
+            enqueue_delete(cursor, self.index, [str(act_id)])
+
+        notify_outbox()
+
     def invoke(self, inputs, config=None, **kwargs):
         """
         Process the input content and execute the activity removal logic.
@@ -100,46 +142,21 @@ class DeleteActivityChain(Runnable):
         """
 
         try:
-            host_id = st.session_state.user_id
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""SELECT activity_id, activity_name
-                              FROM activities
-                              WHERE host_id = ? and activity_state != 'finished'""",  (host_id,))
-            activity_list = cursor.fetchall()
-            activity_id = GetActivityIDChain().invoke({"user_input": inputs['user_input'],
-                                                       'activity_list': str(activity_list)
-                                                       })
+            host_id = current_user_id()
+            activity_list = self._fetch_host_activities(host_id)
+            activity_id = resolve_activity_id(inputs['user_input'], activity_list)
             if activity_id.activity_id == -1:
                 return "You have no activity with that name"
 
-            conn.close()
-
         except:
             return "Error: Failed to retrieve activity list."
 
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("""SELECT activity_state
-                              FROM activities
-                              WHERE activity_id = ?""",  (activity_id.activity_id,))
-            activity_state = cursor.fetchone()
+            activity_state = self._fetch_activity_state(activity_id.activity_id)
 
-            if not activity_state[0] == 'finished':
+            if not activity_state == 'finished':
 
-                self._remove_activity_in_pinecone(activity_id.activity_id)
-
-                cursor.execute("""DELETE FROM activities
-                                WHERE activity_id = ?""",
-                               (activity_id.activity_id,))
-                conn.commit()
-                cursor.execute("""DELETE FROM reservations
-                               WHERE activity_id = ?""",
-                               (activity_id.activity_id,))
-                conn.commit()
+                self._delete_activity_rows(activity_id.activity_id)
 
             else:
                 return "The activity already finished"
@@ -147,21 +164,52 @@ class DeleteActivityChain(Runnable):
         except:
             return "An error occurred while deleting the activity."
 
-        finally:
-            cursor.close()
-            conn.close()
-
         return "Activity removed successfully"
 
-    def _remove_activity_in_pinecone(self, act_id):
+    async def ainvoke(self, inputs, config=None, **kwargs):
         """
-        Delete the activity from Pinecone.
+        Asynchronously process the input content and execute the activity
+        removal logic. The database is accessed in worker threads.
+
+        Parameters:
+        ----------
+            inputs : dict
+                A dictionary containing the user input.
+            config : optional
+                Configuration settings for the chain.
+            **kwargs : dict
+                Additional keyword arguments.
+
+        Returns:
+        -------
+            str
+                A message indicating the result of the activity removal.
         """
 
-        pc = Pinecone()
-        index: Index = pc.Index(self.index)
-        vector_store = PineconeVectorStore(
-            index=index, embedding=OpenAIEmbeddings(model=self.embedding)
-        )
+        try:
+            host_id = current_user_id()
+            activity_list = await asyncio.to_thread(
+                self._fetch_host_activities, host_id)
+            activity_id = await aresolve_activity_id(inputs['user_input'], activity_list)
+            if activity_id.activity_id == -1:
+                return "You have no activity with that name"
+
+        except:
+            return "Error: Failed to retrieve activity list."
+
+        try:
+            activity_state = await asyncio.to_thread(
+                self._fetch_activity_state, activity_id.activity_id)
+
+            if not activity_state == 'finished':
+
+                await asyncio.to_thread(self._delete_activity_rows,
+                                        activity_id.activity_id)
 
-        vector_store.delete(ids=[str(act_id)])
+            else:
+                return "The activity already finished"
+
+        except:
+            return "An error occurred while deleting the activity."
+
+        return "Activity removed successfully"
@@ -1,8 +1,9 @@
 from langchain.output_parsers import PydanticOutputParser
 from langchain.schema.runnable.base import Runnable
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class Message(BaseModel):
@@ -12,6 +13,7 @@ class Message(BaseModel):
     message: str
 
 
+@traced()
 class GetActivityMessageChain(Runnable):
     """
      A chain for processing user input related to activity participation
@@ -43,8 +45,11 @@ class GetActivityMessageChain(Runnable):
         Processes the input content, extracts relevant information, and
         identifies the message in user input.
 
+    ainvoke(inputs, config=None, **kwargs)
+        Asynchronous version of invoke.
+
     """
-    def __init__(self, llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+    def __init__(self, llm=None,
                  memory=False):
 
         """
@@ -62,7 +67,7 @@ class GetActivityMessageChain(Runnable):
         """
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""You are part of the customer support team.
                 Your task is to identify the part of the user input that is a
@@ -112,4 +117,30 @@ class GetActivityMessageChain(Runnable):
                 }
             )
         except:
-            return f"Error during execution:"
\ No newline at end of file
+            return f"Error during execution:"
+
+    async def ainvoke(self, inputs):
+
+        """
+        Asynchronously processes the input content, extracts relevant
+        information, and identifies the message in user input.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user input.
+
+        Returns:
+            str
+                The response generated by the language model.
+        """
+
+        try:
+            return await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "format_instructions": self.format_instructions
+                }
+            )
+        except:
+            return f"Error during execution:"
@@ -0,0 +1,485 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain.schema.runnable.base import Runnable
+from BeAlive.chatbot.chains.router_chain import IntentClassification
+from BeAlive.data.tracing import traced
+
+# Folder with the labelled synthetic intentions and the cached embeddings.
+ROUTER_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "router")
+UTTERANCES_PATH = os.path.join(ROUTER_DIR, "synthetic_intetions.json")
+
+# Default encoder used in train_evaluate_router.ipynb (HuggingFaceEncoder).
+DEFAULT_ENCODER = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Default route threshold of the semantic_router HuggingFaceEncoder, the
+# value that performed best in the notebook ("better with no optimization").
+# Only used until a threshold is tuned for the encoder.
+DEFAULT_THRESHOLD = 0.5
+
+# The threshold tuned on a held-out split by
+# `python -m BeAlive.chatbot.router.tune_threshold`, with its encoder.
+THRESHOLD_PATH = os.path.join(ROUTER_DIR, "router_threshold.json")
+
+
+def load_utterances(path: str = UTTERANCES_PATH) -> Tuple[List[str],
+                                                          List[str]]:
+    """
+    Load the labelled messages. Messages labelled 'None' are mapped to the
+    chitchat intent, as in the router notebook.
+
+    Parameters:
+    ----------
+    path : str
+        Path to the JSON file with the labelled messages.
+
+    Returns:
+    -------
+    Tuple[List[str], List[str]]
+        The messages and their intents.
+    """
+    with open(path, "r") as file:
+        data = json.load(file)
+
+    messages = [item["Message"] for item in data]
+    labels = ["chitchat" if item["Intention"] == "None"
+              else item["Intention"] for item in data]
+
+    return messages, labels
+
+
+def split_utterances(messages: List[str], labels: List[str],
+                     test_size: float = 0.1, seed: int = 0
+                     ) -> Tuple[Tuple[List[str], List[str]],
+                                Tuple[List[str], List[str]]]:
+    """
+    Split the labelled messages into a train and a held-out test set,
+    stratified by intent like the 90/10 split of the router notebook. The
+    repeated messages are kept once, so no held-out message is in the train
+    set.
+
+    Parameters:
+    ----------
+    messages : List[str]
+        The labelled messages.
+    labels : List[str]
+        The intents of the messages.
+    test_size : float
+        The share of the messages of every intent held out.
+    seed : int
+        The seed of the shuffle.
+
+    Returns:
+    -------
+    Tuple
+        The (messages, labels) of the train set and of the test set.
+    """
+    by_label = defaultdict(dict)
+    for message, label in zip(messages, labels):
+        by_label[label][message] = None
+
+    rng = random.Random(seed)
+    train, test = ([], []), ([], [])
+    for label in sorted(by_label):
+        group = list(by_label[label])
+        rng.shuffle(group)
+        held_out = min(len(group) - 1, max(1, round(len(group) * test_size)))
+        for i, message in enumerate(group):
+            split = test if i < held_out else train
+            split[0].append(message)
+            split[1].append(label)
+
+    return train, test
+
+
+def load_threshold(encoder_name: str,
+                   path: str = THRESHOLD_PATH) -> Optional[float]:
+    """
+    Returns the threshold tuned for an encoder, or None if it was not tuned.
+
+    Parameters:
+    ----------
+    encoder_name : str
+        The name of the encoder.
+    path : str
+        Path to the JSON file written by the tuning script.
+
+    Returns:
+    -------
+    float, optional
+        The tuned threshold.
+    """
+    try:
+        with open(path, "r") as file:
+            tuned = json.load(file)
+    except (OSError, ValueError):
+        return None
+
+    if tuned.get("encoder") != encoder_name:
+        return None
+    return float(tuned["threshold"])
+
+
+@traced()
+class LocalRouterChain(Runnable):
+    """
+    A chain that classifies the user intent locally by comparing the
+    embedding of the user input with the embeddings of the labelled
+    synthetic intentions. When it is not confident enough the intent is left
+    to the RouteExtractChain, which classifies it in the LLM call that
+    extracts the fields.
+
+    The embeddings of the labelled messages are computed once, cached on
+    disk and kept in memory as a padded matrix of shape
+    (n_intents, max_messages_per_intent, embedding_dim), so a query is scored
+    against every intent with a single matrix product.
+
+    Attributes:
+    ----------
+    encoder : HuggingFaceEncoder
+        The encoder used to embed the labelled messages and the user input.
+    threshold : float
+        The minimum intent score to trust the local classification, tuned
+        on a held-out split of the labelled messages.
+    min_margin : float
+        The minimum difference between the best and the second best intent
+        scores to trust the local classification.
+    top_k : int
+        The number of most similar messages averaged per intent.
+    intents : List[str]
+        The intents, in the same order as the rows of the intent matrix.
+
+    Methods:
+    -------
+    __init__(self, encoder=None, ...):
+        Loads the labelled messages and builds the intent embedding matrix.
+
+    score(self, text: str) -> np.ndarray:
+        Returns the score of the text for every intent.
+
+    classify(self, text: str) -> Tuple[str, float, float]:
+        Returns the best intent, its score and the margin to the second one.
+
+    route(self, text: str) -> Dict:
+        Returns the best intent, its score and margin, and whether it is
+        trusted locally.
+
+    predict(self, text: str) -> Optional[str]:
+        Returns the intent if the local classification is confident.
+
+    tune_threshold(self, messages, labels, target_precision=0.95) -> float:
+        Chooses the lowest threshold whose accepted predictions reach the
+        target precision on a labelled set.
+
+    invoke(self, inputs, config=None, **kwargs):
+        Returns the best local intent of the user input.
+
+    ainvoke(self, inputs, config=None, **kwargs):
+        Asynchronous version of invoke.
+    """
+
+    def __init__(self,
+                 encoder=None,
+                 utterances_path: str = UTTERANCES_PATH,
+                 threshold: Optional[float] = None,
+                 min_margin: float = 0.02,
+                 top_k: int = 5,
+                 cache_dir: Optional[str] = ROUTER_DIR,
+                 utterances: Optional[Tuple[List[str], List[str]]] = None):
+        """
+        Loads the labelled messages and builds the intent embedding matrix.
+
+        Parameters:
+        ----------
+        encoder : optional
+            Callable that maps a list of texts to a list of embeddings. By
+            default the HuggingFaceEncoder used in the router notebook.
+        utterances_path : str
+            Path to the JSON file with the labelled messages.
+        threshold : float, optional
+            The minimum intent score to trust the local classification. By
+            default the threshold tuned for the encoder (THRESHOLD_PATH), or
+            DEFAULT_THRESHOLD if it was not tuned.
+        min_margin : float
+            The minimum difference between the two best intent scores.
+        top_k : int
+            The number of most similar messages averaged per intent.
+        cache_dir : str, optional
+            Folder where the embeddings of the labelled messages are cached.
+            If None the embeddings are not cached on disk.
+        utterances : Tuple[List[str], List[str]], optional
+            The labelled messages and their intents, instead of the ones of
+            utterances_path (for example the train split of the tuning).
+        """
+        super().__init__()
+
+        self.min_margin = min_margin
+        self.top_k = top_k
+
+        if encoder is None:
+            from semantic_router.encoders import HuggingFaceEncoder
+            encoder = HuggingFaceEncoder(name=DEFAULT_ENCODER)
+        self.encoder = encoder
+
+        if threshold is None:
+            threshold = load_threshold(self.encoder_name)
+        self.threshold = (DEFAULT_THRESHOLD if threshold is None
+                          else threshold)
+
+        messages, labels = utterances or load_utterances(utterances_path)
+        embeddings = self._load_embeddings(messages, labels, cache_dir)
+        self._build_index(embeddings, labels)
+
+    @property
+    def encoder_name(self) -> str:
+        """
+        The name of the encoder, the key of the tuned threshold and of the
+        cached embeddings.
+        """
+        return str(getattr(self.encoder, "name", ""))
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed the texts and normalize them to unit length.
+        """
+        vectors = np.asarray(self.encoder(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _load_embeddings(self, messages: List[str], labels: List[str],
+                         cache_dir: Optional[str]) -> np.ndarray:
+        """
+        Load the embeddings of the labelled messages from the disk cache, or
+        compute and cache them if the messages or the encoder changed.
+        """
+        if cache_dir is None:
+            return self._embed(messages)
+
+        digest = hashlib.sha256(json.dumps([messages, labels]).encode())
+        digest.update(self.encoder_name.encode())
+        cache_path = os.path.join(
+            cache_dir, f"router_embeddings_{digest.hexdigest()[:16]}.npy")
+
+        if os.path.exists(cache_path):
+            return np.load(cache_path)
+
+        embeddings = self._embed(messages)
+        try:
+            np.save(cache_path, embeddings)
+        except OSError:
+            pass
+
+        return embeddings
+
+    def _build_index(self, embeddings: np.ndarray, labels: List[str]):
+        """
+        Group the embeddings by intent into a padded matrix of shape
+        (n_intents, max_messages_per_intent, embedding_dim).
+        """
+        self.intents = sorted(set(labels))
+        labels_array = np.asarray(labels)
+        groups = [embeddings[labels_array == intent] for intent in self.intents]
+
+        self.counts = np.array([len(group) for group in groups])
+        max_count = int(self.counts.max())
+
+        self.intent_matrix = np.zeros(
+            (len(self.intents), max_count, embeddings.shape[1]),
+            dtype=np.float32)
+        self.mask = np.zeros((len(self.intents), max_count), dtype=bool)
+        for i, group in enumerate(groups):
+            self.intent_matrix[i, :len(group)] = group
+            self.mask[i, :len(group)] = True
+
+    def _score_vectors(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Score normalized query embeddings (n_queries, dim) against every
+        intent, averaging the top_k cosine similarities of each intent.
+        """
+        similarities = np.einsum("imd,qd->qim", self.intent_matrix, queries)
+        similarities = np.where(self.mask, similarities, -np.inf)
+
+        k = min(self.top_k, similarities.shape[2])
+        top = np.sort(similarities, axis=2)[:, :, -k:]
+        top = np.where(np.isfinite(top), top, 0.0)
+
+        return top.sum(axis=2) / np.minimum(self.counts, k)
+
+    def score(self, text: str) -> np.ndarray:
+        """
+        Returns the score of the text for every intent, in the order of
+        `self.intents`.
+
+        Parameters:
+        ----------
+        text : str
+            The user input.
+
+        Returns:
+        -------
+        np.ndarray
+            The score of every intent.
+        """
+        return self._score_vectors(self._embed([text]))[0]
+
+    def classify(self, text: str) -> Tuple[str, float, float]:
+        """
+        Returns the best intent, its score and the margin to the second best
+        intent.
+
+        Parameters:
+        ----------
+        text : str
+            The user input.
+
+        Returns:
+        -------
+        Tuple[str, float, float]
+            The intent, the score and the margin.
+        """
+        scores = self.score(text)
+        order = np.argsort(scores)[::-1]
+        best, second = scores[order[0]], scores[order[1]]
+        return self.intents[order[0]], float(best), float(best - second)
+
+    def tune_threshold(self,
+                       messages: List[str],
+                       labels: List[str],
+                       target_precision: float = 0.95) -> float:
+        """
+        Chooses the lowest threshold whose accepted predictions reach the
+        target precision on a labelled set held out from the messages of the
+        router (see split_utterances), so the LLM is only called when needed.
+        The predictions whose margin is below min_margin are never accepted
+        and are left out of the sweep. When no threshold reaches the target
+        precision, the threshold is infinite: every message is left to the
+        LLM.
+
+        Parameters:
+        ----------
+        messages : List[str]
+            The labelled messages.
+        labels : List[str]
+            The intents of the messages ('None' is read as chitchat).
+        target_precision : float
+            The minimum accuracy of the messages routed locally.
+
+        Returns:
+        -------
+        float
+            The selected threshold, also stored in `self.threshold`, or inf
+            when the target precision is not reached.
+        """
+        labels = ["chitchat" if label in ("None", None) else label
+                  for label in labels]
+        scores = self._score_vectors(self._embed(messages))
+
+        predicted = np.asarray(self.intents)[scores.argmax(axis=1)]
+        ranked = np.sort(scores, axis=1)
+        best = ranked[:, -1]
+        correct = predicted == np.asarray(labels)
+
+        accepted = best - ranked[:, -2] >= self.min_margin
+        best, correct = best[accepted], correct[accepted]
+
+        # Sweep the thresholds from the highest to the lowest score
+        order = np.argsort(best)[::-1]
+        precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+
+        valid = np.nonzero(precision >= target_precision)[0]
+        self.threshold = (float(best[order][valid[-1]]) if len(valid) > 0
+                          else float("inf"))
+
+        return self.threshold
+
+    def predict(self, text: str) -> Optional[str]:
+        """
+        Returns the local intent of the text if the classification is
+        confident, or None when the intent should be decided by an LLM.
+
+        Parameters:
+        ----------
+        text : str
+            The user input.
+
+        Returns:
+        -------
+        str, optional
+            The confident intent or None.
+        """
+        route = self.route(text)
+        return route["intent"] if route["source"] == "local" else None
+
+    def route(self, text: str) -> Dict:
+        """
+        Classify the text. The router is shared by the sessions, so the
+        route is returned to the caller instead of being kept on the
+        router.
+
+        Parameters:
+        ----------
+        text : str
+            The user input.
+
+        Returns:
+        -------
+        Dict
+            The intent, its score and margin, and the source: 'local' when
+            the classification is confident, 'llm' otherwise.
+        """
+        intent, score, margin = self.classify(text)
+        confident = score >= self.threshold and margin >= self.min_margin
+        return {"intent": intent, "score": score, "margin": margin,
+                "source": "local" if confident else "llm"}
+
+    def invoke(self, inputs, config=None, **kwargs) -> IntentClassification:
+        """
+        Returns the best local intent of the user input, even when the
+        classification is not confident. Use route or predict to know
+        whether it can be trusted.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input and chat history.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        IntentClassification
+            The classified intent as a structured object.
+        """
+        intent, _, _ = self.classify(inputs["user_input"])
+        return IntentClassification(intent=intent)
+
+    async def ainvoke(self, inputs, config=None,
+                      **kwargs) -> IntentClassification:
+        """
+        Asynchronous version of invoke, the local classification runs in a
+        worker thread to not block the event loop.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input and chat history.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        IntentClassification
+            The classified intent as a structured object.
+        """
+        intent, _, _ = await asyncio.to_thread(self.classify,
+                                               inputs["user_input"])
+        return IntentClassification(intent=intent)
@@ -1,12 +1,17 @@
+from typing import Iterator
 from langchain_core.output_parsers.string import StrOutputParser
 from langchain.schema.runnable.base import Runnable
-from langchain_openai import ChatOpenAI
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
+@traced()
 class QueryProcessingChain(Runnable):
     """
-    Processes the output of the SQL query and generates a response to the user.
+    Rewrites the Markdown rendered from the results of a SQL query in a more
+    conversational tone. The optional polish step of rendering.render_result,
+    off by default.
 
     Attributes:
     ----------
@@ -24,12 +29,17 @@ class QueryProcessingChain(Runnable):
         and memory.
 
     invoke(inputs, config=None, **kwargs)
-        Processes the output of the SQL query and generates a response to the
-        user.
+        Rewrites the rendered results of a SQL query.
+
+    ainvoke(inputs, config=None, **kwargs)
+        Asynchronous version of invoke.
+
+    stream(inputs, config=None, **kwargs)
+        Yields the response tokens as they are generated.
 
     """
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False):
 
         """
@@ -46,22 +56,16 @@ class QueryProcessingChain(Runnable):
         """
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""
-            From the string which is the result of the
-            {sql_query} sqlite3 query create
-            a list of elements grouped by activity with the relevant
-            information displayed for each element,
-            in a human interpretable format. In case the input contains
-            only an activity name and a number, create a sentence
-            informing the host of the number of participants in their activity.
-            If the input is in the form [(activity_name, username),...]
-            don't infer the activity host.
-            Have the name as the title and then the different elements as
-            bullet points. Put the title and field titles in bold.
+            You are given the results of a query of the BeAlive database,
+            already formatted in Markdown. Rewrite them for the user in a
+            friendly tone, keeping every element, name, number and date
+            exactly as given and keeping the Markdown lists, with the
+            titles and field titles in bold. Don't add any information.
             """,
-            human_template="User Query: {user_input}",
+            human_template="Results: {user_input}",
         )
 
         self.prompt = generate_prompt_templates(prompt_template, memory)
@@ -72,13 +76,34 @@ class QueryProcessingChain(Runnable):
     def invoke(self, inputs):
 
         """
-        Processes the output of the SQL query and generates a response to the
-        user.
+        Rewrites the rendered results of a SQL query.
+
+        Parameters:
+        ----------
+        inputs: dict
+            A dictionary with the rendered results as the user input.
+
+        Returns:
+        ----------
+                The response generated by the language model.
+
+        """
+
+        try:
+            return self.chain.invoke({"user_input": inputs["user_input"]})
+        except:
+            # The rendered results are still a complete answer
+            return inputs["user_input"]
+
+    async def ainvoke(self, inputs):
+
+        """
+        Asynchronously rewrites the rendered results of a SQL query.
 
         Parameters:
         ----------
         inputs: dict
-            A dictionary containing the user input and the SQL query.
+            A dictionary with the rendered results as the user input.
 
         Returns:
         ----------
@@ -87,9 +112,28 @@ class QueryProcessingChain(Runnable):
         """
 
         try:
-            return self.chain.invoke({
-                    "user_input": inputs["user_input"],
-                    "sql_query": inputs["sql_query"]
-                    })
+            return await self.chain.ainvoke({"user_input": inputs["user_input"]})
+        except:
+            return inputs["user_input"]
+
+    def stream(self, inputs, config=None, **kwargs) -> Iterator[str]:
+
+        """
+        Rewrites the rendered results of a SQL query and yields the response
+        token by token, as it is generated.
+
+        Parameters:
+        ----------
+        inputs: dict
+            A dictionary with the rendered results as the user input.
+
+        Yields:
+        ----------
+                The tokens of the response generated by the language model.
+
+        """
+
+        try:
+            yield from self.chain.stream({"user_input": inputs["user_input"]})
         except:
-            return "Error during execution:"
+            yield inputs["user_input"]
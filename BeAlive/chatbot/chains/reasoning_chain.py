@@ -1,9 +1,11 @@
-from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain.schema.runnable.base import Runnable
+from BeAlive.chatbot.llm import get_chat_model
+from BeAlive.data.tracing import traced
 
 
+@traced()
 class ReasoningChain(Runnable):
     """
     A chain to extract specific fields from user input, chat history, and user
@@ -29,9 +31,12 @@ class ReasoningChain(Runnable):
             Initializes the ReasoningChain with a language model.
         invoke(inputs, config=None, **kwargs)
             Processes inputs to extract and structure required information.
+
+        ainvoke(inputs, config=None, **kwargs)
+            Asynchronous version of invoke.
     """
 
-    def __init__(self, llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo')):
+    def __init__(self, llm=None):
         """
         Initialize the ReasoningChain with a language model.
 
@@ -42,7 +47,7 @@ class ReasoningChain(Runnable):
         """
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
 
         self.prompt = PromptTemplate(
                 input_variables=["user_input",
@@ -168,3 +173,17 @@ class ReasoningChain(Runnable):
         """
 
         return self.chain.invoke(inputs, config)
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        """
+        Asynchronously processes the input data using the defined chain.
+
+        Parameters:
+        ----------
+            inputs : dict
+                The input data to be processed.
+            config : dict, optional
+                Configuration settings for the chain.
+        """
+
+        return await self.chain.ainvoke(inputs, config)
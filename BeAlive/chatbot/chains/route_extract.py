@@ -0,0 +1,301 @@
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+from langchain.schema.runnable.base import Runnable
+from langchain.output_parsers import PydanticOutputParser
+from BeAlive.chatbot.llm import get_chat_model
+from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
+
+
+class RouteExtraction(BaseModel):
+    """
+    Represents the intent of the user query together with the fields
+    extracted for that intent.
+
+    Attributes:
+    ----------
+        intent : Literal
+            The classified intent of the user query.
+        query : str, optional
+            The question (company_information), the search request
+            (activity_search) or the statement paired with its answer from
+            the history (chitchat).
+        activity_name : str, optional
+            The name of the activity.
+        username : str, optional
+            The username of the participant.
+        rating : int, optional
+            The 1 to 5 rating.
+        review : str, optional
+            The review about the activity or the participant.
+        message : str, optional
+            The message left with a reservation.
+        page : int, optional
+            The page of the reservations or reviews asked for, from 1.
+    """
+
+    intent: Literal["company_information",
+                    "delete_activities",
+                    "activity_search",
+                    "review_user",
+                    "review_activity",
+                    "make_reservation",
+                    "accept_reservation",
+                    "reject_reservation",
+                    "check_reservations",
+                    "check_reviews",
+                    "check_number_reservations",
+                    "chitchat"] = Field(
+        ...,
+        description="The classified intent of the user query",
+    )
+    query: Optional[str] = Field(
+        None,
+        description="""The question about the company (company_information),
+        the request with city and dates (activity_search) or the statement
+        paired with its answer from the history (chitchat)""",
+    )
+    activity_name: Optional[str] = Field(
+        None, description="The name of the activity")
+    username: Optional[str] = Field(
+        None, description="The username of the participant")
+    rating: Optional[int] = Field(
+        None, description="The 1 to 5 rating, if given")
+    review: Optional[str] = Field(
+        None, description="The review about the activity or participant")
+    message: Optional[str] = Field(
+        None, description="The message left with the reservation")
+    page: Optional[int] = Field(
+        None, description="The page of the results asked for, if given")
+
+    def to_text(self) -> str:
+        """
+        Render the extraction in the plain text format produced by the
+        ReasoningChain, which is what the chains and agents expect as input.
+
+        Returns:
+        -------
+        str
+            The extracted fields, one per line.
+        """
+        lines = [f"Intention: {self.intent}"]
+        if self.query:
+            lines.append(self.query)
+        if self.review:
+            lines.append(f"Review: {self.review}")
+        if self.username:
+            lines.append(f"Username: {self.username}")
+        if self.rating is not None:
+            lines.append(f"Rating: {self.rating}")
+        if self.activity_name:
+            lines.append(f"Activity name: {self.activity_name}")
+        if self.message:
+            lines.append(f"Message: {self.message}")
+        if self.page is not None:
+            lines.append(f"Page: {self.page}")
+
+        return "\n".join(lines)
+
+
+@traced()
+class RouteExtractChain(Runnable):
+    """
+    A chain that classifies the user intent and extracts the fields needed
+    by that intent in a single LLM call, replacing the RouterChain followed
+    by the ReasoningChain.
+
+    Attributes:
+    ----------
+    llm : ChatOpenAI
+        The language model used for natural language processing.
+    prompt : PromptTemplate
+        The template used for constructing the system and human prompts for
+        the language model.
+    output_parser : PydanticOutputParser
+        A parser to validate and format the output into a RouteExtraction.
+    chain : Runnable
+        The chain combining the prompt, language model, and output parser to
+        process inputs.
+
+    Methods:
+    -------
+    __init__(self, llm=None, memory=False):
+        Initializes the RouteExtractChain with a language model and memory
+        settings.
+
+    invoke(self, inputs, config=None, **kwargs):
+        Classifies the intent (unless already given) and extracts its fields.
+
+    ainvoke(self, inputs, config=None, **kwargs):
+        Asynchronous version of invoke.
+    """
+
+    def __init__(self,
+                 llm=None,
+                 memory=False):
+        """
+        Initializes the RouteExtractChain with a language model and memory
+        settings.
+
+        Parameters:
+        ----------
+        llm : ChatOpenAI
+            The language model used for natural language processing.
+        memory : bool
+            Whether or not to use memory for the language model.
+        """
+        super().__init__()
+
+        self.llm = llm or get_chat_model()
+        prompt_template = PromptTemplate(
+            system_template="""
+            You are an expert classifier of user intentions and data
+            extractor for the BeAlive activity recommendation platform.
+            Your role is to identify the user's intent based on their query
+            and the conversation history, and to extract the fields needed
+            by that intent.
+
+            Intention already identified: {intention}
+            If an intention is already identified use it, otherwise classify
+            the query into one of the intents below.
+
+            1. **company_information:** The user wants information about the
+            company, its chatbot or webpage.
+            Fields: query (the question, e.g. 'What is your refund policy?').
+
+            2. **delete_activities:** The user wants to delete an activity.
+            Fields: activity_name.
+
+            3. **activity_search:** The user wants to find an activity that
+            matches their interests, maybe in a city or time period.
+            Fields: query (the request combined with the city and dates, e.g.
+            'I want to do a fun activity in Lisbon on February 12th').
+
+            4. **review_user:** The host wants to review a participant of an
+            activity. Fields: review, username, rating, activity_name.
+
+            5. **review_activity:** The user wants to review an activity they
+            took part in. Fields: review, activity_name, rating.
+
+            6. **make_reservation:** The user wants to reserve a spot in an
+            activity. Fields: activity_name, message.
+
+            7. **accept_reservation:** The host wants to accept a user's
+            reservation. Fields: username, activity_name.
+
+            8. **reject_reservation:** The host wants to reject or decline a
+            user's reservation. Fields: username, activity_name.
+
+            9. **check_reservations:** The host wants to check the
+            reservations or participants of an activity.
+            Fields: activity_name, page (e.g. 2 for 'show me page 2').
+
+            10. **check_reviews:** The host wants to check the reviews of an
+            activity. Fields: activity_name, page.
+
+            11. **check_number_reservations:** The host wants to know how many
+            reservations or spots left an activity has.
+            Fields: activity_name.
+
+            12. **chitchat:** Small talk not related to the platform. Use it
+            when any other option is incorrect.
+            Fields: query (the question or statement of the user paired with
+            its answer, if found in the history).
+
+            Key Notes:
+            - Extract only the fields of the chosen intention, leave the
+            others empty. Never invent values, leave missing fields empty.
+            - Consider as first priority the user input, if you cannot find
+            something there, use the conversation history.
+
+            **Input:**
+
+            - User Input: {user_input}
+            - Conversation History: {chat_history}
+
+            **Output Format:**
+
+            - Follow the specified output format:
+            {format_instructions}
+            """,
+            human_template="User Query: {user_input}",
+        )
+
+        self.prompt = generate_prompt_templates(prompt_template, memory=memory)
+
+        self.output_parser = PydanticOutputParser(
+            pydantic_object=RouteExtraction)
+        self.format_instructions = self.output_parser.get_format_instructions()
+        self.chain = (self.prompt | self.llm | self.output_parser)
+
+    def invoke(self, inputs, config=None, **kwargs) -> RouteExtraction:
+        """
+        Classifies the intent of the user query (unless it is already given
+        in inputs["intention"]) and extracts its fields.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input, the chat history and
+            optionally the intention identified by the local router.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        RouteExtraction
+            The intent and its fields as a structured object.
+        """
+        intention = inputs.get("intention")
+
+        extraction = self.chain.invoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "chat_history": inputs["chat_history"],
+                    "intention": intention or "None",
+                    "format_instructions": self.format_instructions,
+                }, config
+            )
+
+        if intention:
+            extraction.intent = intention
+
+        return extraction
+
+    async def ainvoke(self, inputs, config=None, **kwargs) -> RouteExtraction:
+        """
+        Asynchronously classifies the intent of the user query (unless it is
+        already given in inputs["intention"]) and extracts its fields.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input, the chat history and
+            optionally the intention identified by the local router.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        RouteExtraction
+            The intent and its fields as a structured object.
+        """
+        intention = inputs.get("intention")
+
+        extraction = await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "chat_history": inputs["chat_history"],
+                    "intention": intention or "None",
+                    "format_instructions": self.format_instructions,
+                }, config
+            )
+
+        if intention:
+            extraction.intent = intention
+
+        return extraction
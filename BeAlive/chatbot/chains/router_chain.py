@@ -1,9 +1,10 @@
 from pydantic import Field, BaseModel
 from typing import Literal
-from langchain_openai import ChatOpenAI
 from langchain.schema.runnable.base import Runnable
 from langchain.output_parsers import PydanticOutputParser
+from BeAlive.chatbot.llm import get_chat_model
 from BeAlive.chatbot.chains.base import PromptTemplate, generate_prompt_templates
+from BeAlive.data.tracing import traced
 
 
 class IntentClassification(BaseModel):
@@ -33,6 +34,7 @@ class IntentClassification(BaseModel):
     )
 
 
+@traced()
 class RouterChain(Runnable):
     """
     A chain for processing user inputs and classifying intents using an LLM.
@@ -55,7 +57,7 @@ class RouterChain(Runnable):
     Methods:
     -------
     __init__(self,
-                    llm=ChatOpenAI(),
+                    llm=None,
                     memory = False):
         Initializes the RouterChain with a language model and memory
         settings.
@@ -63,10 +65,13 @@ class RouterChain(Runnable):
     invoke(self, inputs, config=None, **kwargs):
         Processes the user query, classifies the intent and resturns it in
         a structures way.
+
+    ainvoke(self, inputs, config=None, **kwargs):
+        Asynchronous version of invoke.
     """
 
     def __init__(self,
-                 llm=ChatOpenAI(temperature=0.0, model='gpt-3.5-turbo'),
+                 llm=None,
                  memory=False):
         """
         Initializes the RouterChain with a language model and memory
@@ -83,7 +88,7 @@ class RouterChain(Runnable):
         """
         super().__init__()
 
-        self.llm = llm
+        self.llm = llm or get_chat_model()
         prompt_template = PromptTemplate(
             system_template="""
             You are an expert classifier of user intentions for the BeAlive
@@ -229,3 +234,31 @@ class RouterChain(Runnable):
                     "format_instructions": self.format_instructions,
                 }, config
             )
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        """
+        Asynchronously processes the user query, classifies the intent and
+        returns it in a structures way.
+
+        Parameters:
+        ----------
+        inputs : dict
+            A dictionary containing the user's input.
+        config : optional
+            Configuration settings for the chain.
+        **kwargs :
+            Additional keyword arguments.
+
+        Returns:
+        -------
+        IntentClassification
+            The classified intent as a structured object.
+        """
+
+        return await self.chain.ainvoke(
+                {
+                    "user_input": inputs["user_input"],
+                    "chat_history": inputs["chat_history"],
+                    "format_instructions": self.format_instructions,
+                }, config
+            )
@@ -1,7 +1,7 @@
-import sqlite3
-import streamlit as st
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.process_query_output import QueryProcessingChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.rendering import QueryResult, render_result
 
 
 class ShowReservationChain():
@@ -45,11 +45,8 @@ class ShowReservationChain():
                 a message if there are no reservations pending.
         """
 
-        host_id = st.session_state.user_id
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        try:
+        host_id = current_user_id()
+        with db_cursor(self.db_path) as cursor:
             query = """SELECT a.activity_name, u.username, u.cumulative_rating,
                               u.phone_number, u.email, r.message
                         FROM reservations r join activities a join users u
@@ -59,15 +56,9 @@ class ShowReservationChain():
                               r.state = 'pending' """
 
             cursor.execute(query, (host_id,))
-            reservations = cursor.fetchall()
+            reservations = QueryResult.from_cursor(cursor)
             if len(reservations) == 0:
                 return "You currently have no reservations pending to accept or reject"
 
-        finally:
-            cursor.close()
-            conn.close()
-
-        return QueryProcessingChain().invoke({
-                "user_input": str(reservations),
-                "sql_query": query
-                })
+        # Rendered without an LLM call, it is shown when the user logs in
+        return render_result(reservations, "pending_reservations")
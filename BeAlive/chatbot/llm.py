@@ -0,0 +1,60 @@
+import threading
+from typing import Dict, Tuple
+
+# The model of the chains and agents built without a language model.
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+_models: Dict[Tuple[str, float], object] = {}
+_models_lock = threading.Lock()
+
+
+def get_chat_model(model: str = DEFAULT_MODEL, temperature: float = 0.0):
+    """
+    Returns the chat model of the process for a model and temperature,
+    created on the first call. The chains share it instead of creating a
+    client each, and langchain_openai is only imported when it is needed.
+
+    Parameters:
+    ----------
+        model : str
+            The name of the OpenAI model.
+        temperature : float
+            The sampling temperature.
+
+    Returns:
+    -------
+        ChatOpenAI
+            The shared chat model.
+    """
+    key = (model, temperature)
+    llm = _models.get(key)
+    if llm is not None:
+        return llm
+
+    with _models_lock:
+        llm = _models.get(key)
+        if llm is None:
+            from langchain_openai import ChatOpenAI
+            llm = _models[key] = ChatOpenAI(temperature=temperature,
+                                            model=model)
+
+    return llm
+
+
+def set_chat_model(llm, model: str = DEFAULT_MODEL, temperature: float = 0.0):
+    """
+    Replaces the chat model of the process for a model and temperature, e.g.
+    with a local stand-in for the benchmarks. The chains created afterwards
+    without a language model use it.
+
+    Parameters:
+    ----------
+        llm : BaseChatModel
+            The chat model.
+        model : str
+            The name of the OpenAI model it replaces.
+        temperature : float
+            The sampling temperature it replaces.
+    """
+    with _models_lock:
+        _models[(model, temperature)] = llm
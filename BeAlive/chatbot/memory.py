@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from pydantic import PrivateAttr
+from langchain.memory import ConversationSummaryMemory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+# Workers shared by the memories of every session, the summaries of one
+# session are still computed in order (see BackgroundSummaryMemory).
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=4,
+                                       thread_name_prefix="summary-memory")
+
+
+def _idle_event() -> threading.Event:
+    """
+    Create an event that starts set, as nothing is being summarized yet.
+    """
+    event = threading.Event()
+    event.set()
+    return event
+
+
+class BackgroundSummaryMemory(ConversationSummaryMemory):
+    """
+    A conversation summary memory that only summarizes the interactions
+    that fall out of the last `k` interactions (the ones already kept by the
+    ConversationBufferWindowMemory), and does it in a background worker.
+
+    Saving an interaction never waits for the LLM, and reading the memory
+    returns the last summary that was completed.
+
+    Attributes:
+    ----------
+    k : int
+        The number of interactions kept by the window memory, these are not
+        summarized yet.
+    buffer : str
+        The last completed summary.
+
+    Methods:
+    -------
+    save_context(inputs, outputs)
+        Saves an interaction and schedules the summary of the interactions
+        that left the window.
+    wait(timeout=None)
+        Blocks until the pending summaries are completed.
+    clear()
+        Deletes the summary and the pending interactions.
+    """
+
+    k: int = 4
+
+    _window: List[List[BaseMessage]] = PrivateAttr(default_factory=list)
+    _pending: List[BaseMessage] = PrivateAttr(default_factory=list)
+    _running: bool = PrivateAttr(default=False)
+    _generation: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _idle: Any = PrivateAttr(default_factory=_idle_event)
+
+    def save_context(self, inputs: Dict[str, Any],
+                     outputs: Dict[str, str]) -> None:
+        """
+        Save an interaction and, if an interaction left the window of the
+        last `k`, schedule its summary in the background.
+
+        Parameters:
+        ----------
+        inputs : Dict[str, Any]
+            The user message, e.g. {"input": message}.
+        outputs : Dict[str, str]
+            The chatbot response, e.g. {"output": respond}.
+        """
+        input_str, output_str = self._get_input_output(inputs, outputs)
+        turn = [HumanMessage(content=input_str), AIMessage(content=output_str)]
+
+        with self._lock:
+            self._window.append(turn)
+            if len(self._window) <= self.k:
+                return
+
+            self._pending.extend(self._window.pop(0))
+            if self._running:
+                return
+            self._running = True
+            self._idle.clear()
+
+        _SUMMARY_EXECUTOR.submit(self._summarize_pending)
+
+    def _summarize_pending(self) -> None:
+        """
+        Summarize the pending interactions into the current summary until
+        there is nothing left, one batch at a time.
+        """
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    self._idle.set()
+                    return
+                messages, self._pending = self._pending, []
+                generation, summary = self._generation, self.buffer
+
+            try:
+                new_summary = self.predict_new_summary(messages, summary)
+            except Exception as e:
+                print(f"Failed to summarize the conversation: {e}")
+                with self._lock:
+                    # Keep the messages for the next interaction
+                    if generation == self._generation:
+                        self._pending = messages + self._pending
+                    self._running = False
+                    self._idle.set()
+                return
+
+            with self._lock:
+                # Discard the summary if the memory was cleared meanwhile
+                if generation == self._generation:
+                    self.buffer = new_summary
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Block until the pending summaries are completed.
+
+        Parameters:
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait.
+
+        Returns:
+        -------
+        bool
+            True if there is no summary running.
+        """
+        return self._idle.wait(timeout)
+
+    def clear(self) -> None:
+        """
+        Delete the summary and the pending interactions.
+        """
+        with self._lock:
+            super().clear()
+            self._window = []
+            self._pending = []
+            self._generation += 1
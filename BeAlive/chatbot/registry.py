@@ -0,0 +1,208 @@
+import importlib
+import threading
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+from BeAlive.chatbot.llm import get_chat_model
+from BeAlive.data.tracing import span
+
+
+class ComponentSpec(NamedTuple):
+    """
+    How to build a component of the chatbot.
+
+    Attributes:
+    ----------
+        module : str
+            The module of the class, imported on the first use.
+        cls : str
+            The name of the class.
+        kwargs : dict
+            The arguments of the class, besides the llm.
+        uses_llm : bool
+            Whether the shared llm is passed to the class.
+    """
+
+    module: str
+    cls: str
+    kwargs: dict = {}
+    uses_llm: bool = True
+
+
+# The components shared by every session. They keep no state of a session:
+# the user is read from st.session_state and the history is passed in the
+# inputs of every call.
+COMPONENTS: Dict[str, ComponentSpec] = {
+    "route_extract": ComponentSpec("BeAlive.chatbot.chains.route_extract",
+                                   "RouteExtractChain"),
+    "router": ComponentSpec("BeAlive.chatbot.chains.local_router",
+                            "LocalRouterChain", uses_llm=False),
+    "chitchat": ComponentSpec("BeAlive.chatbot.chains.chit_chat",
+                              "ChitChatChain"),
+    "company_information": ComponentSpec(
+        "BeAlive.chatbot.chains.company_info", "CompanyInfoChain",
+        {"index_name": "company-info-rag",
+         "embeding": "text-embedding-3-small"}),
+    "delete_activities": ComponentSpec(
+        "BeAlive.chatbot.chains.delete_activity", "DeleteActivityChain",
+        {"index_name": "activities", "embeding": "text-embedding-3-small"}),
+    "activity_search": ComponentSpec(
+        "BeAlive.chatbot.chains.activity_search", "ActivitySearchChain",
+        {"index_name": "activities", "embeding": "text-embedding-3-small"}),
+    "reviews_agent": ComponentSpec("BeAlive.chatbot.agents.Reviews_agent",
+                                   "ReviewsAgent"),
+    "reservation_agent": ComponentSpec(
+        "BeAlive.chatbot.agents.reservation_agent", "ReservationAgent"),
+    "check_agent": ComponentSpec("BeAlive.chatbot.agents.check_agent",
+                                 "CheckAgent"),
+}
+
+# The component of every chain intention.
+CHAIN_INTENTS = {
+    "route_extract": "route_extract",
+    "chitchat": "chitchat",
+    "company_information": "company_information",
+    "delete_activities": "delete_activities",
+    "activity_search": "activity_search",
+    "router": "router",
+}
+
+# The component of every agent intention, the intentions of an agent share
+# one instance.
+AGENT_INTENTS = {
+    "review_user": "reviews_agent",
+    "review_activity": "reviews_agent",
+    "accept_reservation": "reservation_agent",
+    "reject_reservation": "reservation_agent",
+    "make_reservation": "reservation_agent",
+    "check_reservations": "check_agent",
+    "check_reviews": "check_agent",
+    "check_number_reservations": "check_agent",
+}
+
+
+class ComponentRegistry:
+    """
+    Builds the chains and agents of the chatbot on their first use, once
+    per process, so a new session only creates its memory.
+
+    Attributes:
+    ----------
+        llm : ChatOpenAI
+            The language model shared by the components and the memories.
+        specs : Dict[str, ComponentSpec]
+            How to build every component.
+
+    Methods:
+    -------
+        get(name) -> Any:
+            Returns a component, built on the first call.
+        is_built(name) -> bool:
+            Whether a component was already built.
+        intents(intents) -> Mapping:
+            A lazy mapping of intentions to components.
+    """
+
+    def __init__(self, llm=None, specs: Optional[Dict[str, ComponentSpec]] = None):
+        """
+        Initializes the registry, no component is built yet.
+
+        Parameters:
+        ----------
+            llm : ChatOpenAI, optional
+                The language model of the components, by default gpt-4o.
+            specs : Dict[str, ComponentSpec], optional
+                How to build every component, by default COMPONENTS.
+        """
+        self.llm = llm or get_chat_model("gpt-4o")
+        self.specs = specs or COMPONENTS
+        self._components: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {name: threading.Lock()
+                                                  for name in self.specs}
+
+    def get(self, name: str) -> Any:
+        """
+        Returns a component, built on the first call. Two sessions asking
+        for the same component at once wait for a single build.
+
+        Parameters:
+        ----------
+            name : str
+                The name of the component.
+
+        Returns:
+        -------
+            Any
+                The chain or agent.
+        """
+        component = self._components.get(name)
+        if component is not None:
+            return component
+
+        with self._locks[name]:
+            component = self._components.get(name)
+            if component is None:
+                # A cold start shows up in the trace of the turn
+                with span(f"build {name}", "internal"):
+                    spec = self.specs[name]
+                    cls = getattr(importlib.import_module(spec.module),
+                                  spec.cls)
+                    kwargs = dict(spec.kwargs)
+                    if spec.uses_llm:
+                        kwargs["llm"] = self.llm
+                    component = self._components[name] = cls(**kwargs)
+
+        return component
+
+    def is_built(self, name: str) -> bool:
+        """
+        Whether a component was already built.
+        """
+        return name in self._components
+
+    def intents(self, intents: Dict[str, str]) -> "LazyComponents":
+        """
+        A lazy mapping of intentions to the components of this registry.
+        """
+        return LazyComponents(self, intents)
+
+
+class LazyComponents(Mapping):
+    """
+    A read-only mapping of intentions to components, the components are
+    built by the registry when they are first read.
+    """
+
+    def __init__(self, registry: ComponentRegistry, intents: Dict[str, str]):
+        self._registry = registry
+        self._intents = intents
+
+    def __getitem__(self, intent: str) -> Any:
+        return self._registry.get(self._intents[intent])
+
+    def __contains__(self, intent: object) -> bool:
+        return intent in self._intents
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._intents)
+
+    def __len__(self) -> int:
+        return len(self._intents)
+
+
+_registry: Optional[ComponentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_component_registry() -> ComponentRegistry:
+    """
+    Returns the registry of the process, shared by every session (the
+    Streamlit sessions of a server run in the same process).
+    """
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ComponentRegistry()
+
+    return _registry
@@ -0,0 +1,320 @@
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Rows shown in a message, the rest are left to the next pages.
+PAGE_SIZE = 20
+
+# The labels of the columns, the other columns are labelled from their name.
+LABELS: Dict[str, str] = {
+    "activity_name": "Activity",
+    "activity_description": "Description",
+    "activity_state": "State",
+    "username": "User",
+    "cumulative_rating": "Rating",
+    "phone_number": "Phone",
+    "email": "Email",
+    "message": "Message",
+    "state": "Reservation",
+    "number_participants": "Participants",
+    "max_participants": "Maximum participants",
+    "date_begin": "Begins",
+    "date_finish": "Ends",
+}
+
+_MARKDOWN_SPECIAL = re.compile(r"([\\`*_\[\]#|])")
+
+
+@dataclass
+class QueryResult:
+    """
+    The rows of a SQL query, with the names of their columns.
+
+    Attributes:
+    ----------
+        columns : Tuple[str, ...]
+            The names of the columns, from the description of the cursor.
+        rows : List[tuple]
+            The rows of the query.
+    """
+
+    columns: Tuple[str, ...]
+    rows: List[tuple] = field(default_factory=list)
+
+    @classmethod
+    def from_cursor(cls, cursor: sqlite3.Cursor) -> "QueryResult":
+        """
+        Fetches the rows of an executed query, with the names of their
+        columns.
+        """
+        return cls(tuple(column[0] for column in cursor.description),
+                   cursor.fetchall())
+
+    def records(self) -> List[Dict]:
+        """
+        The rows as dictionaries of column names to values.
+        """
+        return [dict(zip(self.columns, row)) for row in self.rows]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class ResultTemplate(NamedTuple):
+    """
+    How the rows of a query are rendered in Markdown.
+
+    The rows are grouped by the group_by column, in the order of their first
+    row, under a bold title followed by the group fields. Every row is a
+    bullet: titled by the title column, with the other fields as nested
+    bullets, or with all its fields on one line when there is no title
+    column. A template with a sentence renders every row as the sentence
+    instead.
+
+    Attributes:
+    ----------
+        group_by : str, optional
+            The column whose value titles the groups of rows.
+        group_fields : Tuple[str, ...]
+            The columns shown once under the title of a group.
+        title : str, optional
+            The column whose value titles every row.
+        fields : Tuple[str, ...], optional
+            The columns shown for every row, by default all the others.
+        sentence : str, optional
+            A format string, with the columns as fields, rendering every row.
+        heading : str, optional
+            A line shown before the rows.
+        noun : str
+            What a row is, in the footer of the pages.
+        next_page : str, optional
+            How the user sees the rows after the page, in the footer, with
+            the number of the next page as the page field.
+        page_size : int
+            The rows shown in a message.
+    """
+
+    group_by: Optional[str] = None
+    group_fields: Tuple[str, ...] = ()
+    title: Optional[str] = None
+    fields: Optional[Tuple[str, ...]] = None
+    sentence: Optional[str] = None
+    heading: Optional[str] = None
+    noun: str = "results"
+    next_page: Optional[str] = None
+    page_size: int = PAGE_SIZE
+
+
+# The templates of the queries of the chatbot.
+TEMPLATES: Dict[str, ResultTemplate] = {
+    # ShowReservationChain
+    "pending_reservations": ResultTemplate(
+        group_by="activity_name", title="username",
+        fields=("cumulative_rating", "phone_number", "email", "message"),
+        noun="pending reservations",
+        next_page="Accept or reject them, or check the reservations of an "
+                  "activity, to see the others."),
+    # ShowReviewChain
+    "pending_user_reviews": ResultTemplate(
+        group_by="activity_name", title="username", fields=(),
+        noun="users to review",
+        next_page="Review them to see the others."),
+    # CheckActivityReservationTool
+    "activity_reservations": ResultTemplate(
+        group_by="activity_name", group_fields=("activity_state",),
+        title="username",
+        fields=("state", "cumulative_rating", "phone_number", "email",
+                "message"),
+        noun="reservations",
+        next_page="Ask for page {page} to see the next ones."),
+    # CheckActivityReviewsTool
+    "activity_reviews": ResultTemplate(
+        fields=("rating", "review"), noun="reviews",
+        next_page="Ask for page {page} to see the next ones."),
+    # CheckActivityNumberParticipantsTool
+    "participants": ResultTemplate(
+        sentence="**{activity_name}** has {number_participants} of "
+                 "{max_participants} participants.",
+        noun="activities"),
+    # ActivitySearchChain
+    "activity_search": ResultTemplate(
+        title="activity_name",
+        fields=("activity_description", "location", "city", "date_begin",
+                "date_finish", "number_participants", "max_participants"),
+        heading="These are the activities recommended for you:",
+        noun="activities"),
+}
+
+
+def _label(column: str) -> str:
+    return LABELS.get(column, column.replace("_", " ").capitalize())
+
+
+def _value(value) -> str:
+    """
+    A value as Markdown text, the user input is escaped.
+    """
+    if isinstance(value, float):
+        value = f"{value:.1f}"
+    text = " ".join(str(value).split())
+    return _MARKDOWN_SPECIAL.sub(r"\\\1", text)
+
+
+def _present(value) -> bool:
+    return value is not None and str(value).strip() != ""
+
+
+def render(result: QueryResult, template: ResultTemplate,
+           page: int = 1) -> str:
+    """
+    Renders the rows of a query in Markdown, without any LLM call.
+
+    Parameters:
+    ----------
+        result : QueryResult
+            The rows and their columns.
+        template : ResultTemplate
+            How the rows are rendered.
+        page : int
+            The page of rows to render, from 1.
+
+    Returns:
+    -------
+        str
+            The Markdown of the page, with a footer when there are other
+            pages, telling how to see the next one.
+    """
+    records = result.records()
+    if template.group_by is not None:
+        # Stable, the groups in the order of their first row
+        order = {}
+        for record in records:
+            order.setdefault(record[template.group_by], len(order))
+        records.sort(key=lambda record: order[record[template.group_by]])
+
+    # A page past the last one shows the last one
+    total = len(records)
+    pages = max(-(-total // template.page_size), 1)
+    page = min(max(page, 1), pages)
+    first = (page - 1) * template.page_size
+    records = records[first:first + template.page_size]
+
+    hidden = {template.group_by, template.title} | set(template.group_fields)
+    fields = (template.fields if template.fields is not None
+              else tuple(column for column in result.columns
+                         if column not in hidden))
+
+    lines = [template.heading, ""] if template.heading else []
+    group = object()
+    for record in records:
+        if template.sentence is not None:
+            lines.append(template.sentence.format(
+                **{column: _value(value) for column, value in record.items()}))
+            continue
+
+        if template.group_by is not None and record[template.group_by] != group:
+            group = record[template.group_by]
+            if lines:
+                lines.append("")
+            details = "; ".join(f"{_label(column)}: {_value(record[column])}"
+                                for column in template.group_fields
+                                if _present(record[column]))
+            lines.append(f"**{_value(group)}**"
+                         + (f" ({details})" if details else ""))
+
+        values = [(_label(column), _value(record[column])) for column in fields
+                  if _present(record[column])]
+
+        if template.title is not None:
+            lines.append(f"- **{_value(record[template.title])}**")
+            lines.extend(f"  - **{label}:** {value}"
+                         for label, value in values)
+        else:
+            lines.append("- " + "; ".join(f"**{label}:** {value}"
+                                          for label, value in values))
+
+    if pages > 1:
+        footer = (f"_Showing {first + 1}-{first + len(records)} of {total} "
+                  f"{template.noun}._")
+        if page < pages and template.next_page is not None:
+            footer += " " + template.next_page.format(page=page + 1)
+        lines.extend(["", footer])
+
+    return "\n".join(lines)
+
+
+def polish_enabled() -> bool:
+    """
+    Whether the rendered results are rewritten by the LLM, off unless
+    BEALIVE_RENDER_POLISH is "1".
+    """
+    return os.getenv("BEALIVE_RENDER_POLISH", "0") == "1"
+
+
+def render_result(result: QueryResult, template_name: str,
+                  polish: Optional[bool] = None, llm=None,
+                  page: int = 1) -> str:
+    """
+    Renders the rows of a query with one of the TEMPLATES, and rewrites the
+    Markdown with the LLM when the polish step is enabled.
+
+    Parameters:
+    ----------
+        result : QueryResult
+            The rows and their columns.
+        template_name : str
+            The name of the template, in TEMPLATES.
+        polish : bool, optional
+            Whether to rewrite the Markdown with the LLM, by default
+            polish_enabled().
+        llm : ChatOpenAI, optional
+            The language model of the polish step.
+        page : int
+            The page of rows to render, from 1.
+
+    Returns:
+    -------
+        str
+            The Markdown of the result.
+    """
+    markdown = render(result, TEMPLATES[template_name], page)
+    if not (polish_enabled() if polish is None else polish):
+        return markdown
+
+    from BeAlive.chatbot.chains.process_query_output import (
+        QueryProcessingChain)
+    return QueryProcessingChain(llm).invoke({"user_input": markdown})
+
+
+async def arender_result(result: QueryResult, template_name: str,
+                         polish: Optional[bool] = None, llm=None,
+                         page: int = 1) -> str:
+    """
+    Asynchronous version of render_result.
+    """
+    markdown = render(result, TEMPLATES[template_name], page)
+    if not (polish_enabled() if polish is None else polish):
+        return markdown
+
+    from BeAlive.chatbot.chains.process_query_output import (
+        QueryProcessingChain)
+    return await QueryProcessingChain(llm).ainvoke({"user_input": markdown})
+
+
+def stream_result(result: QueryResult, template_name: str,
+                  polish: Optional[bool] = None, llm=None,
+                  page: int = 1) -> Iterator[str]:
+    """
+    Streaming version of render_result, the rendered Markdown is a single
+    chunk.
+    """
+    markdown = render(result, TEMPLATES[template_name], page)
+    if not (polish_enabled() if polish is None else polish):
+        yield markdown
+        return
+
+    from BeAlive.chatbot.chains.process_query_output import (
+        QueryProcessingChain)
+    yield from QueryProcessingChain(llm).stream({"user_input": markdown})
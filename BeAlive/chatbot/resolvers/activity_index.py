@@ -0,0 +1,264 @@
+import re
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+from BeAlive.chatbot.chains.check_activity_id import ActivityID, GetActivityIDChain
+from BeAlive.chatbot.resolvers.fuzzy import (NameMatch, normalize,
+                                             partial_edit_similarity,
+                                             trigram_coverage,
+                                             trigram_similarity, trigrams)
+
+# Field written by the route extract chain (RouteExtraction.to_text).
+_ACTIVITY_NAME_LINE = re.compile(r"^\s*activity name:\s*(.+)$",
+                                 re.IGNORECASE | re.MULTILINE)
+
+# Letters two words share at the start to be taken as the same word
+# ("capture" and "capturing").
+_WORD_PREFIX = 4
+
+
+def _contains(text: str, name: str) -> bool:
+    """
+    Whether a normalized name is written as whole words inside a text.
+    """
+    return re.search(rf"\b{re.escape(name)}\b", text) is not None
+
+
+def _shares_word(words, name: str) -> bool:
+    """
+    Whether one of the words is a word of a normalized name, or starts like
+    one.
+    """
+    return any(word == other
+               or (min(len(word), len(other)) >= _WORD_PREFIX
+                   and word[:_WORD_PREFIX] == other[:_WORD_PREFIX])
+               for word in words for other in name.split())
+
+
+class ActivityNameIndex:
+    """
+    In-process index over the names of a list of activities, already scoped
+    by the caller (the activities of a host, the open activities, the
+    finished activities attended by a participant...).
+
+    A name is resolved with a normalized exact lookup first, then the
+    activities are shortlisted by trigram similarity and the shortlist is
+    reranked with the average of the trigram and edit distance similarities.
+
+    Attributes:
+    ----------
+        accept_score : float
+            The minimum score of a match.
+        min_margin : float
+            The minimum difference between the two best scores of a match.
+        reject_score : float
+            Below this score no activity is similar to the query.
+        shortlist_size : int
+            The number of activities reranked with the edit distance.
+
+    Methods:
+    -------
+        resolve(query: str) -> NameMatch:
+            Finds the activity of the query.
+    """
+
+    def __init__(self,
+                 activities: Sequence[Tuple[int, str]],
+                 accept_score: float = 0.75,
+                 min_margin: float = 0.15,
+                 reject_score: float = 0.3,
+                 shortlist_size: int = 3):
+        """
+        Builds the index.
+
+        Parameters:
+        ----------
+            activities : Sequence[Tuple[int, str]]
+                The (activity_id, activity_name) of the activities.
+            accept_score : float
+                The minimum score of a match.
+            min_margin : float
+                The minimum difference between the two best scores of a
+                match.
+            reject_score : float
+                Below this score no activity is similar to the query.
+            shortlist_size : int
+                The number of activities, best by trigrams, reranked with
+                the edit distance.
+        """
+        self.accept_score = accept_score
+        self.min_margin = min_margin
+        self.reject_score = reject_score
+        self.shortlist_size = shortlist_size
+
+        self._entries = []
+        self._exact = {}
+        for activity_id, activity_name in activities:
+            name = normalize(activity_name)
+            self._entries.append((activity_id, activity_name, name,
+                                  trigrams(name)))
+            # Names are not unique, a repeated name is never an exact match
+            self._exact[name] = (None if name in self._exact
+                                 else activity_id)
+
+    @staticmethod
+    def _trigram_score(query_trigrams, name_trigrams) -> float:
+        """
+        Trigram similarity between the query and an activity name, rewarding
+        a query that is part of the name (or a name that is part of the
+        query).
+        """
+        return 0.5 * (trigram_similarity(query_trigrams, name_trigrams)
+                      + max(trigram_coverage(query_trigrams, name_trigrams),
+                            trigram_coverage(name_trigrams, query_trigrams)))
+
+    def _points_to_longer_name(self, query: str, name: str) -> bool:
+        """
+        Whether the words of the query after a name it contains match a
+        longer name that contains it ("photography walk capture" names
+        "photography walk capture city", not "photography walk"), so the
+        query is scored against all the names instead.
+        """
+        extra = set(query.split()) - set(name.split())
+        return any(_shares_word(extra, other.replace(name, " "))
+                   for _, _, other, _ in self._entries
+                   if other != name and _contains(other, name))
+
+    def resolve(self, query: str) -> NameMatch:
+        """
+        Finds the activity of the query.
+
+        Parameters:
+        ----------
+            query : str
+                The activity name given by the user, or a text with an
+                'Activity name:' line.
+
+        Returns:
+        -------
+            NameMatch
+                The match, or why there is no match.
+        """
+        extracted = _ACTIVITY_NAME_LINE.search(str(query))
+        query = normalize(extracted.group(1) if extracted else query)
+
+        if not self._entries or not query:
+            return NameMatch(status="none")
+
+        exact = self._exact.get(query)
+        if exact is not None:
+            return NameMatch(status="match", id=exact)
+
+        # Names written inside the query, keeping the longest ones
+        # ("yoga retreat" over "yoga")
+        contained = [(activity_id, name) for activity_id, _, name, _
+                     in self._entries if _contains(query, name)]
+        contained = [(activity_id, name) for activity_id, name in contained
+                     if not any(name != other and name in other
+                                for _, other in contained)]
+        if (len(contained) == 1
+                and not self._points_to_longer_name(query, contained[0][1])):
+            return NameMatch(status="match", id=contained[0][0])
+
+        # Shortlist by trigrams, then rerank with the edit distance
+        query_trigrams = trigrams(query)
+        shortlist = sorted(
+            ((self._trigram_score(query_trigrams, name_trigrams),
+              activity_id, activity_name, name)
+             for activity_id, activity_name, name, name_trigrams
+             in self._entries),
+            key=lambda candidate: candidate[0],
+            reverse=True)[:self.shortlist_size]
+
+        candidates = sorted(
+            ((activity_id, activity_name,
+              0.5 * (score + partial_edit_similarity(query, name)))
+             for score, activity_id, activity_name, name in shortlist),
+            key=lambda candidate: candidate[2], reverse=True)
+
+        best = candidates[0][2]
+        second = candidates[1][2] if len(candidates) > 1 else 0.0
+
+        if best < self.reject_score:
+            return NameMatch(status="none", candidates=candidates)
+        if best >= self.accept_score and best - second >= self.min_margin:
+            return NameMatch(status="match", id=candidates[0][0],
+                             candidates=candidates)
+
+        return NameMatch(status="ambiguous", candidates=candidates)
+
+
+@lru_cache(maxsize=256)
+def _get_index(activities: Tuple[Tuple[int, str], ...]) -> ActivityNameIndex:
+    """
+    The index of a list of activities, reused while the list is unchanged.
+    """
+    return ActivityNameIndex(activities)
+
+
+def match_activity(user_input: str,
+                   activity_list: Sequence[Tuple[int, str]]) -> NameMatch:
+    """
+    Resolves the activity name of the user input in a list of activities
+    without calling the LLM.
+
+    Parameters:
+    ----------
+        user_input : str
+            The activity name given by the user.
+        activity_list : Sequence[Tuple[int, str]]
+            The (activity_id, activity_name) of the activities.
+
+    Returns:
+    -------
+        NameMatch
+            The match, or why there is no match.
+    """
+    return _get_index(tuple(tuple(activity) for activity in activity_list)
+                      ).resolve(user_input)
+
+
+def resolve_activity_id(user_input: str,
+                        activity_list: Sequence[Tuple[int, str]],
+                        llm_chain: Optional[GetActivityIDChain] = None
+                        ) -> ActivityID:
+    """
+    Finds the id of the activity of the user input, only asking the
+    GetActivityIDChain when the best candidates are ambiguous.
+
+    Parameters:
+    ----------
+        user_input : str
+            The activity name given by the user.
+        activity_list : Sequence[Tuple[int, str]]
+            The (activity_id, activity_name) of the activities.
+        llm_chain : GetActivityIDChain, optional
+            The chain used for the ambiguous names.
+
+    Returns:
+    -------
+        ActivityID
+            The activity ID, -1 if no activity has that name.
+    """
+    match = match_activity(user_input, activity_list)
+    if match.status != "ambiguous":
+        return ActivityID(activity_id=match.id)
+
+    return (llm_chain or GetActivityIDChain()).invoke({
+        'user_input': user_input,
+        'activity_list': str(activity_list)})
+
+
+async def aresolve_activity_id(user_input: str,
+                               activity_list: Sequence[Tuple[int, str]],
+                               llm_chain: Optional[GetActivityIDChain] = None
+                               ) -> ActivityID:
+    """
+    Asynchronous version of resolve_activity_id.
+    """
+    match = match_activity(user_input, activity_list)
+    if match.status != "ambiguous":
+        return ActivityID(activity_id=match.id)
+
+    return await (llm_chain or GetActivityIDChain()).ainvoke({
+        'user_input': user_input,
+        'activity_list': str(activity_list)})
@@ -0,0 +1,134 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import FrozenSet, List, Tuple
+
+# Words that do not help to tell two names apart.
+STOPWORDS = frozenset({"a", "an", "the"})
+
+
+@dataclass
+class NameMatch:
+    """
+    The result of resolving a name.
+
+    Attributes:
+    ----------
+        status : str
+            'match' when one candidate is clearly the best, 'ambiguous' when
+            the best candidates are too close (or not close enough to the
+            query) and 'none' when no candidate is similar.
+        id : int
+            The id of the match, -1 if there is no match.
+        candidates : List[Tuple[int, str, float]]
+            The (id, name, score) of the best candidates, best first.
+    """
+    status: str
+    id: int = -1
+    candidates: List[Tuple[int, str, float]] = field(default_factory=list)
+
+
+def normalize(text: str) -> str:
+    """
+    Normalize a name for comparison: accents removed, lowercase, only
+    letters and digits, without stopwords and single spaced.
+
+    Parameters:
+    ----------
+    text : str
+        The text to normalize.
+
+    Returns:
+    -------
+    str
+        The normalized text.
+    """
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    words = re.sub(r"[^0-9a-z]+", " ", text.lower()).split()
+
+    return " ".join(word for word in words if word not in STOPWORDS)
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """
+    The set of character trigrams of a normalized text, padded like
+    PostgreSQL's pg_trgm so short words still have trigrams.
+    """
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def trigram_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """
+    Jaccard similarity of two trigram sets, between 0 and 1.
+    """
+    if not a or not b:
+        return 0.0
+
+    return len(a & b) / len(a | b)
+
+
+def trigram_coverage(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """
+    Share of the trigrams of `a` that are also in `b`, between 0 and 1, so a
+    partial name ("ocean kayaking") is covered by the full name.
+    """
+    if not a:
+        return 0.0
+
+    return len(a & b) / len(a)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    Levenshtein distance between two strings.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (char_a != char_b)))
+        previous = current
+
+    return previous[-1]
+
+
+def edit_similarity(a: str, b: str) -> float:
+    """
+    Edit distance scaled to a similarity between 0 and 1.
+    """
+    if not a and not b:
+        return 1.0
+
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+def word_windows(text: str, size: int) -> List[str]:
+    """
+    The runs of `size` consecutive words of a normalized text (the text
+    itself if it has fewer words).
+    """
+    words = text.split()
+    if len(words) <= size:
+        return [text]
+
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def partial_edit_similarity(a: str, b: str) -> float:
+    """
+    The best edit similarity between the shorter text and the runs of words
+    of the longer text with the same number of words, so typos are
+    tolerated in partial names ("ocean kayakng").
+    """
+    if len(a.split()) > len(b.split()):
+        a, b = b, a
+
+    return max(edit_similarity(a, window)
+               for window in word_windows(b, len(a.split())))
@@ -0,0 +1,180 @@
+import re
+from typing import Optional, Sequence, Tuple
+from BeAlive.chatbot.chains.check_reservation_user_id import GetReservationUserIDChain, UserID
+from BeAlive.chatbot.resolvers.fuzzy import NameMatch, edit_distance
+
+# Field written by the route extract chain (RouteExtraction.to_text).
+_USERNAME_LINE = re.compile(r"^\s*username:\s*(.+)$",
+                            re.IGNORECASE | re.MULTILINE)
+
+# Possessives and punctuation around a username ("Eva's", "@eva").
+_STRIP = re.compile(r"(['´`’]s\b|[^\w\s])")
+
+
+class UsernameResolver:
+    """
+    Resolves a username given by the user in a list of (user_id, username),
+    such as the pending reservations or the confirmed participants of an
+    activity.
+
+    Usernames are unique and short (at most 10 characters), so they are
+    resolved with a case-insensitive exact lookup, then a prefix lookup and
+    finally the closest username within a small edit distance. When more
+    than one username fits equally well the result is 'ambiguous'.
+
+    Attributes:
+    ----------
+        max_distance : int
+            The maximum edit distance of a match.
+
+    Methods:
+    -------
+        resolve(query: str) -> NameMatch:
+            Finds the user of the query.
+    """
+
+    def __init__(self,
+                 users: Sequence[Tuple[int, str]],
+                 max_distance: int = 2):
+        """
+        Builds the username lookup.
+
+        Parameters:
+        ----------
+            users : Sequence[Tuple[int, str]]
+                The (user_id, username) of the users.
+            max_distance : int
+                The maximum edit distance of a match.
+        """
+        self.max_distance = max_distance
+        self._users = {str(username).lower(): (user_id, username)
+                       for user_id, username in users}
+
+    def _resolve_word(self, word: str) -> NameMatch:
+        """
+        Resolves a single word of the query.
+        """
+        if word in self._users:
+            user_id, username = self._users[word]
+            return NameMatch(status="match", id=user_id,
+                             candidates=[(user_id, username, 1.0)])
+
+        prefixed = [self._users[name] for name in self._users
+                    if name.startswith(word)]
+        if len(prefixed) == 1:
+            user_id, username = prefixed[0]
+            return NameMatch(status="match", id=user_id,
+                             candidates=[(user_id, username, 1.0)])
+        if len(prefixed) > 1:
+            return NameMatch(status="ambiguous",
+                             candidates=[(user_id, username, 1.0)
+                                         for user_id, username in prefixed])
+
+        # Allow fewer typos in shorter usernames
+        max_distance = min(self.max_distance, len(word) // 3)
+        distances = sorted((edit_distance(word, name), name)
+                           for name in self._users)
+        close = [(distance, name) for distance, name in distances
+                 if distance <= max_distance]
+        candidates = [(*self._users[name], 1.0 - distance / max(len(word), 1))
+                      for distance, name in close]
+
+        if not close:
+            return NameMatch(status="none")
+        if len(close) == 1 or close[0][0] < close[1][0]:
+            return NameMatch(status="match", id=candidates[0][0],
+                             candidates=candidates)
+
+        return NameMatch(status="ambiguous", candidates=candidates)
+
+    def resolve(self, query: str) -> NameMatch:
+        """
+        Finds the user of the query.
+
+        Parameters:
+        ----------
+            query : str
+                The username given by the user, or a text with a
+                'Username:' line.
+
+        Returns:
+        -------
+            NameMatch
+                The match, or why there is no match.
+        """
+        extracted = _USERNAME_LINE.search(str(query))
+        query = _STRIP.sub(" ", (extracted.group(1) if extracted
+                                 else str(query)).lower()).strip()
+
+        if not self._users or not query:
+            return NameMatch(status="none")
+
+        match = self._resolve_word(query)
+        if match.status != "none" or len(query.split()) == 1:
+            return match
+
+        # "Eva Smith" or "the reservation of eva": resolve word by word,
+        # skipping the short words that would be the prefix of many users
+        matches = [self._resolve_word(word) for word in query.split()
+                   if len(word) >= 3]
+        found = {match.id for match in matches if match.status == "match"}
+        if len(found) == 1:
+            return next(match for match in matches
+                        if match.status == "match")
+        if found or any(match.status == "ambiguous" for match in matches):
+            return NameMatch(status="ambiguous")
+
+        return NameMatch(status="none")
+
+
+def match_username(user_input: str,
+                   user_list: Sequence[Tuple[int, str]]) -> NameMatch:
+    """
+    Resolves the username of the user input in a list of users without
+    calling the LLM.
+
+    Parameters:
+    ----------
+        user_input : str
+            The username given by the user.
+        user_list : Sequence[Tuple[int, str]]
+            The (user_id, username) of the users.
+
+    Returns:
+    -------
+        NameMatch
+            The match, or why there is no match.
+    """
+    return UsernameResolver(user_list).resolve(user_input)
+
+
+def resolve_user_id(user_input: str,
+                    user_list: Sequence[Tuple[int, str]],
+                    llm_chain: Optional[GetReservationUserIDChain] = None
+                    ) -> UserID:
+    """
+    Finds the id of the user of the user input, only asking the
+    GetReservationUserIDChain when the username is ambiguous.
+
+    Parameters:
+    ----------
+        user_input : str
+            The username given by the user.
+        user_list : Sequence[Tuple[int, str]]
+            The (user_id, username) of the users.
+        llm_chain : GetReservationUserIDChain, optional
+            The chain used for the ambiguous usernames.
+
+    Returns:
+    -------
+        UserID
+            The user ID, -1 if no user has that username.
+    """
+    match = match_username(user_input, user_list)
+    if match.status != "ambiguous":
+        return UserID(user_id=match.id)
+
+    return (llm_chain or GetReservationUserIDChain()).invoke({
+        'user_input': user_input,
+        'reservation_list': str(user_list)})
+
@@ -0,0 +1,99 @@
+"""
+Tunes the threshold of the LocalRouterChain on a held-out split of the
+labelled messages (synthetic_intetions.json) and saves it, with the name of
+the encoder, in router_threshold.json. The router of the chatbot loads it
+when it is built with the same encoder.
+
+The router is built from the train split only, so the held-out messages are
+scored like new user inputs, and the threshold is the lowest one whose
+messages routed locally reach the target precision. The messages below it
+are classified by the RouteExtractChain. When no threshold reaches the
+target precision, the saved threshold is infinite (Infinity in the JSON) and
+every message is classified by the RouteExtractChain.
+
+Usage:
+    python -m BeAlive.chatbot.router.tune_threshold [--target-precision 0.95]
+                                                    [--test-size 0.1]
+                                                    [--seed 0]
+"""
+import argparse
+import json
+from BeAlive.chatbot.chains.local_router import (DEFAULT_THRESHOLD,
+                                                 THRESHOLD_PATH,
+                                                 LocalRouterChain,
+                                                 load_utterances,
+                                                 split_utterances)
+
+
+def tune(target_precision: float = 0.95, test_size: float = 0.1,
+         seed: int = 0, path: str = THRESHOLD_PATH, encoder=None) -> dict:
+    """
+    Tunes the threshold on a held-out split and saves it.
+
+    Parameters:
+    ----------
+    target_precision : float
+        The minimum accuracy of the held-out messages routed locally.
+    test_size : float
+        The share of the messages of every intent held out.
+    seed : int
+        The seed of the split.
+    path : str
+        The file where the threshold is saved.
+    encoder : optional
+        The encoder of the router, by default the one of LocalRouterChain.
+
+    Returns:
+    -------
+    dict
+        The saved threshold, with the encoder, whether the target precision
+        was reached and the results on the held-out messages.
+    """
+    train, (messages, labels) = split_utterances(*load_utterances(),
+                                                 test_size, seed)
+    router = LocalRouterChain(encoder=encoder, threshold=DEFAULT_THRESHOLD,
+                              utterances=train)
+    threshold = router.tune_threshold(messages, labels, target_precision)
+
+    routes = [router.route(message) for message in messages]
+    local = [route["intent"] == label
+             for route, label in zip(routes, labels)
+             if route["source"] == "local"]
+
+    result = {
+        "encoder": router.encoder_name,
+        "threshold": threshold,
+        "target_reached": threshold != float("inf"),
+        "min_margin": router.min_margin,
+        "target_precision": target_precision,
+        "test_size": test_size,
+        "seed": seed,
+        "held_out": len(messages),
+        "routed_locally": round(len(local) / len(messages), 3),
+        "local_accuracy": (round(sum(local) / len(local), 3) if local
+                           else None),
+    }
+
+    with open(path, "w") as file:
+        json.dump(result, file, indent=4)
+
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target-precision", type=float, default=0.95,
+                        help="Minimum accuracy of the local routes.")
+    parser.add_argument("--test-size", type=float, default=0.1,
+                        help="Share of the messages of every intent held "
+                             "out.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the split.")
+    args = parser.parse_args()
+
+    result = tune(args.target_precision, args.test_size, args.seed)
+    print(json.dumps(result, indent=2))
+    if not result["target_reached"]:
+        print(f"No threshold reaches a precision of {args.target_precision}"
+              " on the held-out messages: every message is left to the "
+              "RouteExtractChain.")
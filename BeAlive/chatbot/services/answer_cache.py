@@ -0,0 +1,324 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from BeAlive.data.corpus import get_corpus_version
+from BeAlive.data.tracing import current_span
+
+# Minimum cosine similarity between a question and a cached question to
+# reuse its answer.
+SIMILARITY_THRESHOLD = float(os.getenv("BEALIVE_ANSWER_CACHE_SIMILARITY", 0.95))
+
+# Seconds an answer is kept.
+TTL = float(os.getenv("BEALIVE_ANSWER_CACHE_TTL", 24 * 60 * 60))
+
+# Maximum number of cached answers, the oldest are dropped first.
+MAX_ENTRIES = 1000
+
+# Seconds between two checks of the version of the documents.
+VERSION_CHECK_INTERVAL = 5.0
+
+
+class SemanticAnswerCache:
+    """
+    Cache of the answers of a retrieval chain, looked up by the similarity
+    of the questions.
+
+    A question reuses the answer of a cached question when the cosine
+    similarity of their embeddings is at least the threshold. The answers
+    expire after the TTL, and all of them are dropped when the documents of
+    the vector index are ingested again (a new corpus version). An answer
+    computed on a previous version is not stored.
+
+    Every lookup sets cache_hit, cache_saved_ms (on a hit), cache_hit_rate
+    and cache_saved_seconds on the current span, so the metrics are
+    exported with the traces.
+
+    Attributes:
+    ----------
+        embeddings : Embeddings
+            The embeddings of the questions.
+        index_name : str
+            The vector index the answers were built on.
+        similarity : float
+            The minimum cosine similarity to reuse an answer.
+        ttl : float
+            The seconds an answer is kept.
+        max_entries : int
+            The maximum number of cached answers.
+
+    Methods:
+    -------
+        lookup(question) -> Optional[str]:
+            Returns the cached answer of a similar question, if any.
+        alookup(question) -> Optional[str]:
+            Asynchronous version of lookup.
+        version -> Optional[int]:
+            The corpus version of the cached answers.
+        store(question, answer, latency, version):
+            Caches the answer of a question.
+        astore(question, answer, latency, version):
+            Asynchronous version of store.
+        clear():
+            Drops all the answers.
+        stats() -> Dict[str, float]:
+            Returns the metrics of the cache.
+    """
+
+    def __init__(self, embeddings, index_name: str,
+                 similarity: float = SIMILARITY_THRESHOLD,
+                 ttl: float = TTL, max_entries: int = MAX_ENTRIES):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+        ----------
+            embeddings : Embeddings
+                The embeddings of the questions.
+            index_name : str
+                The vector index the answers are built on.
+            similarity : float
+                The minimum cosine similarity to reuse an answer.
+            ttl : float
+                The seconds an answer is kept.
+            max_entries : int
+                The maximum number of cached answers.
+        """
+        self.embeddings = embeddings
+        self.index_name = index_name
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._vectors: List[np.ndarray] = []
+        self._answers: List[str] = []
+        self._latencies: List[float] = []
+        self._expires: List[float] = []
+        self._matrix: Optional[np.ndarray] = None
+
+        self._version: Optional[int] = None
+        self._version_checked = 0.0
+
+        self._metrics = {"lookups": 0, "hits": 0, "saved_seconds": 0.0,
+                         "invalidations": 0, "stale_stores": 0}
+
+    @property
+    def version(self) -> Optional[int]:
+        """
+        The corpus version of the cached answers, as of the last check.
+        Read at lookup time and given to store, so an answer computed before
+        a new ingestion is not cached.
+        """
+        with self._lock:
+            return self._version
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _drop(self, keep: List[int]):
+        """
+        Keep only the given entries, called with the lock.
+        """
+        self._vectors = [self._vectors[i] for i in keep]
+        self._answers = [self._answers[i] for i in keep]
+        self._latencies = [self._latencies[i] for i in keep]
+        self._expires = [self._expires[i] for i in keep]
+        self._matrix = None
+
+    def _check_version(self, now: float):
+        """
+        Drop all the answers when the corpus version changed, checked at
+        most every VERSION_CHECK_INTERVAL seconds.
+        """
+        if now - self._version_checked < VERSION_CHECK_INTERVAL:
+            return
+
+        version = get_corpus_version(self.index_name)
+        with self._lock:
+            self._version_checked = now
+            if self._version is not None and version != self._version:
+                self._drop([])
+                self._metrics["invalidations"] += 1
+            self._version = version
+
+    def _search(self, vector: np.ndarray, now: float,
+                started: float) -> Optional[str]:
+        """
+        Returns the answer of the most similar question, if it is similar
+        enough, and updates and exports the metrics.
+        """
+        answer, saved = self._best_answer(vector, now, started)
+
+        current = current_span()
+        if current is not None:
+            metrics = self.stats()
+            current.set(cache_hit=answer is not None,
+                        cache_saved_ms=(round(saved * 1000, 3)
+                                        if answer is not None else None),
+                        cache_hit_rate=round(metrics["hit_rate"], 3),
+                        cache_saved_seconds=round(metrics["saved_seconds"],
+                                                  3))
+        return answer
+
+    def _best_answer(self, vector: np.ndarray, now: float,
+                     started: float) -> tuple:
+        """
+        The (answer, saved seconds) of the most similar question, (None, 0)
+        when none is similar enough.
+        """
+        with self._lock:
+            self._metrics["lookups"] += 1
+
+            if any(expires <= now for expires in self._expires):
+                self._drop([i for i, expires in enumerate(self._expires)
+                            if expires > now])
+
+            if not self._vectors:
+                return None, 0.0
+
+            if self._matrix is None:
+                self._matrix = np.stack(self._vectors)
+
+            scores = self._matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity:
+                return None, 0.0
+
+            saved = max(0.0, self._latencies[best]
+                        - (time.perf_counter() - started))
+            self._metrics["hits"] += 1
+            self._metrics["saved_seconds"] += saved
+            return self._answers[best], saved
+
+    def _add(self, vector: np.ndarray, answer: str, latency: float,
+             now: float, version: Optional[int] = None):
+        """
+        Add an answer, dropping the oldest ones over max_entries. An answer
+        computed on another corpus version is dropped.
+        """
+        with self._lock:
+            if version is not None and version != self._version:
+                self._metrics["stale_stores"] += 1
+                return
+
+            self._vectors.append(vector)
+            self._answers.append(answer)
+            self._latencies.append(latency)
+            self._expires.append(now + self.ttl)
+            self._matrix = None
+
+            if len(self._vectors) > self.max_entries:
+                self._drop(list(range(len(self._vectors) - self.max_entries,
+                                      len(self._vectors))))
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        Returns the cached answer of a similar question, if any.
+
+        Parameters:
+        ----------
+            question : str
+                The question of the user.
+
+        Returns:
+        -------
+            Optional[str]
+                The cached answer or None.
+        """
+        started = time.perf_counter()
+        now = time.time()
+        self._check_version(now)
+        vector = self._normalize(self.embeddings.embed_query(question))
+        return self._search(vector, now, started)
+
+    async def alookup(self, question: str) -> Optional[str]:
+        """
+        Asynchronous version of lookup.
+        """
+        started = time.perf_counter()
+        now = time.time()
+        await asyncio.to_thread(self._check_version, now)
+        vector = self._normalize(await self.embeddings.aembed_query(question))
+        return self._search(vector, now, started)
+
+    def store(self, question: str, answer: str, latency: float,
+              version: Optional[int] = None):
+        """
+        Caches the answer of a question, unless the corpus version changed
+        since it was computed.
+
+        Parameters:
+        ----------
+            question : str
+                The question of the user.
+            answer : str
+                The answer of the chain.
+            latency : float
+                The seconds the chain took to answer.
+            version : int, optional
+                The version property read at lookup time, before the answer
+                was computed.
+        """
+        vector = self._normalize(self.embeddings.embed_query(question))
+        self._add(vector, answer, latency, time.time(), version)
+
+    async def astore(self, question: str, answer: str, latency: float,
+                     version: Optional[int] = None):
+        """
+        Asynchronous version of store.
+        """
+        vector = self._normalize(await self.embeddings.aembed_query(question))
+        self._add(vector, answer, latency, time.time(), version)
+
+    def clear(self):
+        """
+        Drops all the answers.
+        """
+        with self._lock:
+            self._drop([])
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the metrics of the cache since it was created.
+
+        Returns:
+        -------
+            Dict[str, float]
+                lookups, hits, hit_rate, saved_seconds (the latency of the
+                chain saved by the hits), invalidations, stale_stores (the
+                answers computed on a previous corpus version, not stored)
+                and entries.
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics["entries"] = len(self._answers)
+
+        metrics["hit_rate"] = (metrics["hits"] / metrics["lookups"]
+                               if metrics["lookups"] else 0.0)
+        return metrics
+
+
+_caches: Dict[str, SemanticAnswerCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_answer_cache(index_name: str, embeddings) -> SemanticAnswerCache:
+    """
+    Returns the answer cache of a vector index, shared by the whole process
+    so every session benefits from the answers of the others.
+    """
+    cache = _caches.get(index_name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(index_name)
+            if cache is None:
+                cache = _caches[index_name] = SemanticAnswerCache(
+                    embeddings, index_name)
+
+    return cache
@@ -0,0 +1,338 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple, Union
+from BeAlive.data.connection import transaction
+from BeAlive.data.outbox import enqueue_upserts, notify_outbox
+
+# Statuses of a FileResult.
+IMPORTED = "imported"
+PARSE_FAILED = "parse_failed"
+EXTRACTION_FAILED = "extraction_failed"
+INVALID = "invalid"
+SAVE_FAILED = "save_failed"
+
+# LLM calls (extraction and rewrite) running at the same time.
+MAX_CONCURRENCY = 8
+
+# An uploaded PDF is (file name, content), a PDF on disk is its path.
+PdfSource = Union[str, Tuple[str, bytes]]
+
+
+@dataclass
+class FileResult:
+    """
+    The outcome of the import of one PDF.
+
+    Attributes:
+    ----------
+        file_name : str
+            The name of the PDF.
+        status : str
+            'imported', 'parse_failed', 'extraction_failed', 'invalid' (the
+            activity details did not pass the validation) or 'save_failed'.
+        activity_id : int
+            The ID of the new activity, None when it was not imported.
+        message : str
+            The error message, empty when the activity was imported.
+    """
+
+    file_name: str
+    status: str
+    activity_id: Optional[int] = None
+    message: str = ""
+
+    @property
+    def imported(self) -> bool:
+        """
+        Whether the activity was created.
+        """
+        return self.status == IMPORTED
+
+
+@dataclass
+class ImportReport:
+    """
+    The per-file outcome of a bulk import, in the order of the files.
+
+    Attributes:
+    ----------
+        results : List[FileResult]
+            The result of every PDF.
+    """
+
+    results: List[FileResult] = field(default_factory=list)
+
+    @property
+    def imported(self) -> List[FileResult]:
+        """
+        The results of the created activities.
+        """
+        return [result for result in self.results if result.imported]
+
+    @property
+    def failed(self) -> List[FileResult]:
+        """
+        The results of the PDFs that were not imported.
+        """
+        return [result for result in self.results if not result.imported]
+
+    def to_markdown(self) -> str:
+        """
+        Returns the report as a Markdown table.
+        """
+        lines = [f"Imported {len(self.imported)} of {len(self.results)} "
+                 "activities.", "",
+                 "| File | Status | Activity ID | Message |",
+                 "| --- | --- | --- | --- |"]
+        for result in self.results:
+            message = " ".join(result.message.split()).replace("|", "\\|")
+            lines.append(f"| {result.file_name} | {result.status} | "
+                         f"{result.activity_id or ''} | {message} |")
+        return "\n".join(lines)
+
+
+def _source_name(source: PdfSource) -> str:
+    return os.path.basename(source) if isinstance(source, str) else source[0]
+
+
+def extract_pdf_text(source: PdfSource) -> str:
+    """
+    Extracts the text of an activity form, in the format used by the
+    upload of the Chatbot page. Runs in the worker processes.
+    """
+    import pymupdf
+
+    if isinstance(source, str):
+        document = pymupdf.open(source)
+    else:
+        document = pymupdf.open(stream=source[1], filetype="pdf")
+
+    with document as pdf:
+        pdf_text = ""
+        for page_num, page in enumerate(pdf, start=1):
+            pdf_text += f"Page {page_num}:\n{page.get_text()}\n\n"
+
+    return pdf_text
+
+
+def parse_pdfs(sources: Sequence[PdfSource],
+               max_workers: Optional[int] = None
+               ) -> List[Tuple[Optional[str], str]]:
+    """
+    Extracts the text of the PDFs in a process pool, a single PDF is parsed
+    in the current process.
+
+    Returns:
+    -------
+        List[Tuple[Optional[str], str]]
+            The (text, error) of every PDF, the text is None when the PDF
+            could not be parsed.
+    """
+    def guarded(function, *args):
+        try:
+            return function(*args), ""
+        except Exception as e:
+            return None, str(e)
+
+    if len(sources) <= 1:
+        return [guarded(extract_pdf_text, source) for source in sources]
+
+    max_workers = min(len(sources), max_workers or os.cpu_count() or 1)
+    # spawn: the pool can be created from the threads of Streamlit.
+    with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(extract_pdf_text, source)
+                   for source in sources]
+        return [guarded(future.result) for future in futures]
+
+
+async def _extract(chain, text: str, semaphore: asyncio.Semaphore):
+    """
+    Extracts the details of an activity and its text for the vector store.
+    Returns (parsed_output, vector_text, status, message).
+    """
+    async with semaphore:
+        try:
+            parsed_output = await chain.input_chain.ainvoke({"content": text})
+        except Exception as e:
+            return None, None, EXTRACTION_FAILED, str(e)
+
+        error = chain.validate(parsed_output)
+        if error is not None:
+            return None, None, INVALID, error
+
+        try:
+            vector_text = await chain.avector_text(parsed_output)
+        except Exception as e:
+            return None, None, EXTRACTION_FAILED, str(e)
+
+    return parsed_output, vector_text, IMPORTED, ""
+
+
+async def _extract_all(chain, texts: Sequence[str], max_concurrency: int):
+    semaphore = asyncio.Semaphore(max_concurrency)
+    return await asyncio.gather(*(_extract(chain, text, semaphore)
+                                  for text in texts))
+
+
+def _insert_activities(rows: List[tuple], vector_texts: List[str],
+                       db_path: Optional[str]) -> List[int]:
+    """
+    Insert the activities and record the upserts of their vectors, in one
+    transaction. Returns their IDs.
+    """
+    with transaction(db_path) as cursor:
+        # One statement per row: the ID of every activity is its lastrowid,
+        # rowids of a batch are not guaranteed to be consecutive.
+        act_ids = []
+        for row in rows:
+            cursor.execute(
+                """INSERT INTO activities
+                (host_id, activity_name, activity_description, location,
+                  city, max_participants, date_begin, date_finish)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", row)
+            act_ids.append(int(cursor.lastrowid))
+
+        cursor.executemany("""UPDATE activities SET pinecone_id = ?
+                              WHERE activity_id = ?""",
+                           [(act_id, act_id) for act_id in act_ids])
+        enqueue_upserts(cursor, "activities",
+                        [(str(act_id), vector_text,
+                          {"pinecone_id": str(act_id)})
+                         for act_id, vector_text in zip(act_ids,
+                                                        vector_texts)])
+
+    notify_outbox()
+    return act_ids
+
+
+def import_activities(sources: Sequence[PdfSource], host_id: int,
+                      llm=None, db_path: Optional[str] = None,
+                      max_workers: Optional[int] = None,
+                      max_concurrency: int = MAX_CONCURRENCY) -> ImportReport:
+    """
+    Creates the activities of many activity forms at once.
+
+    1. The PDFs are parsed in a process pool.
+    2. The details of the activities are extracted, validated and rewritten
+       for the vector store by the LLM, with at most max_concurrency calls
+       at the same time.
+    3. The valid activities are inserted in one transaction, with the
+       upserts of their vectors in the outbox. The
+       outbox worker embeds and upserts them in batches.
+
+    Parameters:
+    ----------
+        sources : Sequence[PdfSource]
+            The paths of the PDFs, or the (file name, content) of uploads.
+        host_id : int
+            The ID of the host of the activities.
+        llm : ChatOpenAI, optional
+            The language model, by default the one of CreateActivityChain.
+        db_path : str, optional
+            The path to the SQLite database.
+        max_workers : int, optional
+            The processes parsing the PDFs, by default the number of CPUs.
+        max_concurrency : int
+            The maximum number of LLM calls at the same time.
+
+    Returns:
+    -------
+        ImportReport
+            The outcome of every PDF.
+    """
+    from BeAlive.chatbot.chains.create_activity import CreateActivityChain
+
+    chain = (CreateActivityChain(llm=llm, db_path=db_path) if llm is not None
+             else CreateActivityChain(db_path=db_path))
+    db_path = chain.db_path
+
+    results = [FileResult(_source_name(source), IMPORTED)
+               for source in sources]
+
+    # 1. Parse
+    parsed = parse_pdfs(sources, max_workers)
+    pending = []
+    for index, (text, error) in enumerate(parsed):
+        if text is None:
+            results[index].status = PARSE_FAILED
+            results[index].message = error
+        else:
+            pending.append((index, text))
+
+    # 2. Extract
+    extracted = asyncio.run(_extract_all(chain, [text for _, text in pending],
+                                         max_concurrency))
+    activities = []
+    for (index, _), (parsed_output, vector_text, status, message) in zip(
+            pending, extracted):
+        if status != IMPORTED:
+            results[index].status = status
+            results[index].message = message
+        else:
+            activities.append((index, parsed_output, vector_text))
+
+    if not activities:
+        return ImportReport(results)
+
+    # 3. Insert
+    try:
+        act_ids = _insert_activities(
+            [(host_id, parsed_output.activity_name,
+              parsed_output.activity_description, parsed_output.location,
+              parsed_output.city, parsed_output.max_participants,
+              parsed_output.date_begin, parsed_output.date_finish)
+             for _, parsed_output, _ in activities],
+            [vector_text for _, _, vector_text in activities], db_path)
+    except Exception as e:
+        for index, _, _ in activities:
+            results[index].status = SAVE_FAILED
+            results[index].message = str(e)
+        return ImportReport(results)
+
+    for (index, _, _), act_id in zip(activities, act_ids):
+        results[index].activity_id = act_id
+
+    return ImportReport(results)
+
+
+if __name__ == "__main__":
+    # python -m BeAlive.chatbot.services.bulk_import --host-id 1 forms/ a.pdf
+    import argparse
+    import json
+    from dotenv import load_dotenv
+    from BeAlive.data.outbox import OutboxWorker
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Create the activities of many activity form PDFs.")
+    parser.add_argument("paths", nargs="+",
+                        help="PDF files or folders with PDF files.")
+    parser.add_argument("--host-id", type=int, required=True)
+    parser.add_argument("--db-path", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    pdf_files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            pdf_files.extend(sorted(os.path.join(path, name)
+                                    for name in os.listdir(path)
+                                    if name.lower().endswith(".pdf")))
+        else:
+            pdf_files.append(path)
+
+    report = import_activities(pdf_files, args.host_id, db_path=args.db_path,
+                               max_workers=args.workers,
+                               max_concurrency=args.concurrency)
+    # Apply the vector upserts before the process exits
+    OutboxWorker(args.db_path).drain()
+
+    print(json.dumps([result.__dict__ for result in report.results],
+                     indent=2))
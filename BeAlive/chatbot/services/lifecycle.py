@@ -0,0 +1,307 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from BeAlive.data.connection import db_cursor, transaction
+from BeAlive.data.outbox import enqueue_delete, notify_outbox
+
+logger = logging.getLogger(__name__)
+
+# Name of the job in scheduled_jobs.
+JOB_NAME = "activity_lifecycle"
+
+# Activities finished in a single transaction.
+BATCH_SIZE = 500
+
+# Seconds the lease is held without being renewed, a crashed sweeper is
+# replaced after it expires.
+LEASE_SECONDS = 60.0
+
+# Seconds between two sweeps when BEALIVE_SWEEP_INTERVAL is not set.
+DEFAULT_INTERVAL = 300.0
+
+# Identifies the sweepers of this process in the leases.
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+@dataclass
+class SweepResult:
+    """
+    The changes made by a sweep.
+
+    Attributes:
+    ----------
+        ran : bool
+            Whether the sweep ran, False when another process holds the
+            lease.
+        finished_activities : int
+            The open or full activities that were marked as finished.
+        expired_reservations : int
+            The pending reservations of finished activities that were
+            removed.
+    """
+
+    ran: bool = False
+    finished_activities: int = 0
+    expired_reservations: int = 0
+
+
+def _acquire_lease(db_path: Optional[str], now: float) -> bool:
+    """
+    Take or renew the lease of the job, returns whether it is held.
+    """
+    with transaction(db_path) as cursor:
+        cursor.execute("""INSERT OR IGNORE INTO scheduled_jobs (name)
+                          VALUES (?)""", (JOB_NAME,))
+        cursor.execute("""UPDATE scheduled_jobs
+                          SET lease_owner = ?, lease_expires_at = ?
+                          WHERE name = ?
+                          AND (lease_owner IS NULL OR lease_owner = ?
+                               OR lease_expires_at < ?)""",
+                       (_OWNER, now + LEASE_SECONDS, JOB_NAME, _OWNER, now))
+        return cursor.rowcount == 1
+
+
+def _release_lease(db_path: Optional[str], watermark: str):
+    """
+    Release the lease and save the progress of the job.
+    """
+    with transaction(db_path) as cursor:
+        cursor.execute("""UPDATE scheduled_jobs
+                          SET lease_owner = NULL, lease_expires_at = 0,
+                              watermark = ?, last_run_at = ?
+                          WHERE name = ? AND lease_owner = ?""",
+                       (watermark, time.time(), JOB_NAME, _OWNER))
+
+
+def _finish_batch(db_path: Optional[str], now: datetime,
+                  batch_size: int) -> tuple:
+    """
+    Mark a batch of open or full activities whose date_finish passed as
+    finished, remove their pending reservations and record the deletion of
+    their vectors, in one transaction. Returns the number of activities
+    and reservations.
+    """
+    with transaction(db_path) as cursor:
+        # One range of idx_activities_state_finish per state.
+        cursor.execute("""SELECT activity_id FROM activities
+                          WHERE activity_state IN ('open', 'full')
+                          AND date_finish < ?
+                          LIMIT ?""", (now, batch_size))
+        act_ids = [row[0] for row in cursor.fetchall()]
+        if not act_ids:
+            return 0, 0
+
+        rows = [(act_id,) for act_id in act_ids]
+        cursor.executemany("""UPDATE activities
+                              SET activity_state = 'finished',
+                                  pinecone_id = NULL
+                              WHERE activity_id = ?""", rows)
+        cursor.executemany("""DELETE FROM reservations
+                              WHERE activity_id = ? AND state = 'pending'""",
+                           rows)
+        expired = cursor.rowcount
+        enqueue_delete(cursor, "activities", [str(act_id)
+                                              for act_id in act_ids])
+
+    return len(act_ids), expired
+
+
+def _expire_reservations(db_path: Optional[str], since: Optional[str],
+                         now: datetime) -> int:
+    """
+    Remove the pending reservations of the activities that finished since
+    the watermark, including the ones finished by someone else.
+    """
+    with transaction(db_path) as cursor:
+        cursor.execute("""SELECT activity_id FROM activities
+                          WHERE activity_state = 'finished'
+                          AND date_finish >= ? AND date_finish < ?""",
+                       (since or "", now))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        # By the primary key of the reservations, (activity_id, ...).
+        cursor.executemany("""DELETE FROM reservations
+                              WHERE activity_id = ? AND state = 'pending'""",
+                           rows)
+        return cursor.rowcount
+
+
+def sweep(db_path: Optional[str] = None, now: Optional[datetime] = None,
+          batch_size: int = BATCH_SIZE) -> SweepResult:
+    """
+    Moves the activities through their lifecycle, if no other process is
+    sweeping: the open and full activities whose date_finish passed are
+    marked as finished, their vectors are deleted (through the outbox), and
+    the pending reservations of finished activities are removed, as if the
+    host had rejected them.
+
+    The work is incremental: the activities to finish are a range of the
+    (activity_state, date_finish) index, in batches of a transaction each,
+    and the reservations are only checked for the activities that finished
+    since the last sweep.
+
+    Parameters:
+    ----------
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+        now : datetime, optional
+            The current time, for tests.
+        batch_size : int
+            The activities finished per transaction.
+
+    Returns:
+    -------
+        SweepResult
+            The changes of the sweep.
+    """
+    now = now or datetime.now()
+    result = SweepResult()
+
+    if not _acquire_lease(db_path, time.time()):
+        return result
+    result.ran = True
+
+    with db_cursor(db_path) as cursor:
+        cursor.execute("SELECT watermark FROM scheduled_jobs WHERE name = ?",
+                       (JOB_NAME,))
+        watermark = cursor.fetchone()[0]
+
+    try:
+        while True:
+            finished, expired = _finish_batch(db_path, now, batch_size)
+            result.finished_activities += finished
+            result.expired_reservations += expired
+            if finished < batch_size:
+                break
+            if not _acquire_lease(db_path, time.time()):
+                logger.warning("Activity lifecycle: the lease was lost.")
+                return result
+
+        result.expired_reservations += _expire_reservations(db_path,
+                                                            watermark, now)
+
+    finally:
+        if result.finished_activities:
+            notify_outbox()
+
+    # The sqlite3 format of the datetime parameters
+    _release_lease(db_path, str(now))
+    return result
+
+
+class LifecycleSweeper:
+    """
+    Runs sweep in a background thread, every interval seconds. The lease
+    keeps the sweepers of several processes from running at the same time.
+
+    Attributes:
+    ----------
+        db_path : str
+            The path to the SQLite database, by default BeAlive.db.
+        interval : float
+            The seconds between two sweeps.
+
+    Methods:
+    -------
+        start():
+            Starts the background thread.
+        stop():
+            Stops the background thread.
+    """
+
+    def __init__(self, db_path: Optional[str] = None,
+                 interval: Optional[float] = None):
+        """
+        Initializes the sweeper, the thread is started by start.
+
+        Parameters:
+        ----------
+            db_path : str, optional
+                The path to the SQLite database, by default BeAlive.db.
+            interval : float, optional
+                The seconds between two sweeps, by default
+                BEALIVE_SWEEP_INTERVAL or DEFAULT_INTERVAL.
+        """
+        self.db_path = db_path
+        self.interval = interval or float(os.getenv("BEALIVE_SWEEP_INTERVAL",
+                                                    DEFAULT_INTERVAL))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                result = sweep(self.db_path)
+                if result.finished_activities or result.expired_reservations:
+                    logger.info("Activity lifecycle: %s", result)
+            except Exception as e:
+                logger.warning("Activity lifecycle sweep failed: %s", e)
+
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """
+        Starts the background thread, if it is not running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name="activity-lifecycle",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the background thread, after the current sweep.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_sweeper: Optional[LifecycleSweeper] = None
+_sweeper_lock = threading.Lock()
+
+
+def start_lifecycle_sweeper() -> LifecycleSweeper:
+    """
+    Starts the sweeper of the process, once. Set BEALIVE_SWEEP_INTERVAL to
+    "0" to disable it, when the sweep is scheduled outside of the app.
+    """
+    global _sweeper
+
+    if _sweeper is None:
+        with _sweeper_lock:
+            if _sweeper is None:
+                sweeper = LifecycleSweeper()
+                if os.getenv("BEALIVE_SWEEP_INTERVAL") != "0":
+                    sweeper.start()
+                _sweeper = sweeper
+
+    return _sweeper
+
+
+if __name__ == "__main__":
+    # python -m BeAlive.chatbot.services.lifecycle [path/to/database.db]
+    import sys
+    from dotenv import load_dotenv
+    from BeAlive.data.outbox import OutboxWorker
+
+    load_dotenv()
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else None
+    print(sweep(db_path))
+
+    # Apply the vector deletes before the process exits
+    OutboxWorker(db_path).drain()
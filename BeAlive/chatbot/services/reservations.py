@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from typing import Optional
+from BeAlive.data.connection import transaction
+
+# Statuses of a ReservationResult.
+ACCEPTED = "accepted"
+ACTIVITY_FULL = "full"
+ACTIVITY_CLOSED = "closed"
+NOT_PENDING = "not_pending"
+
+
+@dataclass
+class ReservationResult:
+    """
+    The result of accepting a reservation.
+
+    Attributes:
+    ----------
+        status : str
+            'accepted', 'full' (no places left), 'closed' (the activity is
+            finished or does not belong to the host) or 'not_pending' (there
+            is no pending reservation of the user).
+        number_participants : int
+            The number of participants of the activity after the operation,
+            -1 when the activity was not found.
+        max_participants : int
+            The maximum number of participants of the activity, -1 when the
+            activity was not found.
+    """
+
+    status: str
+    number_participants: int = -1
+    max_participants: int = -1
+
+    @property
+    def accepted(self) -> bool:
+        """
+        Whether the reservation was accepted.
+        """
+        return self.status == ACCEPTED
+
+    @property
+    def activity_full(self) -> bool:
+        """
+        Whether the activity has no places left.
+        """
+        return 0 <= self.max_participants <= self.number_participants
+
+
+def accept_reservation(activity_id: int, host_id: int, user_id: int,
+                       db_path: Optional[str] = None) -> ReservationResult:
+    """
+    Accept the pending reservation of a user in a single immediate
+    transaction.
+
+    The number of participants is only incremented while it is below the
+    maximum, and the activity becomes 'full' in the same statement, so
+    concurrent accepts can never go over max_participants. The reservation
+    is confirmed only when the increment succeeded.
+
+    Parameters:
+    ----------
+        activity_id : int
+            The ID of the activity.
+        host_id : int
+            The ID of the host of the activity.
+        user_id : int
+            The ID of the user who made the reservation.
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        ReservationResult
+            The status of the operation and the participants of the
+            activity.
+    """
+    with transaction(db_path) as cursor:
+        cursor.execute("""UPDATE activities
+                          SET number_participants = number_participants + 1,
+                              activity_state = CASE
+                                  WHEN number_participants + 1 >= max_participants
+                                  THEN 'full' ELSE activity_state END
+                          WHERE activity_id = ? AND host_id = ?
+                          AND activity_state = 'open'
+                          AND number_participants < max_participants
+                          AND EXISTS (SELECT 1 FROM reservations
+                                      WHERE activity_id = ? AND user_id = ?
+                                      AND state = 'pending')""",
+                       (activity_id, host_id, activity_id, user_id))
+        updated = cursor.rowcount == 1
+
+        if updated:
+            cursor.execute("""UPDATE reservations
+                              SET state = 'confirmed'
+                              WHERE activity_id = ? AND user_id = ?
+                              AND state = 'pending'""",
+                           (activity_id, user_id))
+
+        cursor.execute("""SELECT number_participants, max_participants,
+                                 activity_state
+                          FROM activities
+                          WHERE activity_id = ? AND host_id = ?""",
+                       (activity_id, host_id))
+        activity = cursor.fetchone()
+
+        if updated:
+            return ReservationResult(ACCEPTED, activity[0], activity[1])
+
+        if activity is None:
+            return ReservationResult(ACTIVITY_CLOSED)
+
+        cursor.execute("""SELECT 1 FROM reservations
+                          WHERE activity_id = ? AND user_id = ?
+                          AND state = 'pending'""",
+                       (activity_id, user_id))
+
+        if cursor.fetchone() is None:
+            status = NOT_PENDING
+        elif activity[2] == 'finished':
+            status = ACTIVITY_CLOSED
+        else:
+            status = ACTIVITY_FULL
+
+        return ReservationResult(status, activity[0], activity[1])
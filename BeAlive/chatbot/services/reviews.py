@@ -0,0 +1,225 @@
+import sqlite3
+from dataclasses import dataclass
+from typing import Optional
+from BeAlive.data.connection import transaction
+
+# Statuses of a ReviewResult.
+SAVED = "saved"
+INVALID = "invalid"
+NOT_FINISHED = "not_finished"
+NOT_ALLOWED = "not_allowed"
+ALREADY_REVIEWED = "already_reviewed"
+
+# Weight of a new review in the cumulative rating of an activity, of the
+# activity rating in the rating of its host and of a review in the rating
+# of a participant.
+ACTIVITY_REVIEW_WEIGHT = 0.5
+HOST_ACTIVITY_WEIGHT = 0.1
+USER_REVIEW_WEIGHT = 0.2
+
+# Lowest sentiment score used for the reviews of participants.
+MIN_USER_REVIEW_SCORE = 0.2
+
+
+@dataclass
+class ReviewResult:
+    """
+    The result of saving a review.
+
+    Attributes:
+    ----------
+        status : str
+            'saved', 'invalid' (bad rating, score or review), 'not_finished'
+            (the activity is not finished), 'not_allowed' (the reviewer did
+            not take part in the activity) or 'already_reviewed'.
+        rating : int
+            The rating saved with the review, -1 when it was not saved.
+        cumulative_rating : float
+            The new cumulative rating of the reviewed activity or user, -1
+            when the review was not saved.
+    """
+
+    status: str
+    rating: int = -1
+    cumulative_rating: float = -1
+
+    @property
+    def saved(self) -> bool:
+        """
+        Whether the review was saved.
+        """
+        return self.status == SAVED
+
+
+def _review_rating(rating: int, score: float) -> tuple:
+    """
+    Validate the rating (1 to 5, or -1 when the user did not give one) and
+    the sentiment score (0 to 1). Returns the rating to save and the value
+    used to update the cumulative rating, or None when they are invalid.
+    """
+    if not 0 <= score <= 1:
+        return None
+
+    if rating == -1:
+        return min(5, max(1, round(score * 5))), score * 5
+
+    if not 1 <= rating <= 5:
+        return None
+
+    return rating, (rating + score * 5) / 2
+
+
+def save_activity_review(activity_id: int, user_id: int, review: str,
+                         rating: int, score: float,
+                         db_path: Optional[str] = None) -> ReviewResult:
+    """
+    Save the review of an activity by a participant and update the ratings
+    of the activity and of its host, in a single immediate transaction.
+
+    The cumulative ratings are updated by SQL expressions over the stored
+    values, so concurrent reviews never overwrite each other.
+
+    Parameters:
+    ----------
+        activity_id : int
+            The ID of the finished activity.
+        user_id : int
+            The ID of the participant, with a confirmed reservation.
+        review : str
+            The text of the review.
+        rating : int
+            The rating (1 to 5), -1 to take it from the sentiment score.
+        score : float
+            The sentiment score of the review (0 to 1).
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        ReviewResult
+            The status, the saved rating and the new rating of the activity.
+    """
+    checked = _review_rating(rating, score)
+    if checked is None or not review or not review.strip():
+        return ReviewResult(INVALID)
+
+    rating, review_rating = checked
+
+    with transaction(db_path) as cursor:
+        cursor.execute("""SELECT a.activity_state, r.state
+                          FROM activities a LEFT JOIN reservations r
+                              ON r.activity_id = a.activity_id
+                              AND r.user_id = ?
+                          WHERE a.activity_id = ?""",
+                       (user_id, activity_id))
+        participation = cursor.fetchone()
+
+        if participation is None or participation[1] != 'confirmed':
+            return ReviewResult(NOT_ALLOWED)
+
+        if participation[0] != 'finished':
+            return ReviewResult(NOT_FINISHED)
+
+        try:
+            cursor.execute("""INSERT INTO review_activity (activity_id,
+                              user_id, review, rating)
+                              VALUES (?, ?, ?, ?)""",
+                           (activity_id, user_id, review, rating))
+
+        except sqlite3.IntegrityError:
+            return ReviewResult(ALREADY_REVIEWED)
+
+        cursor.execute("""UPDATE activities
+                          SET cumulative_rating =
+                              (1 - ?) * cumulative_rating + ? * ?
+                          WHERE activity_id = ?""",
+                       (ACTIVITY_REVIEW_WEIGHT, ACTIVITY_REVIEW_WEIGHT,
+                        review_rating, activity_id))
+
+        cursor.execute("""UPDATE users
+                          SET cumulative_rating =
+                              (1 - ?) * cumulative_rating + ? *
+                              (SELECT cumulative_rating FROM activities
+                               WHERE activity_id = ?)
+                          WHERE user_id = (SELECT host_id FROM activities
+                                           WHERE activity_id = ?)""",
+                       (HOST_ACTIVITY_WEIGHT, HOST_ACTIVITY_WEIGHT,
+                        activity_id, activity_id))
+
+        cursor.execute("""SELECT cumulative_rating FROM activities
+                          WHERE activity_id = ?""", (activity_id,))
+
+        return ReviewResult(SAVED, rating, cursor.fetchone()[0])
+
+
+def save_user_review(host_id: int, activity_id: int, user_id: int,
+                     review: str, rating: int, score: float,
+                     db_path: Optional[str] = None) -> ReviewResult:
+    """
+    Save the review of a participant by the host of an activity and update
+    the rating of the participant, in a single immediate transaction.
+
+    Parameters:
+    ----------
+        host_id : int
+            The ID of the host of the activity.
+        activity_id : int
+            The ID of the finished activity.
+        user_id : int
+            The ID of the participant, with a confirmed reservation.
+        review : str
+            The text of the review.
+        rating : int
+            The rating (1 to 5), -1 to take it from the sentiment score.
+        score : float
+            The sentiment score of the review (0 to 1), raised to
+            MIN_USER_REVIEW_SCORE.
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        ReviewResult
+            The status, the saved rating and the new rating of the user.
+    """
+    checked = _review_rating(rating, max(score, MIN_USER_REVIEW_SCORE))
+    if checked is None or not review or not review.strip():
+        return ReviewResult(INVALID)
+
+    rating, review_rating = checked
+
+    with transaction(db_path) as cursor:
+        cursor.execute("""SELECT a.activity_state, r.state
+                          FROM activities a LEFT JOIN reservations r
+                              ON r.activity_id = a.activity_id
+                              AND r.user_id = ?
+                          WHERE a.activity_id = ? AND a.host_id = ?""",
+                       (user_id, activity_id, host_id))
+        participation = cursor.fetchone()
+
+        if participation is None or participation[1] != 'confirmed':
+            return ReviewResult(NOT_ALLOWED)
+
+        if participation[0] != 'finished':
+            return ReviewResult(NOT_FINISHED)
+
+        try:
+            cursor.execute("""INSERT INTO review_user (host_id, activity_id,
+                              user_id, review, rating)
+                              VALUES (?, ?, ?, ?, ?)""",
+                           (host_id, activity_id, user_id, review, rating))
+
+        except sqlite3.IntegrityError:
+            return ReviewResult(ALREADY_REVIEWED)
+
+        cursor.execute("""UPDATE users
+                          SET cumulative_rating =
+                              (1 - ?) * cumulative_rating + ? * ?
+                          WHERE user_id = ?""",
+                       (USER_REVIEW_WEIGHT, USER_REVIEW_WEIGHT,
+                        review_rating, user_id))
+
+        cursor.execute("""SELECT cumulative_rating FROM users
+                          WHERE user_id = ?""", (user_id,))
+
+        return ReviewResult(SAVED, rating, cursor.fetchone()[0])
@@ -0,0 +1,119 @@
+"""
+Rebuilds the local activities index (BEALIVE_VECTOR_STORE=local) from the
+open activities of SQLite, which the local backend does not have otherwise:
+only the activities created afterwards are added to it.
+
+Every activity is embedded from the same text as its Pinecone vector: the
+summaries written by the database notebook (text_for _embedings_and _ID.pkl)
+for the original activities, and the summary of the CreateActivityChain for
+the others, or their name and description with --no-llm. The texts are
+embedded in one batch through the embedding cache.
+
+Usage:
+    python -m BeAlive.chatbot.services.seed_activities [--no-llm] [--keep]
+"""
+import argparse
+import json
+import os
+import pickle
+from typing import Dict, Optional
+from BeAlive.data.loader import BASE_DIR, get_sqlite_database_path
+from BeAlive.data.connection import db_cursor
+from BeAlive.data.vector_store import get_vector_store
+
+# The summaries of the activities of the original Pinecone index, as
+# (activity_id, text).
+TEXTS_PATH = os.path.join(BASE_DIR, "database",
+                          "text_for _embedings_and _ID.pkl")
+
+OPEN_ACTIVITIES_QUERY = """SELECT activity_id, activity_name,
+                                  activity_description, location,
+                                  max_participants, city, date_begin,
+                                  date_finish
+                           FROM activities
+                           WHERE activity_state = 'open'"""
+
+
+def _load_texts(path: str) -> Dict[int, str]:
+    """
+    The saved summaries of the activities, by activity id.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as file:
+        return {int(activity_id): text
+                for activity_id, text in pickle.load(file)}
+
+
+def seed(db_path: Optional[str] = None, texts_path: str = TEXTS_PATH,
+         use_llm: bool = True, keep: bool = False) -> dict:
+    """
+    Embeds the open activities into the local activities index.
+
+    Parameters:
+    ----------
+    db_path : str, optional
+        The SQLite database, by default get_sqlite_database_path().
+    texts_path : str
+        The saved summaries of the original activities.
+    use_llm : bool
+        Whether the activities without a saved summary are summarized by
+        the CreateActivityChain, or embedded from their name and
+        description.
+    keep : bool
+        Whether to keep the vectors already in the index, by default the
+        index is cleared first.
+
+    Returns:
+    -------
+    dict
+        The number of activities indexed, by source of their text.
+    """
+    from BeAlive.chatbot.chains.create_activity import (CreateActivityChain,
+                                                        CreateActvityInput,
+                                                        format_activity)
+
+    with db_cursor(db_path or get_sqlite_database_path()) as cursor:
+        cursor.execute(OPEN_ACTIVITIES_QUERY)
+        columns = [column[0] for column in cursor.description]
+        activities = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    saved = _load_texts(texts_path)
+    chain = CreateActivityChain() if use_llm else None
+
+    ids, texts, counts = [], [], {"saved": 0, "summarized": 0,
+                                  "description": 0}
+    for activity in activities:
+        activity_id = activity.pop("activity_id")
+        details = CreateActvityInput(**activity)
+        if activity_id in saved:
+            text, source = saved[activity_id], "saved"
+        elif chain is not None:
+            text, source = chain.vector_text(details), "summarized"
+        else:
+            text, source = format_activity(details), "description"
+        ids.append(str(activity_id))
+        texts.append(text)
+        counts[source] += 1
+
+    store = get_vector_store("activities", backend="local")
+    if not keep:
+        store.delete(delete_all=True)
+    if ids:
+        store.add_texts(texts, [{"pinecone_id": vector_id}
+                                for vector_id in ids], ids)
+
+    return {"indexed": len(ids), **counts}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--no-llm", action="store_true",
+                        help="Embed the activities without a saved summary "
+                             "from their name and description.")
+    parser.add_argument("--keep", action="store_true",
+                        help="Keep the vectors already in the index.")
+    args = parser.parse_args()
+
+    print(json.dumps(seed(use_llm=not args.no_llm, keep=args.keep),
+                     indent=2))
@@ -0,0 +1,148 @@
+import threading
+from typing import List, Optional, Sequence
+
+# Model used to score the reviews of users and activities.
+SENTIMENT_MODEL = "distilbert-base-uncased-finetuned-sst-2-english"
+
+
+class SentimentScorer:
+    """
+    Scores the sentiment of texts with a sequence classification model.
+
+    The tokenizer and the model are loaded on the first use and kept for the
+    life of the process, and the scoring runs in inference mode. A lock
+    serializes the scoring, since the fast tokenizers cannot be shared by
+    threads running at the same time.
+
+    Attributes:
+    ----------
+        model_name : str
+            The name of the Hugging Face model.
+        max_batch_size : int
+            The maximum number of texts scored in one forward pass.
+
+    Methods:
+    -------
+        score_batch(texts: Sequence[str]) -> List[float]:
+            Returns the probability of a positive sentiment of every text.
+        score(text: str) -> float:
+            Returns the probability of a positive sentiment of a text.
+    """
+
+    def __init__(self, model_name: str = SENTIMENT_MODEL,
+                 max_batch_size: int = 32):
+        """
+        Initializes the scorer, the model is only loaded on the first use.
+
+        Parameters:
+        ----------
+            model_name : str
+                The name of the Hugging Face model.
+            max_batch_size : int
+                The maximum number of texts scored in one forward pass.
+        """
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._score_lock = threading.Lock()
+
+    def _load(self):
+        """
+        Load the tokenizer and the model once.
+        """
+        if self._model is not None:
+            return
+
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            from transformers import (AutoModelForSequenceClassification,
+                                      AutoTokenizer)
+
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(
+                self.model_name)
+            model.eval()
+
+            self._tokenizer = tokenizer
+            self._model = model
+
+    def score_batch(self, texts: Sequence[str]) -> List[float]:
+        """
+        Returns the probability of a positive sentiment of every text.
+
+        Parameters:
+        ----------
+            texts : Sequence[str]
+                The texts to score.
+
+        Returns:
+        -------
+            List[float]
+                The scores between 0 and 1, in the order of the texts.
+        """
+        if not texts:
+            return []
+
+        self._load()
+        import torch
+
+        scores = []
+        with self._score_lock, torch.inference_mode():
+            for start in range(0, len(texts), self.max_batch_size):
+                inputs = self._tokenizer(
+                    list(texts[start:start + self.max_batch_size]),
+                    return_tensors="pt", truncation=True, padding=True)
+                logits = self._model(**inputs).logits
+                scores.extend(torch.softmax(logits, dim=1)[:, 1].tolist())
+
+        return scores
+
+    def score(self, text: str) -> float:
+        """
+        Returns the probability of a positive sentiment of a text.
+
+        Parameters:
+        ----------
+            text : str
+                The text to score.
+
+        Returns:
+        -------
+            float
+                The score between 0 and 1.
+        """
+        return self.score_batch([text])[0]
+
+
+_scorer: Optional[SentimentScorer] = None
+_scorer_lock = threading.Lock()
+
+
+def get_sentiment_scorer() -> SentimentScorer:
+    """
+    Returns the sentiment scorer shared by the whole process.
+    """
+    global _scorer
+
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = SentimentScorer()
+
+    return _scorer
+
+
+def set_sentiment_scorer(scorer: SentimentScorer):
+    """
+    Replaces the sentiment scorer of the process, e.g. with a local
+    stand-in for the benchmarks.
+    """
+    global _scorer
+
+    with _scorer_lock:
+        _scorer = scorer
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+from BeAlive.chatbot.registry import ComponentRegistry, get_component_registry
+
+logger = logging.getLogger(__name__)
+
+# Components built by the warm-up, in order: the router and the extraction
+# of the route run for every message, the agents load the sentiment model
+# only when a review is made.
+WARMUP_COMPONENTS = ("router", "route_extract", "chitchat", "activity_search",
+                     "company_information", "delete_activities",
+                     "reservation_agent", "check_agent", "reviews_agent")
+
+
+class WarmUp:
+    """
+    Loads the models of the chatbot in a background thread, after the
+    worker started, so the first messages do not pay for them: the chains
+    and agents of the registry (the router loads its encoder and the intent
+    embeddings) and the sentiment model of the reviews.
+
+    The steps are independent, a failed step is logged and the others still
+    run, the component is then built on its first use as before.
+
+    Attributes:
+    ----------
+        registry : ComponentRegistry
+            The registry whose components are built.
+        components : Sequence[str]
+            The components to build, in order.
+        sentiment : bool
+            Whether the sentiment model is loaded.
+        ready : threading.Event
+            Set when the warm-up finished, with or without errors.
+        timings : Dict[str, float]
+            The seconds of every step.
+        errors : Dict[str, str]
+            The error of every failed step.
+
+    Methods:
+    -------
+        run():
+            Runs the warm-up in the current thread.
+        start():
+            Runs the warm-up in a background thread.
+        wait(timeout) -> bool:
+            Waits for the warm-up, returns whether it finished.
+    """
+
+    def __init__(self, registry: Optional[ComponentRegistry] = None,
+                 components: Sequence[str] = WARMUP_COMPONENTS,
+                 sentiment: bool = True):
+        """
+        Initializes the warm-up, nothing is loaded until run or start.
+
+        Parameters:
+        ----------
+            registry : ComponentRegistry, optional
+                The registry whose components are built, by default the
+                registry of the process.
+            components : Sequence[str]
+                The components to build, in order.
+            sentiment : bool
+                Whether the sentiment model is loaded.
+        """
+        self.registry = registry or get_component_registry()
+        self.components = components
+        self.sentiment = sentiment
+        self.ready = threading.Event()
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _step(self, name: str, load):
+        start = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            logger.warning("Warm-up of %s failed: %s", name, e)
+            self.errors[name] = str(e)
+        self.timings[name] = time.perf_counter() - start
+
+    def run(self):
+        """
+        Runs the warm-up in the current thread and sets ready.
+        """
+        try:
+            for name in self.components:
+                self._step(name, lambda name=name: self.registry.get(name))
+
+            if self.sentiment:
+                from BeAlive.chatbot.services.sentiment import (
+                    get_sentiment_scorer)
+                self._step("sentiment",
+                           lambda: get_sentiment_scorer().score("Warm up"))
+        finally:
+            self.ready.set()
+
+        logger.info("Warm-up finished in %.2fs", sum(self.timings.values()))
+
+    def start(self):
+        """
+        Runs the warm-up in a background thread, once.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, name="warm-up",
+                                            daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits for the warm-up, returns whether it finished.
+        """
+        return self.ready.wait(timeout)
+
+
+_warmup: Optional[WarmUp] = None
+_warmup_lock = threading.Lock()
+
+
+def start_warmup() -> WarmUp:
+    """
+    Starts the warm-up of the process, once. Set BEALIVE_WARMUP to "0" to
+    disable it, the models are then loaded on their first use and the
+    warm-up is reported as ready right away.
+    """
+    global _warmup
+
+    if _warmup is None:
+        with _warmup_lock:
+            if _warmup is None:
+                warmup = WarmUp()
+                if os.getenv("BEALIVE_WARMUP", "1") != "0":
+                    warmup.start()
+                else:
+                    warmup.ready.set()
+                _warmup = warmup
+
+    return _warmup
+
+
+def is_ready() -> bool:
+    """
+    Whether the warm-up of the process finished, for readiness checks. False
+    before it is started.
+    """
+    return _warmup is not None and _warmup.ready.is_set()
+
+
+if __name__ == "__main__":
+    # python -m BeAlive.chatbot.services.warmup
+    import json
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    warmup = WarmUp()
+    warmup.run()
+    print(json.dumps({"seconds": {name: round(seconds, 3) for name, seconds
+                                  in warmup.timings.items()},
+                      "errors": warmup.errors}, indent=2))
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# The user of the calls made outside of a Streamlit session (scripts,
+# benchmarks), set with session_user.
+_user_id: ContextVar[Optional[int]] = ContextVar("bealive_user_id",
+                                                 default=None)
+
+
+def current_user_id(user_id: Optional[int] = None) -> int:
+    """
+    Returns the given user id, the user set with session_user, or the id of
+    the user logged in the Streamlit session. Read at call time, so the
+    chains and tools can be imported, and called with an explicit user,
+    outside of a session.
+
+    Parameters:
+    ----------
+        user_id : int, optional
+            The id of the user, by default the user of the session.
+
+    Returns:
+    -------
+        int
+            The id of the user.
+    """
+    if user_id is not None:
+        return user_id
+
+    user_id = _user_id.get()
+    if user_id is not None:
+        return user_id
+
+    import streamlit as st
+    return st.session_state.user_id
+
+
+@contextmanager
+def session_user(user_id: int) -> Iterator[int]:
+    """
+    Context manager that makes a user the current user of the calls of the
+    block, without a Streamlit session.
+
+    Parameters:
+    ----------
+        user_id : int
+            The id of the user.
+
+    Yields:
+    -------
+        int
+            The id of the user.
+    """
+    token = _user_id.set(user_id)
+    try:
+        yield user_id
+    finally:
+        _user_id.reset(token)
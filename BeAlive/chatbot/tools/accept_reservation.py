@@ -1,11 +1,15 @@
-import sqlite3
-import streamlit as st
-from typing import Type
+import asyncio
+from typing import Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.check_reservation_user_id import GetReservationUserIDChain
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.services.reservations import (ACTIVITY_CLOSED, ACTIVITY_FULL,
+                                                   NOT_PENDING, ReservationResult,
+                                                   accept_reservation)
+from BeAlive.chatbot.resolvers.username import resolve_user_id
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
 
 
 class ReservationInfo(BaseModel):
@@ -24,6 +28,51 @@ class ReservationInfo(BaseModel):
     user: str
     activity_name: str
 
+
+def _fetch_host_activities(db_path: str, host_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the activities of a host.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                          FROM activities
+                          WHERE host_id = ?""",  (host_id,))
+        return cursor.fetchall()
+
+
+def _fetch_pending_reservations(db_path: str, activity_id: int) -> list:
+    """
+    Get the (user_id, username) of the pending reservations of an activity.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT r.user_id, u.username
+                            FROM reservations r join users u
+                                 on r.user_id = u.user_id
+                            WHERE r.activity_id = ? and
+                            r.state = 'pending'""",
+                       (activity_id,))
+        return cursor.fetchall()
+
+
+def _result_message(result: ReservationResult) -> str:
+    """
+    Message for the user with the result of accepting a reservation.
+    """
+    if result.status == ACTIVITY_FULL:
+        return "The reservation could not be accepted, the activity is already full."
+
+    if result.status == ACTIVITY_CLOSED:
+        return "The reservation could not be accepted, the activity is no longer open."
+
+    if result.status == NOT_PENDING:
+        return "The reservation could not be accepted, it is no longer pending."
+
+    if result.activity_full:
+        return "The reservation has been successfully accepted. The activity is now full."
+
+    return "The reservation has been successfully accepted"
+
+
 class AcceptActivityReservationTool(BaseTool):
     """
     Tool to accept reservations for activities hosted by the user.
@@ -41,8 +90,10 @@ class AcceptActivityReservationTool(BaseTool):
 
     Methods:
     --------
-        _run(host_id: int = st.session_state.user_id, **kwargs) -> str:
+        _run(host_id: Optional[int] = None, **kwargs) -> str:
             Accept a reservation for an activity.
+        _arun(host_id: Optional[int] = None, **kwargs) -> str:
+            Asynchronous version of _run.
 
     """
 
@@ -53,7 +104,7 @@ class AcceptActivityReservationTool(BaseTool):
 
     def _run(
         self,
-        host_id: int = st.session_state.user_id,
+        host_id: Optional[int] = None,
         **kwargs
     ) -> str:
         """
@@ -72,43 +123,26 @@ class AcceptActivityReservationTool(BaseTool):
                 The result of the tool execution.
 
         """
+        host_id = current_user_id(host_id)
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
         try:
-            cursor.execute("""SELECT activity_id, activity_name
-                              FROM activities
-                              WHERE host_id = ?""",  (host_id,))
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_host_activities(db_path, host_id)
 
         except:
             return "An error occurred while obtaining the list of your activities."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            activity_id = GetActivityIDChain().invoke({'user_input': kwargs.get("activity_name", "No activity"),
-                                                       'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(kwargs.get("activity_name", "No activity"), activity_list)
 
             if activity_id.activity_id == -1:
                 return "An error occurred. You don't have any activities with that name."
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            cursor.execute("""SELECT r.user_id, u.username
-                                FROM reservations r join users u
-                                     on r.user_id = u.user_id
-                                WHERE r.activity_id = ? and
-                                r.state = 'pending'""",
-                           (activity_id.activity_id,))
-            reservation_user_list = cursor.fetchall()
+            reservation_user_list = _fetch_pending_reservations(
+                db_path, activity_id.activity_id)
 
             if len(reservation_user_list) == 0:
                 return "There are currently no pending reservations for that activity"
@@ -116,47 +150,30 @@ class AcceptActivityReservationTool(BaseTool):
         except:
             return "An error occurred while obtaining the list of reservations."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            user_id = GetReservationUserIDChain().invoke({'user_input': kwargs.get("user", "No user"),
-                                                         'reservation_list': str(reservation_user_list)})
+            user_id = resolve_user_id(kwargs.get("user", "No user"), reservation_user_list)
             if user_id.user_id == -1:
                 return "An error occurred. You don't have any reservations with that username for that activity."
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            cursor.execute("""UPDATE reservations
-                                SET state = 'confirmed'
-                                WHERE activity_id = ? and user_id = ?""", 
-                           (activity_id.activity_id, user_id.user_id,))
-            cursor.execute("""UPDATE activities
-                                SET number_participants = number_participants + 1
-                                WHERE activity_id = ?""",
-                           (activity_id.activity_id,))
-            cursor.execute("""SELECT number_participants, max_participants
-                                FROM activities
-                                WHERE activity_id = ?""",
-                           (activity_id.activity_id,))
-            participants = cursor.fetchone()
-            if participants[0] == participants[1]:
-                cursor.execute("""UPDATE activities
-                                SET activity_state = 'full'
-                                WHERE activity_id = ?""",
-                               (activity_id.activity_id,))
-            connection.commit()
+            result = accept_reservation(activity_id.activity_id, host_id,
+                                        user_id.user_id, db_path)
 
         except:
             return "An error occurred while accepting the reservation."
 
-        finally:
-            cursor.close()
-            connection.close()
+        return _result_message(result)
 
-        return "The reservation has been successfully accepted"
+    async def _arun(
+        self,
+        host_id: Optional[int] = None,
+        **kwargs
+    ) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, current_user_id(host_id),
+                                       **kwargs)
@@ -1,11 +1,12 @@
-import sqlite3
-from typing import Type
-import streamlit as st
+import asyncio
+from typing import Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.process_query_output import QueryProcessingChain
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.rendering import QueryResult, render_result
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
 
 
 class CheckActivityReservationInput(BaseModel):
@@ -18,11 +19,44 @@ class CheckActivityReservationInput(BaseModel):
             The ID of the host.
         user_input : str
             The user input.
+        page : int
+            The page of the reservations, from 1.
 
     """
 
     host_id: int
     user_input: str
+    page: int = 1
+
+
+def _fetch_host_activities(db_path: str, host_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the activities of a host.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                          FROM activities
+                          WHERE host_id = ?""",  (host_id,))
+        return cursor.fetchall()
+
+
+RESERVATIONS_QUERY = """SELECT a.activity_name, a.activity_state, u.username,
+                              u.cumulative_rating,
+                              u.phone_number, u.email, r.message, r.state
+                        FROM reservations r join activities a join users u
+                            on r.activity_id = a.activity_id and
+                            u.user_id = r.user_id
+                        WHERE r.host_id = ? and a.activity_id = ?"""
+
+
+def _fetch_reservations(db_path: str, host_id: int,
+                        activity_id: int) -> QueryResult:
+    """
+    Get the reservations of an activity of the host (RESERVATIONS_QUERY).
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute(RESERVATIONS_QUERY, (host_id, activity_id))
+        return QueryResult.from_cursor(cursor)
 
 
 class CheckActivityReservationTool(BaseTool):
@@ -43,8 +77,12 @@ class CheckActivityReservationTool(BaseTool):
 
     Methods:
     --------
-        _run(user_input: str, host_id: int = st.session_state.user_id) -> str:
+        _run(user_input: str, host_id: Optional[int] = None,
+             page: int = 1) -> str:
             Retrieve reservations for an activity.
+        _arun(user_input: str, host_id: Optional[int] = None,
+              page: int = 1) -> str:
+            Asynchronous version of _run.
     """
 
     name: str = "CheckActivityReservationTool"
@@ -55,7 +93,8 @@ class CheckActivityReservationTool(BaseTool):
     def _run(
         self,
         user_input: str,
-        host_id: int = st.session_state.user_id
+        host_id: Optional[int] = None,
+        page: int = 1
     ) -> str:
         """
         Retrieve reservations for an activity.
@@ -66,61 +105,51 @@ class CheckActivityReservationTool(BaseTool):
                 The user input.
             host_id : int
                 The ID of the host.
+            page : int
+                The page of the results, from 1.
         Returns:
         --------
             str
                 The result of the tool.
         """
+        host_id = current_user_id(host_id)
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
         try:
-            cursor.execute("""SELECT activity_id, activity_name
-                              FROM activities
-                              WHERE host_id = ?""",  (host_id,))
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_host_activities(db_path, host_id)
 
         except:
             return "An error occurred while obtaining your activities."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            activity_id = GetActivityIDChain().invoke({'user_input': user_input,
-                                                       'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(user_input, activity_list)
             if activity_id.activity_id == -1:
                 return "An error occurred. You don't have any activities with that name."
 
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            query = """SELECT a.activity_name, a.activity_state, u.username,
-                              u.cumulative_rating,
-                              u.phone_number, u.email, r.message, r.state
-                        FROM reservations r join activities a join users u
-                            on r.activity_id = a.activity_id and
-                            u.user_id = r.user_id
-                        WHERE r.host_id = ? and a.activity_id = ?"""
-            cursor.execute(query, (host_id, activity_id.activity_id))
-            reservations = cursor.fetchall()
+            reservations = _fetch_reservations(db_path, host_id,
+                                               activity_id.activity_id)
             if len(reservations) == 0:
                 return "You currently have no reservations for that activity."
 
         except:
             return "An error occurred while obtaining the reservations."
 
-        finally:
-            cursor.close()
-            connection.close()
+        return render_result(reservations, "activity_reservations",
+                             page=page)
 
-        return QueryProcessingChain().invoke({
-                "user_input": str(reservations),
-                "sql_query": query
-                })
+    async def _arun(
+        self,
+        user_input: str,
+        host_id: Optional[int] = None,
+        page: int = 1
+    ) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, user_input,
+                                       current_user_id(host_id), page)
@@ -1,9 +1,38 @@
-import sqlite3
-import streamlit as st
+import asyncio
+from typing import Optional
 from langchain.tools import BaseTool
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.process_query_output import QueryProcessingChain
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.rendering import QueryResult, render_result
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
+
+
+def _fetch_host_finished_activities(db_path: str, host_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the finished activities of a
+    host.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                          FROM activities
+                          WHERE host_id = ? and activity_state = 'finished'""",
+                          (host_id,))
+        return cursor.fetchall()
+
+
+REVIEWS_QUERY = """SELECT review, rating
+                    FROM review_activity
+                    WHERE activity_id = ?"""
+
+
+def _fetch_reviews(db_path: str, activity_id: int) -> QueryResult:
+    """
+    Get the reviews of an activity (REVIEWS_QUERY).
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute(REVIEWS_QUERY, (activity_id,))
+        return QueryResult.from_cursor(cursor)
 
 
 class CheckActivityReviewsTool(BaseTool):
@@ -21,8 +50,12 @@ class CheckActivityReviewsTool(BaseTool):
 
     Methods:
     --------
-        _run(user_input: str, host_id: int = st.session_state.user_id) -> str:
+        _run(user_input: str, host_id: Optional[int] = None,
+             page: int = 1) -> str:
             Retrieve reviews for an activity.
+        _arun(user_input: str, host_id: Optional[int] = None,
+              page: int = 1) -> str:
+            Asynchronous version of _run.
     
     """
     name: str = "CheckActivityReviewsTool"
@@ -32,7 +65,8 @@ class CheckActivityReviewsTool(BaseTool):
     def _run(
         self,
         user_input: str,
-        host_id: int= st.session_state.user_id
+        host_id: Optional[int] = None,
+        page: int = 1
     ) -> str:
         """
         Retrieve reviews for an activity.
@@ -43,58 +77,50 @@ class CheckActivityReviewsTool(BaseTool):
                 The user input.
             host_id : int
                 The ID of the host.
+            page : int
+                The page of the results, from 1.
         Returns:
         --------
             str
                 The result of the tool.
         
         """
+        host_id = current_user_id(host_id)
 
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
         try:
-            cursor.execute("""SELECT activity_id, activity_name
-                              FROM activities
-                              WHERE host_id = ? and activity_state = 'finished'""",
-                              (host_id,))
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_host_finished_activities(db_path, host_id)
 
         except:
             return "An error occurred while obtaining your activities."
 
-        finally:
-            cursor.close()
-            connection.close()
         try:
-            activity_id = GetActivityIDChain().invoke({'user_input': user_input,
-                                                      'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(user_input, activity_list)
             if activity_id.activity_id == -1:
                 return "An error occurred. You don't have any activities with that name."
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            query = """SELECT review, rating
-                        FROM review_activity
-                        WHERE activity_id = ?"""
-            cursor.execute(query, (activity_id.activity_id,))
-            reviews = cursor.fetchall()
+            reviews = _fetch_reviews(db_path, activity_id.activity_id)
             if len(reviews) == 0:
                 return "You currently have no reviews for that activity"
 
         except:
             return "An error occurred while obtaining the reviews."
 
-        finally:
-            cursor.close()
-            connection.close()
+        return render_result(reviews, "activity_reviews", page=page)
 
-        return QueryProcessingChain().invoke({
-                "user_input": str(reviews),
-                "sql_query": query
-                })
+    async def _arun(
+        self,
+        user_input: str,
+        host_id: Optional[int] = None,
+        page: int = 1
+    ) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, user_input,
+                                       current_user_id(host_id), page)
@@ -1,9 +1,37 @@
-import sqlite3
-import streamlit as st
+import asyncio
+from typing import Optional
 from langchain.tools import BaseTool
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.process_query_output import QueryProcessingChain
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.rendering import QueryResult, render_result
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
+
+
+def _fetch_host_activities(db_path: str, host_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the activities of a host.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                          FROM activities
+                          WHERE host_id = ?""",  (host_id,))
+        return cursor.fetchall()
+
+
+PARTICIPANTS_QUERY = """SELECT activity_name, number_participants, 
+                        max_participants
+                        FROM activities
+                        WHERE activity_id = ?"""
+
+
+def _fetch_participants(db_path: str, activity_id: int) -> QueryResult:
+    """
+    Get the number of participants of an activity (PARTICIPANTS_QUERY).
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute(PARTICIPANTS_QUERY, (activity_id,))
+        return QueryResult.from_cursor(cursor)
 
 
 class CheckActivityNumberParticipantsTool(BaseTool):
@@ -21,8 +49,10 @@ class CheckActivityNumberParticipantsTool(BaseTool):
 
     Methods:
     --------
-    _run(self, user_input: str, host_id: int = st.session_state.user_id) ->str:
+    _run(self, user_input: str, host_id: Optional[int] = None) ->str:
         Retrieves the number of participants for an activity.
+    _arun(self, user_input: str, host_id: Optional[int] = None) ->str:
+        Asynchronous version of _run.
 
     """
 
@@ -33,7 +63,7 @@ class CheckActivityNumberParticipantsTool(BaseTool):
     def _run(
         self,
         user_input: str,
-        host_id: int = st.session_state.user_id
+        host_id: Optional[int] = None
     ) -> str:
 
         """
@@ -52,50 +82,39 @@ class CheckActivityNumberParticipantsTool(BaseTool):
             The number of participants for an activity.
 
         """
+        host_id = current_user_id(host_id)
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
         try:
-            cursor.execute("""SELECT activity_id, activity_name
-                              FROM activities
-                              WHERE host_id = ?""",  (host_id,))
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_host_activities(db_path, host_id)
 
         except:
             return "An error occurred while obtaining the list of your activities."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            activity_id = GetActivityIDChain().invoke({'user_input': user_input,
-                                                      'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(user_input, activity_list)
             if activity_id.activity_id == -1:
                 return "An error occurred. You don't have any activities with that name."
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            query = """SELECT activity_name, number_participants, 
-                        max_participants
-                        FROM activities
-                        WHERE activity_id = ?"""
-            cursor.execute(query, (activity_id.activity_id,))
-            reservations = cursor.fetchall()
+            reservations = _fetch_participants(db_path,
+                                               activity_id.activity_id)
 
         except:
             return "An error occurred while obtaining the information about the activity."
 
-        finally:
-            cursor.close()
-            connection.close()
+        return render_result(reservations, "participants")
 
-        return QueryProcessingChain().invoke({
-                "user_input": str(reservations),
-                "sql_query": query
-                })
+    async def _arun(
+        self,
+        user_input: str,
+        host_id: Optional[int] = None
+    ) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, user_input,
+                                       current_user_id(host_id))
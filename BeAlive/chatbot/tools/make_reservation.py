@@ -1,10 +1,11 @@
-import sqlite3
-import streamlit as st
-from typing import Type
+import asyncio
+from typing import Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
 from BeAlive.chatbot.chains.get_activity_message import GetActivityMessageChain
 
 class MakeReservationInfo(BaseModel):
@@ -23,6 +24,40 @@ class MakeReservationInfo(BaseModel):
     activity_name: str
 
 
+def _fetch_open_activities(db_path: str) -> list:
+    """
+    Get the (activity_id, activity_name) of the open activities.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                            FROM activities
+                            WHERE activity_state = 'open'""")
+        return cursor.fetchall()
+
+
+def _fetch_activity_host(db_path: str, activity_id: int) -> int:
+    """
+    Get the host id of an activity.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT host_id
+                        FROM activities
+                        WHERE activity_id = ?""", 
+                       (activity_id,))
+        return cursor.fetchone()[0]
+
+
+def _insert_reservation(db_path: str, activity_id: int, host_id: int,
+                        user_id: int, message: str):
+    """
+    Insert a pending reservation of the user for an activity.
+    """
+    with db_cursor(db_path, commit=True) as cursor:
+        cursor.execute("""INSERT INTO reservations (activity_id, host_id,
+                        user_id, message) VALUES (?,?,?,?)""",
+                       (activity_id, host_id, user_id, message,))
+
+
 class MakeActivityReservationTool(BaseTool):
     """
     Tool for making a reservation for an activity.
@@ -41,8 +76,10 @@ class MakeActivityReservationTool(BaseTool):
 
     Methods:
     -------
-        _run(self, user_id: int = st.session_state.user_id, **kwargs) -> str:
+        _run(self, user_id: Optional[int] = None, **kwargs) -> str:
             Makes a reservation for an activity.
+        _arun(self, user_id: Optional[int] = None, **kwargs) -> str:
+            Asynchronous version of _run.
 
     """
     name: str = "MakeActivityReservationTool"
@@ -51,7 +88,7 @@ class MakeActivityReservationTool(BaseTool):
     return_direct: bool = True
 
     def _run(self,
-             user_id: int = st.session_state.user_id,
+             user_id: Optional[int] = None,
              **kwargs) -> str:
 
         """
@@ -70,26 +107,17 @@ class MakeActivityReservationTool(BaseTool):
                 The result of the reservation.
 
         """
+        user_id = current_user_id(user_id)
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
         try:
-            cursor.execute("""SELECT activity_id, activity_name
-                                FROM activities
-                                WHERE activity_state = 'open'""")
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_open_activities(db_path)
 
         except:
             return "An error occurred while obtaining the list of available activities."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            activity_id = GetActivityIDChain().invoke({'user_input': kwargs.get("activity_name", "No activity"),
-                                                      'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(kwargs.get("activity_name", "No activity"), activity_list)
 
             if activity_id.activity_id == -1:
                 return "An error occurred. There are no available activities with that name."
@@ -104,34 +132,29 @@ class MakeActivityReservationTool(BaseTool):
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
             # Obtaining the host id
-            cursor.execute("""SELECT host_id
-                            FROM activities
-                            WHERE activity_id = ?""", 
-                           (activity_id.activity_id,))
-
-            activity_info = cursor.fetchone()
-            activity_host = activity_info[0]
+            activity_host = _fetch_activity_host(db_path,
+                                                 activity_id.activity_id)
         except:
             return "An error occurred."
 
         try:
-            cursor.execute("""INSERT INTO reservations (activity_id, host_id,
-                            user_id, message) VALUES (?,?,?,?)""",
-                           (activity_id.activity_id, activity_host,
-                            user_id, message.message,))
-            connection.commit()
+            _insert_reservation(db_path, activity_id.activity_id,
+                                activity_host, user_id, message.message)
 
         except:
             return """An error occurred while inserting the reservations
             (you may already have one reservation for that activity)."""
 
-        finally:
-            cursor.close()
-            connection.close()
-
         return "Your reservation has been made"
+
+    async def _arun(self,
+                    user_id: Optional[int] = None,
+                    **kwargs) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, current_user_id(user_id),
+                                       **kwargs)
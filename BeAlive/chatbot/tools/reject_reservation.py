@@ -1,11 +1,12 @@
-import sqlite3
-import streamlit as st
-from typing import Type
+import asyncio
+from typing import Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.check_reservation_user_id import GetReservationUserIDChain
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.resolvers.username import resolve_user_id
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
 
 
 class ReservationInfo(BaseModel):
@@ -25,6 +26,44 @@ class ReservationInfo(BaseModel):
     activity_name: str
 
 
+def _fetch_host_activities(db_path: str, host_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the activities of a host.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                            FROM activities
+                            WHERE host_id = ?""",  (host_id,))
+        return cursor.fetchall()
+
+
+def _fetch_pending_reservations(db_path: str, activity_id: int) -> list:
+    """
+    Get the (user_id, username) of the pending reservations of an activity.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT r.user_id, u.username
+                            FROM reservations r join users u 
+                                on r.user_id = u.user_id
+                            WHERE r.activity_id = ? and r.state = 'pending'
+                       """, (activity_id,))
+        return cursor.fetchall()
+
+
+def _delete_reservation(db_path: str, activity_id: int, user_id: int,
+                        host_id: int):
+    """
+    Delete a pending reservation of an activity of the host.
+    """
+    with db_cursor(db_path, commit=True) as cursor:
+        cursor.execute(
+                        """DELETE FROM reservations
+                            WHERE activity_id = ? AND user_id = ? AND
+                            state = 'pending' AND host_id = ?""",
+                            (activity_id, user_id, host_id),
+                        )
+
+
 class RejectActivityReservationTool(BaseTool):
     """
     Tool to reject a reservation for an activity.
@@ -42,8 +81,10 @@ class RejectActivityReservationTool(BaseTool):
 
     Methods:
     --------
-        _run(self, user_input: str, host_id: int = st.session_state.user_id) ->str:
+        _run(self, user_input: str, host_id: Optional[int] = None) ->str:
             Rejects a reservation for an activity based on user input and host ID.
+        _arun(self, user_input: str, host_id: Optional[int] = None) ->str:
+            Asynchronous version of _run.
 
     """
     name: str = "RejectActivityReservationTool"
@@ -53,7 +94,7 @@ class RejectActivityReservationTool(BaseTool):
 
     def _run(
             self,
-            host_id: int = st.session_state.user_id,
+            host_id: Optional[int] = None,
             **kwargs
         ) -> str:
         """
@@ -75,43 +116,26 @@ class RejectActivityReservationTool(BaseTool):
                 or a status).
 
         """
+        host_id = current_user_id(host_id)
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
         try:
-            cursor.execute("""SELECT activity_id, activity_name
-                                FROM activities
-                                WHERE host_id = ?""",  (host_id,))
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_host_activities(db_path, host_id)
 
         except:
             return "An error occurred while obtaining the list of your activities."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            activity_id = GetActivityIDChain().invoke({
-                'user_input': kwargs.get("activity_name", "No activity"),
-                'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(kwargs.get("activity_name", "No activity"), activity_list)
 
             if activity_id.activity_id == -1:
                 return "An error occurred. You don't have any activities with that name."
         except:
             return "An error occurred. Be more clear"
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            cursor.execute("""SELECT r.user_id, u.username
-                                FROM reservations r join users u 
-                                    on r.user_id = u.user_id
-                                WHERE r.activity_id = ? and r.state = 'pending'
-                           """, (activity_id.activity_id,))
-            reservation_user_list = cursor.fetchall()
+            reservation_user_list = _fetch_pending_reservations(
+                db_path, activity_id.activity_id)
 
             if len(reservation_user_list) == 0:
                 return "There are currently no pending reservations for that activity"
@@ -119,14 +143,8 @@ class RejectActivityReservationTool(BaseTool):
         except:
             return "An error occurred while obtaining the list of reservations."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         try:
-            user_id = GetReservationUserIDChain().invoke({
-                'user_input': kwargs.get("user", "No user"),
-                'reservation_list': str(reservation_user_list)})
+            user_id = resolve_user_id(kwargs.get("user", "No user"), reservation_user_list)
 
             if user_id.user_id == -1:
                 return "An error occurred. You don't have any reservations with that username for that activity."
@@ -134,24 +152,23 @@ class RejectActivityReservationTool(BaseTool):
         except:
             return "An error occurred."
 
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            cursor.execute(
-                            """DELETE FROM reservations
-                                WHERE activity_id = ? AND user_id = ? AND
-                                state = 'pending' AND host_id = ?""",
-                                (activity_id.activity_id, 
-                                 user_id.user_id, host_id),
-                            )
-            connection.commit()
+            _delete_reservation(db_path, activity_id.activity_id,
+                                user_id.user_id, host_id)
 
         except:
             return "An error occurred while rejecting the reservations."
 
-        finally:
-            cursor.close()
-            connection.close()
-
         return "The reservation has been successfully rejected"
+
+    async def _arun(
+            self,
+            host_id: Optional[int] = None,
+            **kwargs
+        ) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, current_user_id(host_id),
+                                       **kwargs)
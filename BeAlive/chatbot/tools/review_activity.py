@@ -1,14 +1,16 @@
-import sqlite3
-from typing import Type
-import numpy as np
-import torch
-import streamlit as st
+import asyncio
+from typing import Optional, Type
 from langchain.tools import BaseTool
 from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
-from BeAlive.chatbot.chains.check_rating import GetRatingChain
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.services.sentiment import get_sentiment_scorer
+from BeAlive.chatbot.services.reviews import (ALREADY_REVIEWED, INVALID,
+                                              NOT_ALLOWED, NOT_FINISHED, SAVED,
+                                              save_activity_review)
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
+from BeAlive.chatbot.chains.check_rating import resolve_rating
 from BeAlive.chatbot.chains.check_review import GetReviewChain
 
 
@@ -22,6 +24,57 @@ class ActivityReviewInfo(BaseModel):
     rating: int
 
 
+# The answer for every status of a review of an activity.
+REVIEW_MESSAGES = {
+    SAVED: "The review was inserted successfully",
+    INVALID: "The review was not saved. The rating must be from 1 to 5 and "
+             "the review cannot be empty.",
+    NOT_FINISHED: "The activity has not finished yet. You can review it once "
+                  "it is over.",
+    NOT_ALLOWED: "You can only review the activities you took part in.",
+    ALREADY_REVIEWED: "You have already reviewed this activity.",
+}
+
+
+def _fetch_attended_activities(db_path: str, user_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the finished activities where
+    the user had a confirmed reservation.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT a.activity_id, a.activity_name
+                            FROM activities a JOIN reservations r
+                            ON a.activity_id = r.activity_id
+                            WHERE r.user_id = ? AND r.state = 'confirmed'
+                            AND a.activity_state = 'finished'
+                       """, (user_id,))
+        return cursor.fetchall()
+
+
+def _save_activity_review(db_path: str, user_id: int, activity_id: int,
+                          review: str, rating: int) -> str:
+    """
+    Score the review and save it with the new cumulative ratings of the
+    activity and of its host. Returns the message for the user.
+    """
+    try:
+        score = get_sentiment_scorer().score(review)
+
+    except:
+        return "An error occurred while updating the cumulative rating."
+
+    try:
+        result = save_activity_review(activity_id, user_id, review, rating,
+                                      score, db_path)
+
+    except:
+        return "An error occurred while inserting the review."
+
+    return REVIEW_MESSAGES.get(
+        result.status,
+        "An error occurred while retrieving the activity information.")
+
+
 class ReviewActivityTool(BaseTool):
     """
     A tool for reviewing activities that a user attended or reviewing a user
@@ -40,16 +93,19 @@ class ReviewActivityTool(BaseTool):
 
     Methods:
     -------
-        _run(self, **kwargs) -> str:
+        _run(self, user_id: Optional[int] = None, **kwargs) -> str:
             Executes the tool's functionality.
 
+        _arun(self, user_id: Optional[int] = None, **kwargs) -> str:
+            Asynchronous version of _run.
+
     """
     name: str = "ReviewActivitesTools"
     description: str = "Review an activity."
     args_schema: Type[BaseModel] = ActivityReviewInfo
     return_direct: bool = True
 
-    def _run(self, **kwargs) -> str:
+    def _run(self, user_id: Optional[int] = None, **kwargs) -> str:
 
         """
         Review an activity that a user attended or reviewing a user that
@@ -57,6 +113,8 @@ class ReviewActivityTool(BaseTool):
 
         Parameters:
         ----------
+            user_id : int
+                The ID of the user, by default the user of the session.
             **kwargs : dict
                 Keyword arguments containing the input data for the tool.
 
@@ -67,13 +125,11 @@ class ReviewActivityTool(BaseTool):
         """
 
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
-        user_id = st.session_state.user_id
+        user_id = current_user_id(user_id)
 
         try:
-            rating = GetRatingChain().invoke({"user_input": kwargs.get("rating", -1)})
+            rating = resolve_rating(kwargs.get("rating", -1))
 
             review = GetReviewChain().invoke({"user_input": kwargs.get("review", 'No review')})
 
@@ -81,119 +137,25 @@ class ReviewActivityTool(BaseTool):
             return "An error occurred."
 
         try:
-            cursor.execute("""SELECT a.activity_id, a.activity_name
-                                FROM activities a JOIN reservations r
-                                ON a.activity_id = r.activity_id
-                                WHERE r.user_id = ? AND r.state = 'confirmed'
-                                AND a.activity_state = 'finished'
-                           """, (user_id,))
-            activity_list = cursor.fetchall()
+            activity_list = _fetch_attended_activities(db_path, user_id)
 
-            activity_id = GetActivityIDChain().invoke({"user_input": kwargs.get("activity_name", "No activity"),
-                                                      'activity_list': str(activity_list)})
+            activity_id = resolve_activity_id(kwargs.get("activity_name", "No activity"), activity_list)
 
             if activity_id.activity_id == -1:
                 return "An error occurred. You haven't attended any activities with that name."
 
-            cursor.execute("""SELECT cumulative_rating, host_id
-                                FROM activities
-                                WHERE activity_id = ? and 
-                                activity_state = 'finished' """,
-                           (activity_id.activity_id,))
-
-            cumulative_rating_act = cursor.fetchone()
-            host_id = cumulative_rating_act[1]
-
         except:
             return "An error occurred while retrieving the activity information."
 
-        finally:
-            cursor.close()
-            connection.close()
-
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
+        return _save_activity_review(db_path, user_id,
+                                     activity_id.activity_id,
+                                     review.review, rating.rating)
 
-        try:
-            tokenizer = AutoTokenizer.from_pretrained("distilbert-base-uncased-finetuned-sst-2-english")
-            model = AutoModelForSequenceClassification.from_pretrained("distilbert-base-uncased-finetuned-sst-2-english")
-
-            inputs = tokenizer(review.review, return_tensors="pt",
-                               truncation=True, padding=True)
-
-            outputs = model(**inputs)
-            logits = outputs.logits
-
-            score = torch.softmax(logits, dim=1)[0][1].item()
-
-            if rating.rating == -1:
-                rating.rating = round(score*5)
-                cumulative_rating_activity = 0.5 * cumulative_rating_act[0] + 0.5 * (score*5)
-            else:
-                cumulative_rating_activity = 0.5 * cumulative_rating_act[0] + 0.5 * np.mean([float(rating.rating), (score * 5)])
-
-            connection = sqlite3.connect(db_path)
-            cursor = connection.cursor()
-            try:
-                cursor.execute("""SELECT cumulative_rating from users
-                               WHERE user_id = ?""", (host_id,))
-                cumulative_rating_host = cursor.fetchone()
-
-            except:
-                return "An error occurred while retrieving the user info."
-            finally:
-                cursor.close()
-                connection.close()
-
-            host_cumulative_rating_new = 0.9 * cumulative_rating_host[0] + 0.1 * cumulative_rating_activity
-
-            connection = sqlite3.connect(db_path)
-            cursor = connection.cursor()
-
-            try:
-                cursor.execute("""INSERT INTO review_activity (activity_id,
-                               user_id , review , rating)
-                                VALUES (?, ?, ?, ?)""",
-                               (activity_id.activity_id,
-                                user_id,
-                                review.review,
-                                rating.rating))
-                connection.commit()
-            except:
-                return "An error occurred while inserting the review."
-            finally:
-                cursor.close()
-                connection.close()
-
-            connection = sqlite3.connect(db_path)
-            cursor = connection.cursor()
-            try:
-                cursor.execute("""UPDATE activities SET cumulative_rating = ?
-                               WHERE activity_id = ?""",
-                               (cumulative_rating_activity,
-                                activity_id.activity_id))
-                connection.commit()
-            except:
-                return "An error occurred while updating the activity rating."
-
-            finally:
-                cursor.close()
-                connection.close()
-
-            connection = sqlite3.connect(db_path)
-            cursor = connection.cursor()
-            try:
-                cursor.execute("""UPDATE users SET cumulative_rating = ?
-                               WHERE user_id = ?""",
-                               (host_cumulative_rating_new, host_id))
-                connection.commit()
-            except:
-                return "An error occurred while updating the host rating."
-            finally:
-                cursor.close()
-                connection.close()
-
-        except:
-            return "An error occurred while updating the cumulative rating."
-
-        return "The review was inserted successfully"
+    async def _arun(self, user_id: Optional[int] = None,
+                    **kwargs) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, current_user_id(user_id),
+                                       **kwargs)
@@ -1,15 +1,17 @@
-import sqlite3
-from typing import Type
-import streamlit as st
+import asyncio
+from typing import Optional, Type
 from langchain.tools import BaseTool
+from BeAlive.chatbot.session import current_user_id
 from BeAlive.data.loader import get_sqlite_database_path
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+from BeAlive.data.connection import db_cursor
+from BeAlive.chatbot.services.sentiment import get_sentiment_scorer
+from BeAlive.chatbot.services.reviews import (ALREADY_REVIEWED, INVALID,
+                                              NOT_ALLOWED, NOT_FINISHED, SAVED,
+                                              save_user_review)
 from pydantic import BaseModel
-import numpy as np
-from BeAlive.chatbot.chains.check_activity_id import GetActivityIDChain
-from BeAlive.chatbot.chains.check_reservation_user_id import GetReservationUserIDChain
-from BeAlive.chatbot.chains.check_rating import GetRatingChain
+from BeAlive.chatbot.resolvers.activity_index import resolve_activity_id
+from BeAlive.chatbot.resolvers.username import resolve_user_id
+from BeAlive.chatbot.chains.check_rating import resolve_rating
 from BeAlive.chatbot.chains.check_review import GetReviewChain
 
 
@@ -34,6 +36,69 @@ class UserReviewInfo(BaseModel):
     rating: int
 
 
+# The answer for every status of a review of a participant.
+REVIEW_MESSAGES = {
+    SAVED: "The review was inserted successfully",
+    INVALID: "The review was not saved. The rating must be from 1 to 5 and "
+             "the review cannot be empty.",
+    NOT_FINISHED: "The activity is active. You cannot review users.",
+    NOT_ALLOWED: "You can only review the confirmed participants of your "
+                 "activities.",
+    ALREADY_REVIEWED: "You have already reviewed this user for this activity.",
+}
+
+
+def _fetch_host_finished_activities(db_path: str, host_id: int) -> list:
+    """
+    Get the (activity_id, activity_name) of the finished activities of a
+    host.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT activity_id, activity_name
+                            FROM activities
+                            WHERE host_id = ? and
+                            activity_state = 'finished'""", (host_id,))
+        return cursor.fetchall()
+
+
+def _fetch_confirmed_participants(db_path: str, activity_id: int) -> list:
+    """
+    Get the (user_id, username) of the confirmed participants of an
+    activity.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT r.user_id, u.username
+                        FROM reservations r JOIN users u
+                            on r.user_id = u.user_id
+                        WHERE r.activity_id = ? and r.state = 'confirmed'
+                       """, (activity_id,))
+        return cursor.fetchall()
+
+
+def _save_user_review(db_path: str, host_id: int, activity_id: int,
+                      user_id: int, review: str, rating: int) -> str:
+    """
+    Score the review and save it with the new cumulative rating of the
+    participant. Returns the message for the user.
+    """
+    try:
+        score = get_sentiment_scorer().score(review)
+
+    except:
+        return "An error occurred while updating the rating."
+
+    try:
+        result = save_user_review(host_id, activity_id, user_id, review,
+                                  rating, score, db_path)
+
+    except:
+        return "An error occurred while inserting the review."
+
+    return REVIEW_MESSAGES.get(
+        result.status,
+        "An error occurred while retrieving the state of the activity.")
+
+
 class ReviewUsersTool(BaseTool):
     """
     Tool to review a user and update their cumulative rating.
@@ -51,23 +116,28 @@ class ReviewUsersTool(BaseTool):
 
     Methods:
     --------
-    _run(self, **kwargs) -> str:
+    _run(self, host_id: Optional[int] = None, **kwargs) -> str:
         Processes the user review and updates their
         rating and review details in the database.
 
+    _arun(self, host_id: Optional[int] = None, **kwargs) -> str:
+        Asynchronous version of _run.
+
     """
     name: str = "ReviewUsersTool"
     description: str = "Review users and score."
     args_schema: Type[BaseModel] = UserReviewInfo
     return_direct: bool = True
 
-    def _run(self, **kwargs) -> str:
+    def _run(self, host_id: Optional[int] = None, **kwargs) -> str:
         """
         Processes the user review and updates their
         rating and review details in the database.
 
         Parameters:
         -----------
+        host_id : int
+            The ID of the host, by default the user of the session.
         **kwargs : dict
             Dictionary containing the user input arguments.
 
@@ -79,15 +149,12 @@ class ReviewUsersTool(BaseTool):
 
         """
         db_path = get_sqlite_database_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
 
-        host_id = st.session_state.user_id
+        host_id = current_user_id(host_id)
 
         try:
 
-            rating = GetRatingChain().invoke({
-                "user_input": kwargs.get('rating', -1)})
+            rating = resolve_rating(kwargs.get('rating', -1))
 
             review = GetReviewChain().invoke({
                 "user_input": kwargs.get('review', 'No review')})
@@ -96,39 +163,19 @@ class ReviewUsersTool(BaseTool):
             return "An error occurred."
 
         try:
-
-            cursor.execute("""SELECT activity_id, activity_name
-                                FROM activities
-                                WHERE host_id = ? and
-                                activity_state = 'finished'""", (host_id,))
-            activity_list = cursor.fetchall()
-            activity_id = GetActivityIDChain().invoke({
-                "user_input": kwargs.get("activity_name", "No activity"),
-                'activity_list': str(activity_list)})
+            activity_list = _fetch_host_finished_activities(db_path, host_id)
+            activity_id = resolve_activity_id(kwargs.get("activity_name", "No activity"), activity_list)
 
             if activity_id.activity_id == -1:
                 return "An error occurred. You don't have any activities with that name."
         except:
             return "An error occurred. Please be more clear."
 
-        finally:
-            cursor.close()
-            connection.close()
-
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
         try:
-            cursor.execute("""SELECT r.user_id, u.username
-                            FROM reservations r JOIN users u
-                                on r.user_id = u.user_id
-                            WHERE r.activity_id = ? and r.state = 'confirmed'
-                           """, (activity_id.activity_id,))
-            reservation_user_list = cursor.fetchall()
+            reservation_user_list = _fetch_confirmed_participants(
+                db_path, activity_id.activity_id)
 
-            user_id = GetReservationUserIDChain().invoke({
-                'user_input': kwargs.get("user", "No user"),
-                'reservation_list': str(reservation_user_list)})
+            user_id = resolve_user_id(kwargs.get("user", "No user"), reservation_user_list)
 
             if user_id.user_id == -1:
                 return "An error occurred. You don't have any participants with that username for that activity."
@@ -136,109 +183,15 @@ class ReviewUsersTool(BaseTool):
         except:
             return "An error occurred."
 
-        finally:
-            cursor.close()
-            connection.close()
-
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-
-        try:
-            cursor.execute(""" SELECT activity_state 
-                                FROM activities
-                                WHERE activity_id = ?""",
-                                  (activity_id.activity_id,))
-
-            activity_state = cursor.fetchone()
-
-        except:
-            return "An error occurred while retrieving the state of the activity."
-
-        finally:
-            cursor.close()
-            connection.close()
-
-
-        try:
-            if activity_state[0] != "finished":
-                return "The activity is active. You cannot review users."
-
-            else:
-                tokenizer = AutoTokenizer.from_pretrained(
-                    "distilbert-base-uncased-finetuned-sst-2-english")
-                model = AutoModelForSequenceClassification.from_pretrained(
-                    "distilbert-base-uncased-finetuned-sst-2-english")
-
-                inputs = tokenizer(review.review, return_tensors="pt",
-                                    truncation=True, padding=True)
-
-                outputs = model(**inputs)
-                logits = outputs.logits
-
-                score = torch.softmax(logits, dim=1)[0][1].item()
-
-                if score < 0.2:
-                    score = 0.2
-
-                connection = sqlite3.connect(db_path)
-                cursor = connection.cursor()
-
-                try:
-                    cursor.execute("""SELECT cumulative_rating 
-                                   FROM users WHERE user_id = ?""",
-                                     (user_id.user_id,))
-                    cumulative_rating = cursor.fetchone()
-
-                except:
-                    return "An error occurred while retrieving the cumulative rating. torch"
-
-                finally:
-                    cursor.close()
-                    connection.close()
-
-                if rating.rating != -1:
-                    final_score = (0.8 * cumulative_rating[0]) + 0.2 * np.mean(
-                        [float(rating.rating), (score * 5)])
-                else:
-                    rating.rating = round(score*5)      
-                    final_score = (0.8 * cumulative_rating[0]) + 0.2 * (
-                        score*5)
-
-                connection = sqlite3.connect(db_path)
-                cursor = connection.cursor()
-                try:
-                    cursor.execute("""INSERT INTO review_user
-                                   (host_id, activity_id, user_id ,
-                                    review , rating)
-                                    VALUES (?, ?, ?, ?, ?)""",
-                                      (host_id,
-                                        activity_id.activity_id,
-                                        user_id.user_id,
-                                        review.review,
-                                        rating.rating))
-
-                    connection.commit()
-                except:
-                    return "An error occurred while inserting the review."
-                finally:
-                    cursor.close()
-                    connection.close()
-
-                connection = sqlite3.connect(db_path)
-                cursor = connection.cursor()
-                try:
-                    cursor.execute("""UPDATE users SET cumulative_rating = ?
-                                   WHERE user_id = ?""",
-                                     (final_score, user_id.user_id))
-                    connection.commit()
-                except:
-                    return "An error occurred while updating the cumulative rating."
-
-                finally:
-                    cursor.close()
-                    connection.close()
+        return _save_user_review(db_path, host_id, activity_id.activity_id,
+                                 user_id.user_id, review.review,
+                                 rating.rating)
 
-        except:
-            return "An error occurred while updating the rating."
-
-        return "The review was inserted successfully"
+    async def _arun(self, host_id: Optional[int] = None,
+                    **kwargs) -> str:
+        """
+        Asynchronous version of _run. The user is read from the session
+        here, and _run runs in a worker thread.
+        """
+        return await asyncio.to_thread(self._run, current_user_id(host_id),
+                                       **kwargs)
@@ -0,0 +1,263 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from BeAlive.data.connection import db_cursor
+
+# Seconds between two checks of the version of the calendar of a user.
+VERSION_CHECK_INTERVAL = 5.0
+
+# Date windows kept per user, the least recently used are dropped first.
+MAX_WINDOWS = 4
+
+# Users whose events are kept, the least recently used are dropped first.
+MAX_USERS = 1000
+
+# Format of the dates of the database, compared as text.
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_calendar_version(user_id: int, db_path: Optional[str] = None) -> int:
+    """
+    Returns the version of the calendar of a user, incremented by the
+    triggers of the reservations and activities whenever its events change.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT version FROM calendar_versions
+                          WHERE user_id = ?""", (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+def fetch_calendar_events(user_id: int, start: datetime, end: datetime,
+                          db_path: Optional[str] = None) -> List[dict]:
+    """
+    Returns the events of the calendar of a user that overlap a date window:
+    the activities of its confirmed reservations and the activities it
+    hosts.
+
+    Parameters:
+    ----------
+        user_id : int
+            The id of the user.
+        start : datetime
+            The start of the window.
+        end : datetime
+            The end of the window, excluded.
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        List[dict]
+            The events in the format of the calendar (title, start, end),
+            ordered by their start.
+    """
+    start, end = start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)
+
+    with db_cursor(db_path) as cursor:
+        # idx_reservations_user_state and idx_activities_host_begin
+        cursor.execute("""SELECT a.activity_name || ', ' || a.location,
+                                 a.date_begin, a.date_finish
+                          FROM reservations r JOIN activities a
+                               ON a.activity_id = r.activity_id
+                          WHERE r.user_id = ? AND r.state = 'confirmed'
+                          AND a.date_begin < ? AND a.date_finish > ?
+
+                          UNION
+
+                          SELECT activity_name || ', ' || location,
+                                 date_begin, date_finish
+                          FROM activities
+                          WHERE host_id = ?
+                          AND date_begin < ? AND date_finish > ?
+
+                          ORDER BY 2""",
+                       (user_id, end, start, user_id, end, start))
+        rows = cursor.fetchall()
+
+    return [{"title": title, "start": begin, "end": finish}
+            for title, begin, finish in rows]
+
+
+class _UserEvents:
+    """
+    The cached windows of a user and the version of its calendar.
+    """
+
+    def __init__(self, version: int, checked: float):
+        self.version = version
+        self.checked = checked
+        self.windows: "OrderedDict[Tuple[str, str], List[dict]]" = \
+            OrderedDict()
+
+
+class CalendarEventProvider:
+    """
+    Cache of the events of the calendars of the users, by date window.
+
+    A window is read from the database once, the windows inside a cached
+    window are filtered from it without a query. The events of a user are
+    dropped when the version of its calendar changes, the version is read at
+    most every VERSION_CHECK_INTERVAL seconds.
+
+    Attributes:
+    ----------
+        db_path : str
+            The path to the SQLite database, by default BeAlive.db.
+        check_interval : float
+            The seconds between two checks of the version of a calendar.
+
+    Methods:
+    -------
+        events(user_id, start, end, check_version) -> List[dict]:
+            Returns the events of a user that overlap a date window.
+        invalidate(user_id):
+            Drops the cached events of a user, or of every user.
+        stats() -> Dict[str, int]:
+            Returns the metrics of the cache.
+    """
+
+    def __init__(self, db_path: Optional[str] = None,
+                 check_interval: float = VERSION_CHECK_INTERVAL,
+                 max_windows: int = MAX_WINDOWS, max_users: int = MAX_USERS):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+        ----------
+            db_path : str, optional
+                The path to the SQLite database, by default BeAlive.db.
+            check_interval : float
+                The seconds between two checks of the version of a calendar.
+            max_windows : int
+                The windows kept per user.
+            max_users : int
+                The users whose events are kept.
+        """
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self.max_windows = max_windows
+        self.max_users = max_users
+
+        self._lock = threading.Lock()
+        self._users: "OrderedDict[int, _UserEvents]" = OrderedDict()
+        self._metrics = {"lookups": 0, "queries": 0, "version_checks": 0,
+                         "invalidations": 0}
+
+    def _user(self, user_id: int, now: float,
+              check_version: bool) -> _UserEvents:
+        """
+        The cached events of a user, dropped when its version changed.
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None and (not check_version or
+                                     now - user.checked < self.check_interval):
+                self._users.move_to_end(user_id)
+                return user
+
+        version = get_calendar_version(user_id, self.db_path)
+
+        with self._lock:
+            self._metrics["version_checks"] += 1
+            user = self._users.get(user_id)
+            if user is None or user.version != version:
+                if user is not None:
+                    self._metrics["invalidations"] += 1
+                user = self._users[user_id] = _UserEvents(version, now)
+            user.checked = now
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            return user
+
+    def events(self, user_id: int, start: datetime, end: datetime,
+               check_version: bool = True) -> List[dict]:
+        """
+        Returns the events of a user that overlap a date window.
+
+        Parameters:
+        ----------
+            user_id : int
+                The id of the user.
+            start : datetime
+                The start of the window.
+            end : datetime
+                The end of the window, excluded.
+            check_version : bool
+                Whether the version of the calendar is checked, when it was
+                not checked for check_interval seconds. False reuses the
+                cached events of the user without any query, if they cover
+                the window.
+
+        Returns:
+        -------
+            List[dict]
+                The events in the format of the calendar (title, start,
+                end), ordered by their start.
+        """
+        user = self._user(user_id, time.monotonic(), check_version)
+        window = (start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT))
+
+        with self._lock:
+            self._metrics["lookups"] += 1
+            for (cached_start, cached_end), events in user.windows.items():
+                if cached_start <= window[0] and window[1] <= cached_end:
+                    user.windows.move_to_end((cached_start, cached_end))
+                    if (cached_start, cached_end) == window:
+                        return events
+                    return [event for event in events
+                            if event["start"] < window[1]
+                            and event["end"] > window[0]]
+
+        events = fetch_calendar_events(user_id, start, end, self.db_path)
+
+        with self._lock:
+            self._metrics["queries"] += 1
+            # Not cached when the events of the user were dropped meanwhile
+            if self._users.get(user_id) is user:
+                user.windows[window] = events
+                while len(user.windows) > self.max_windows:
+                    user.windows.popitem(last=False)
+
+        return events
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """
+        Drops the cached events of a user, or of every user.
+        """
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+            self._metrics["invalidations"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the lookups, the database queries, the checks of the
+        versions and the invalidations of the cache.
+        """
+        with self._lock:
+            return dict(self._metrics, users=len(self._users))
+
+
+_provider: Optional[CalendarEventProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_calendar_provider() -> CalendarEventProvider:
+    """
+    Returns the calendar event cache of the process, shared by every
+    session.
+    """
+    global _provider
+
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = CalendarEventProvider()
+
+    return _provider
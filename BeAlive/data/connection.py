@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.data.migrations import migrate
+from BeAlive.data.tracing import TracedCursor, current_span
+
+# Seconds a connection waits for a lock held by another connection.
+BUSY_TIMEOUT = float(os.getenv("BEALIVE_SQLITE_BUSY_TIMEOUT", 5.0))
+
+# Number of prepared statements kept by every connection.
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every new connection. WAL lets readers work while a write is
+# in progress, and with WAL synchronous=NORMAL only fsyncs on checkpoints.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(BUSY_TIMEOUT * 1000),
+    "cache_size": -16000,  # 16 MB of page cache
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+_local = threading.local()
+
+# Called with every new connection, e.g. to trace its statements.
+_connect_hooks: List[Callable[[sqlite3.Connection], None]] = []
+
+# Databases already migrated by this process.
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    Open a connection to the database and apply the pragmas. The first
+    connection of the process to a database upgrades its schema.
+    """
+    connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT,
+                                 cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma, value in PRAGMAS.items():
+        connection.execute(f"PRAGMA {pragma} = {value}")
+
+    if db_path not in _migrated:
+        with _migrate_lock:
+            if db_path not in _migrated:
+                migrate(connection)
+                _migrated.add(db_path)
+
+    for hook in _connect_hooks:
+        hook(connection)
+
+    return connection
+
+
+def add_connect_hook(hook: Callable[[sqlite3.Connection], None]):
+    """
+    Register a function called with every connection opened afterwards, by
+    any thread, after the pragmas and the migrations, e.g. to set a trace
+    callback that counts the statements.
+
+    Parameters:
+    ----------
+        hook : Callable[[sqlite3.Connection], None]
+            The function, called with the new connection.
+    """
+    _connect_hooks.append(hook)
+
+
+def get_connection(db_path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Get the connection of the current thread to the database, opening it on
+    the first use. The connection is reused by every later call of the same
+    thread, so its prepared statements and page cache are kept.
+
+    Parameters:
+    ----------
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        sqlite3.Connection
+            The connection of the current thread.
+    """
+    db_path = os.path.abspath(db_path or get_sqlite_database_path())
+
+    connections: Dict[str, sqlite3.Connection] = getattr(_local,
+                                                         "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    if db_path not in connections:
+        connections[db_path] = _connect(db_path)
+
+    return connections[db_path]
+
+
+def _cursor(connection: sqlite3.Connection):
+    """
+    A cursor of the connection, that records its statements as spans when
+    the current request is traced.
+    """
+    cursor = connection.cursor()
+    return TracedCursor(cursor) if current_span() is not None else cursor
+
+
+@contextmanager
+def db_cursor(db_path: Optional[str] = None,
+              commit: bool = False) -> Iterator[sqlite3.Cursor]:
+    """
+    Context manager with a cursor of the connection of the current thread.
+
+    With commit=True the changes are committed when the block ends. Any
+    error rolls back the open transaction, so the shared connection is
+    never left in the middle of one.
+
+    Parameters:
+    ----------
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+        commit : bool
+            Whether to commit the changes of the block.
+
+    Yields:
+    -------
+        sqlite3.Cursor
+            A cursor, closed when the block ends.
+    """
+    connection = get_connection(db_path)
+    cursor = _cursor(connection)
+
+    try:
+        yield cursor
+        if commit:
+            connection.commit()
+
+    except BaseException:
+        connection.rollback()
+        raise
+
+    finally:
+        cursor.close()
+
+
+@contextmanager
+def transaction(db_path: Optional[str] = None,
+                immediate: bool = True) -> Iterator[sqlite3.Cursor]:
+    """
+    Context manager that runs the block in a single transaction, committed
+    when the block ends and rolled back on any error.
+
+    Parameters:
+    ----------
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+        immediate : bool
+            Take the write lock at the start of the transaction (BEGIN
+            IMMEDIATE), so concurrent writers wait for the busy timeout
+            instead of failing in the middle of the block.
+
+    Yields:
+    -------
+        sqlite3.Cursor
+            A cursor, closed when the block ends.
+    """
+    connection = get_connection(db_path)
+    cursor = _cursor(connection)
+    try:
+        cursor.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        yield cursor
+        connection.commit()
+
+    except BaseException:
+        connection.rollback()
+        raise
+
+    finally:
+        cursor.close()
+
+
+def close_connection(db_path: Optional[str] = None):
+    """
+    Close the connection of the current thread, if it is open.
+
+    Parameters:
+    ----------
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+    """
+    db_path = os.path.abspath(db_path or get_sqlite_database_path())
+    connection = getattr(_local, "connections", {}).pop(db_path, None)
+    if connection is not None:
+        connection.close()
@@ -0,0 +1,55 @@
+from typing import Optional
+from BeAlive.data.connection import db_cursor
+
+
+def get_corpus_version(index_name: str, db_path: Optional[str] = None) -> int:
+    """
+    Returns the version of the documents of a vector index, 0 when they
+    were never ingested.
+
+    Parameters:
+    ----------
+        index_name : str
+            The name of the vector index.
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        int
+            The version of the documents.
+    """
+    with db_cursor(db_path) as cursor:
+        cursor.execute("""SELECT version FROM corpus_versions
+                          WHERE index_name = ?""", (index_name,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+def bump_corpus_version(index_name: str, db_path: Optional[str] = None) -> int:
+    """
+    Increments the version of the documents of a vector index, called when
+    they are ingested again, so the caches built on them are invalidated.
+
+    Parameters:
+    ----------
+        index_name : str
+            The name of the vector index.
+        db_path : str, optional
+            The path to the SQLite database, by default BeAlive.db.
+
+    Returns:
+    -------
+        int
+            The new version of the documents.
+    """
+    with db_cursor(db_path, commit=True) as cursor:
+        cursor.execute("""INSERT INTO corpus_versions (index_name, version)
+                          VALUES (?, 1)
+                          ON CONFLICT (index_name) DO UPDATE
+                          SET version = version + 1,
+                              updated_at = CURRENT_TIMESTAMP""",
+                       (index_name,))
+        cursor.execute("""SELECT version FROM corpus_versions
+                          WHERE index_name = ?""", (index_name,))
+        return cursor.fetchone()[0]
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+from langchain_core.embeddings import Embeddings
+from BeAlive.data.loader import BASE_DIR
+from BeAlive.data.tracing import span
+
+# File of the cache when BEALIVE_EMBEDDING_CACHE is not set.
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "database", "embedding_cache.db")
+
+# Embeddings kept in memory by every CachedEmbeddings.
+LRU_SIZE = 4096
+
+# Maximum number of parameters of a SQLite query.
+_SQL_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the sha256 of a text, the key of its embedding in the cache.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings with a persistent cache, a drop-in replacement of the
+    embeddings it wraps (OpenAIEmbeddings).
+
+    The embeddings are stored in a SQLite file keyed by (model, sha256 of
+    the text), with an in-memory LRU in front of it. Only the texts missing
+    from both are sent to the wrapped embeddings, in a single batch, and a
+    text repeated in a batch is embedded once.
+
+    Attributes:
+    ----------
+        embeddings : Embeddings
+            The wrapped embeddings, called on the cache misses.
+        model : str
+            The name of the embedding model, part of the key of the cache.
+        path : str
+            The SQLite file of the cache.
+        lru_size : int
+            The number of embeddings kept in memory.
+
+    Methods:
+    -------
+        embed_documents(texts) -> List[List[float]]:
+            Embeds a list of texts.
+        embed_query(text) -> List[float]:
+            Embeds a text.
+        aembed_documents(texts) -> List[List[float]]:
+            Asynchronous version of embed_documents.
+        aembed_query(text) -> List[float]:
+            Asynchronous version of embed_query.
+        stats() -> Dict[str, float]:
+            Returns the hit and miss counts of the cache.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str,
+                 path: Optional[str] = None, lru_size: int = LRU_SIZE):
+        """
+        Initializes the cache, the SQLite file is created if needed.
+
+        Parameters:
+        ----------
+            embeddings : Embeddings
+                The wrapped embeddings.
+            model : str
+                The name of the embedding model.
+            path : str, optional
+                The SQLite file of the cache, by default
+                BEALIVE_EMBEDDING_CACHE or DEFAULT_CACHE_PATH.
+            lru_size : int
+                The number of embeddings kept in memory.
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path or os.getenv("BEALIVE_EMBEDDING_CACHE",
+                                      DEFAULT_CACHE_PATH)
+        self.lru_size = lru_size
+
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                    exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=5.0,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS embeddings
+                                    (model TEXT NOT NULL,
+                                     text_hash TEXT NOT NULL,
+                                     vector BLOB NOT NULL,
+                                     PRIMARY KEY (model, text_hash))
+                                    WITHOUT ROWID""")
+        self._connection.commit()
+
+    def _remember(self, key: str, vector: List[float]):
+        """
+        Put an embedding in the LRU, called with the lock.
+        """
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """
+        Returns the cached embeddings of the keys, from the LRU or the
+        SQLite file, and counts the hits and misses.
+        """
+        found: Dict[str, List[float]] = {}
+
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+
+            self._counts["memory_hits"] += len(found)
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+
+            for start in range(0, len(missing), _SQL_BATCH):
+                batch = missing[start:start + _SQL_BATCH]
+                rows = self._connection.execute(
+                    f"""SELECT text_hash, vector FROM embeddings
+                        WHERE model = ? AND text_hash IN
+                        ({', '.join('?' * len(batch))})""",
+                    [self.model, *batch]).fetchall()
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self._counts["disk_hits"] += 1
+
+            self._counts["misses"] += len(
+                [key for key in dict.fromkeys(keys) if key not in found])
+
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        """
+        Save new embeddings in the LRU and the SQLite file.
+        """
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+
+            with self._connection:
+                self._connection.executemany(
+                    """INSERT OR REPLACE INTO embeddings
+                       (model, text_hash, vector) VALUES (?, ?, ?)""",
+                    [(self.model, key, array("f", vector).tobytes())
+                     for key, vector in vectors.items()])
+
+    @staticmethod
+    def _misses(texts: Sequence[str], keys: Sequence[str],
+                found: Dict[str, List[float]]) -> Dict[str, str]:
+        """
+        Returns the {key: text} of the texts that are not cached.
+        """
+        return {key: text for key, text in zip(keys, texts)
+                if key not in found}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(text) for text in texts]
+        found = self._lookup(keys)
+
+        misses = self._misses(texts, keys, found)
+        if misses:
+            with span("embeddings", "embedding", model=self.model,
+                      rows=len(misses), cached=len(keys) - len(misses)):
+                vectors = dict(zip(misses, self.embeddings.embed_documents(
+                    list(misses.values()))))
+            self._store(vectors)
+            found.update(vectors)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_hash(text) for text in texts]
+        found = await asyncio.to_thread(self._lookup, keys)
+
+        misses = self._misses(texts, keys, found)
+        if misses:
+            with span("embeddings", "embedding", model=self.model,
+                      rows=len(misses), cached=len(keys) - len(misses)):
+                vectors = dict(zip(
+                    misses, await self.embeddings.aembed_documents(
+                        list(misses.values()))))
+            await asyncio.to_thread(self._store, vectors)
+            found.update(vectors)
+
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the hit and miss counts of the cache since it was created.
+
+        Returns:
+        -------
+            Dict[str, float]
+                memory_hits, disk_hits, misses and hit_rate.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+
+        total = sum(counts.values())
+        counts["hit_rate"] = ((counts["memory_hits"] + counts["disk_hits"])
+                              / total if total else 0.0)
+        return counts
@@ -36,10 +36,13 @@ def load_database_file(filename: str):
 
 def get_sqlite_database_path():
     """
-    Get the path to SQLite database file.
+    Get the path to SQLite database file, BEALIVE_DB_PATH when it is set
+    (e.g. a copy of the database for the benchmarks).
 
     Returns:
         db_path: The path to the SQLite database file.
     """
-    db_path = os.path.join(BASE_DIR, "database", "BeAlive.db")
+    db_path = os.getenv("BEALIVE_DB_PATH") or os.path.join(BASE_DIR,
+                                                           "database",
+                                                           "BeAlive.db")
     return db_path
@@ -0,0 +1,587 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Rows allocated when the matrix of an index is created.
+INITIAL_CAPACITY = 1024
+
+# The journal is folded into a new snapshot when it is larger than the
+# snapshot and than this many bytes.
+MIN_JOURNAL_BYTES = 1 << 20
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[dict]) -> bool:
+    """
+    Check the metadata of a vector against a filter, with the syntax of the
+    Pinecone metadata filters: {"field": value}, {"field": {"$eq": value}},
+    "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte", and "$and"/"$or"
+    with a list of filters.
+
+    Parameters:
+    ----------
+        metadata : dict
+            The metadata of the vector.
+        filter : dict, optional
+            The filter, None matches everything.
+
+    Returns:
+    -------
+        bool
+            Whether the metadata matches the filter.
+    """
+    if not filter:
+        return True
+
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        if field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                matched = value == operand
+            elif operator == "$ne":
+                matched = value != operand
+            elif operator == "$in":
+                matched = value in operand
+            elif operator == "$nin":
+                matched = value not in operand
+            elif value is None:
+                matched = False
+            elif operator == "$gt":
+                matched = value > operand
+            elif operator == "$gte":
+                matched = value >= operand
+            elif operator == "$lt":
+                matched = value < operand
+            elif operator == "$lte":
+                matched = value <= operand
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+
+            if not matched:
+                return False
+
+    return True
+
+
+def _prepare_filter(filter: Optional[dict]) -> Optional[dict]:
+    """
+    Turn the lists of the "$in" and "$nin" operators into sets, so a filter
+    is checked against every vector in constant time.
+    """
+    if not filter:
+        return filter
+
+    prepared = {}
+    for field, condition in filter.items():
+        if field in ("$and", "$or"):
+            prepared[field] = [_prepare_filter(sub) for sub in condition]
+        elif isinstance(condition, dict):
+            prepared[field] = {
+                operator: (frozenset(operand)
+                           if operator in ("$in", "$nin") else operand)
+                for operator, operand in condition.items()}
+        else:
+            prepared[field] = condition
+
+    return prepared
+
+
+class LocalVectorIndex:
+    """
+    A persistent vector index kept in a folder.
+
+    The vectors are normalized and stored in a float32 matrix in a
+    memory-mapped file (vectors.f32), so the cosine similarity is a dot
+    product and the search is an exact, vectorized top-k. The ids, texts
+    and metadata are kept in a snapshot (index.json), row i of the matrix
+    belongs to the i-th entry, and every upsert, delete or clear appends one
+    line to the journal of the snapshot, so a write costs the size of its
+    own entries. The snapshot is rewritten, and a new journal started, when
+    the journal grows larger than it. Deleting a vector moves the last row
+    to its place, so the rows are always dense.
+
+    The index is shared by the threads of a process, and by processes: the
+    writes take an exclusive lock on index.lock around the
+    reload-modify-save, the reads a shared one. The changes saved by
+    another process are loaded on the next operation, the new journal lines
+    only.
+
+    Attributes:
+    ----------
+        path : str
+            The folder of the index.
+        dimension : int
+            The dimension of the vectors, 0 until the first vector is added.
+
+    Methods:
+    -------
+        upsert(ids, vectors, texts, metadatas):
+            Adds or replaces vectors.
+        delete(ids) -> int:
+            Deletes vectors, returns how many were deleted.
+        clear():
+            Deletes all the vectors.
+        get(ids) -> list:
+            Returns the (id, text, metadata) of the stored ids.
+        search(vector, k, filter) -> list:
+            Returns the (id, text, metadata, score) of the k most similar
+            vectors.
+    """
+
+    def __init__(self, path: str):
+        """
+        Opens the index in a folder, created on the first write.
+
+        Parameters:
+        ----------
+            path : str
+                The folder of the index.
+        """
+        self.path = path
+        self.dimension = 0
+
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._capacity = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._rows: Dict[str, int] = {}
+
+        # The snapshot loaded, its journal and the bytes of it applied
+        self._loaded_mtime = None
+        self._snapshot_size = 0
+        self._generation = 0
+        self._journal_offset = 0
+
+        with self._lock, self._file_lock(exclusive=False):
+            self._reload()
+
+    @property
+    def _vectors_file(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _index_file(self) -> str:
+        return os.path.join(self.path, "index.json")
+
+    @property
+    def _lock_file(self) -> str:
+        return os.path.join(self.path, "index.lock")
+
+    def _journal_file(self, generation: int) -> str:
+        return os.path.join(self.path, f"journal.{generation}.jsonl")
+
+    def __len__(self) -> int:
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+            return len(self._ids)
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        """
+        Locks the index against the other processes, exclusively to write.
+        Without fcntl (Windows) only the threads of the process are
+        synchronized.
+        """
+        if fcntl is None or (not exclusive and not os.path.isdir(self.path)):
+            yield
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._lock_file, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _map(self, capacity: int, dimension: int):
+        """
+        Map the matrix of the vectors file, after it was created or grown.
+        """
+        self._matrix = None
+        self._capacity, self.dimension = capacity, dimension
+        if capacity:
+            self._matrix = np.memmap(self._vectors_file, dtype=np.float32,
+                                     mode="r+", shape=(capacity, dimension))
+
+    def _snapshot_stat(self) -> Tuple[Tuple[int, int], int]:
+        """
+        The modification time, with the inode as a snapshot can be replaced
+        within the resolution of the clock, and the size of the snapshot.
+        """
+        stat = os.stat(self._index_file)
+        return (stat.st_mtime_ns, stat.st_ino), stat.st_size
+
+    def _reload(self):
+        """
+        Load the snapshot of the index, if it was already saved, and apply
+        its journal.
+        """
+        self._ids, self._texts, self._metadatas = [], [], []
+        self._rows = {}
+        self._loaded_mtime, self._snapshot_size = None, 0
+        self._generation, self._journal_offset = 0, 0
+        capacity = dimension = 0
+
+        if os.path.exists(self._index_file):
+            with open(self._index_file, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+
+            dimension, capacity = data["dimension"], data["capacity"]
+            self._generation = data.get("generation", 0)
+            self._ids = [entry["id"] for entry in data["entries"]]
+            self._texts = [entry["text"] for entry in data["entries"]]
+            self._metadatas = [entry["metadata"]
+                               for entry in data["entries"]]
+            self._rows = {vector_id: row
+                          for row, vector_id in enumerate(self._ids)}
+            self._loaded_mtime, self._snapshot_size = self._snapshot_stat()
+
+        self._map(capacity, dimension)
+        self._replay()
+
+    def _replay(self):
+        """
+        Apply the journal lines written since the last ones applied.
+        """
+        try:
+            handle = open(self._journal_file(self._generation), "rb")
+        except FileNotFoundError:
+            return
+
+        with handle:
+            handle.seek(self._journal_offset)
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    # Still being written, without the file lock
+                    break
+                self._apply(json.loads(line))
+                self._journal_offset += len(line)
+
+    def _apply(self, entry: dict):
+        """
+        Apply a journal line to the entries, the vectors are already in the
+        matrix.
+        """
+        if (entry["capacity"], entry["dimension"]) != (self._capacity,
+                                                       self.dimension):
+            self._map(entry["capacity"], entry["dimension"])
+
+        if entry["op"] == "upsert":
+            self._put_entries(entry["ids"], entry["texts"],
+                              entry["metadatas"])
+        elif entry["op"] == "delete":
+            self._remove_entries(entry["ids"])
+        else:
+            self._ids, self._texts, self._metadatas = [], [], []
+            self._rows = {}
+
+    def _refresh(self):
+        """
+        Load the changes saved by another process: the snapshot when it was
+        rewritten, the new lines of the journal otherwise.
+        """
+        try:
+            mtime, _ = self._snapshot_stat()
+        except FileNotFoundError:
+            mtime = None
+
+        if mtime != self._loaded_mtime:
+            self._reload()
+        else:
+            self._replay()
+
+    def _save(self):
+        """
+        Flush the matrix and write the snapshot atomically, with a new empty
+        journal.
+        """
+        if self._matrix is not None:
+            self._matrix.flush()
+
+        os.makedirs(self.path, exist_ok=True)
+        previous = self._journal_file(self._generation)
+        data = {
+            "dimension": self.dimension,
+            "capacity": self._capacity,
+            "generation": self._generation + 1,
+            "entries": [{"id": vector_id, "text": text, "metadata": metadata}
+                        for vector_id, text, metadata
+                        in zip(self._ids, self._texts, self._metadatas)],
+        }
+        temporary = self._index_file + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(data, handle)
+        os.replace(temporary, self._index_file)
+
+        self._loaded_mtime, self._snapshot_size = self._snapshot_stat()
+        self._generation, self._journal_offset = data["generation"], 0
+        if os.path.exists(previous):
+            os.remove(previous)
+
+    def _write(self, op: str, **fields: Any):
+        """
+        Save a change: one line appended to the journal, or a new snapshot
+        when there is none yet or the journal outgrew it.
+        """
+        line = (json.dumps({"op": op, "capacity": self._capacity,
+                            "dimension": self.dimension, **fields})
+                + "\n").encode("utf-8")
+
+        if (self._loaded_mtime is None
+                or self._journal_offset + len(line)
+                > max(self._snapshot_size, MIN_JOURNAL_BYTES)):
+            self._save()
+            return
+
+        if self._matrix is not None:
+            self._matrix.flush()
+        with open(self._journal_file(self._generation), "ab") as handle:
+            handle.write(line)
+        self._journal_offset += len(line)
+
+    def _ensure_capacity(self, rows: int):
+        """
+        Grow the memory-mapped matrix, doubling it, to hold the rows.
+        """
+        if rows <= self._capacity:
+            return
+
+        capacity = max(self._capacity or INITIAL_CAPACITY, 1)
+        while capacity < rows:
+            capacity *= 2
+
+        os.makedirs(self.path, exist_ok=True)
+        temporary = self._vectors_file + ".tmp"
+        matrix = np.memmap(temporary, dtype=np.float32, mode="w+",
+                           shape=(capacity, self.dimension))
+        if self._matrix is not None:
+            matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+            self._matrix = None
+        matrix.flush()
+        del matrix
+
+        os.replace(temporary, self._vectors_file)
+        self._map(capacity, self.dimension)
+
+    def _put_entries(self, ids: Sequence[str], texts: Sequence[str],
+                     metadatas: Sequence[dict]) -> List[int]:
+        """
+        Adds or replaces the entries of the ids, returns their rows.
+        """
+        for vector_id in dict.fromkeys(ids):
+            if vector_id not in self._rows:
+                self._rows[vector_id] = len(self._ids)
+                self._ids.append(vector_id)
+                self._texts.append("")
+                self._metadatas.append({})
+
+        rows = [self._rows[vector_id] for vector_id in ids]
+        for row, text, metadata in zip(rows, texts, metadatas):
+            self._texts[row] = text
+            self._metadatas[row] = dict(metadata)
+        return rows
+
+    def _remove_entries(self, ids: Iterable[str]) -> List[Tuple[int, int]]:
+        """
+        Removes the entries of the ids, returns the (row, last row) moves
+        to apply to the matrix, in order.
+        """
+        moves = []
+        for vector_id in ids:
+            row = self._rows.pop(vector_id, None)
+            if row is None:
+                continue
+
+            last = len(self._ids) - 1
+            if row != last:
+                # Move the last row to the free one.
+                self._ids[row] = self._ids[last]
+                self._texts[row] = self._texts[last]
+                self._metadatas[row] = self._metadatas[last]
+                self._rows[self._ids[row]] = row
+            moves.append((row, last))
+
+            self._ids.pop()
+            self._texts.pop()
+            self._metadatas.pop()
+
+        return moves
+
+    def upsert(self, ids: Sequence[str], vectors: Iterable[Sequence[float]],
+               texts: Sequence[str],
+               metadatas: Optional[Sequence[dict]] = None):
+        """
+        Adds vectors, replacing the ones with the same ids.
+
+        Parameters:
+        ----------
+            ids : Sequence[str]
+                The ids of the vectors.
+            vectors : Iterable[Sequence[float]]
+                The vectors, normalized before they are stored.
+            texts : Sequence[str]
+                The texts of the vectors.
+            metadatas : Sequence[dict], optional
+                The metadata of the vectors.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(ids) == 0:
+            return
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one vector for every id.")
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        ids = list(ids)
+        texts = list(texts)
+        metadatas = [dict(metadata)
+                     for metadata in (metadatas or [{} for _ in ids])]
+
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+
+            if self.dimension == 0:
+                self.dimension = vectors.shape[1]
+            elif vectors.shape[1] != self.dimension:
+                raise ValueError(f"Expected vectors of dimension {self.dimension}, "
+                                 f"got {vectors.shape[1]}.")
+
+            new_ids = {vector_id for vector_id in ids
+                       if vector_id not in self._rows}
+            self._ensure_capacity(len(self._ids) + len(new_ids))
+
+            rows = self._put_entries(ids, texts, metadatas)
+            self._matrix[rows] = vectors
+
+            self._write("upsert", ids=ids, texts=texts, metadatas=metadatas)
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        Deletes vectors, the unknown ids are ignored.
+
+        Parameters:
+        ----------
+            ids : Iterable[str]
+                The ids of the vectors.
+
+        Returns:
+        -------
+            int
+                The number of deleted vectors.
+        """
+        ids = list(ids)
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+
+            moves = self._remove_entries(ids)
+            for row, last in moves:
+                if row != last:
+                    self._matrix[row] = self._matrix[last]
+
+            if moves:
+                self._write("delete", ids=ids)
+
+            return len(moves)
+
+    def clear(self):
+        """
+        Deletes all the vectors, the matrix keeps its capacity.
+        """
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+            self._ids, self._texts, self._metadatas = [], [], []
+            self._rows = {}
+            if self._loaded_mtime is not None or self._matrix is not None:
+                self._save()
+
+    def get(self, ids: Iterable[str]) -> List[Tuple[str, str, dict]]:
+        """
+        Returns the (id, text, metadata) of the stored ids.
+        """
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+            return [(vector_id, self._texts[self._rows[vector_id]],
+                     dict(self._metadatas[self._rows[vector_id]]))
+                    for vector_id in ids if vector_id in self._rows]
+
+    def search(self, vector: Sequence[float], k: int = 4,
+               filter: Optional[dict] = None
+               ) -> List[Tuple[str, str, dict, float]]:
+        """
+        Exact search of the most similar vectors.
+
+        Parameters:
+        ----------
+            vector : Sequence[float]
+                The query vector.
+            k : int
+                The number of results.
+            filter : dict, optional
+                A metadata filter (see matches_filter).
+
+        Returns:
+        -------
+            List[Tuple[str, str, dict, float]]
+                The (id, text, metadata, cosine similarity) of the results,
+                the most similar first.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+
+            count = len(self._ids)
+            if count == 0 or k <= 0:
+                return []
+
+            if filter:
+                filter = _prepare_filter(filter)
+                rows = np.fromiter(
+                    (row for row in range(count)
+                     if matches_filter(self._metadatas[row], filter)),
+                    dtype=np.int64)
+                if len(rows) == 0:
+                    return []
+                scores = self._matrix[rows] @ query
+            else:
+                rows = None
+                scores = self._matrix[:count] @ query
+
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            for position in top:
+                row = int(rows[position]) if rows is not None else int(position)
+                results.append((self._ids[row], self._texts[row],
+                                dict(self._metadatas[row]),
+                                float(scores[position])))
+
+            return results
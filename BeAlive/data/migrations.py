@@ -0,0 +1,278 @@
+import sqlite3
+from typing import List, NamedTuple, Tuple
+from BeAlive.data.loader import get_sqlite_database_path
+
+
+class Migration(NamedTuple):
+    """
+    A schema change of BeAlive.db.
+
+    Attributes:
+    ----------
+        version : int
+            The schema version of the database after the migration.
+        description : str
+            A short description of the change.
+        statements : Tuple[str, ...]
+            The SQL statements of the migration, run in a single transaction.
+    """
+
+    version: int
+    description: str
+    statements: Tuple[str, ...]
+
+
+# The migrations, in order. The version of a database is kept in its
+# `PRAGMA user_version`, so a migration is never applied twice. Never edit
+# a migration that was already released, add a new one instead.
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        description="Secondary indexes for the queries of the chatbot",
+        statements=(
+            # ActivitySearchChain: open activities of a city in a date range.
+            # Covering, the activity_id is the rowid.
+            """CREATE INDEX IF NOT EXISTS idx_activities_city_state_dates
+               ON activities (city, activity_state, date_begin, date_finish)""",
+
+            # Tools and DeleteActivityChain: the activities of a host, by
+            # state. The activity_name makes it covering for the name lookups.
+            """CREATE INDEX IF NOT EXISTS idx_activities_host_state
+               ON activities (host_id, activity_state, activity_name)""",
+
+            # UpdateActivitiesChain and MakeReservationTool: activities by
+            # state, the finished ones by date_finish.
+            """CREATE INDEX IF NOT EXISTS idx_activities_state_finish
+               ON activities (activity_state, date_finish)""",
+
+            # ShowReservationsChain and the reservations of a host. Covering
+            # for the join with the activities.
+            """CREATE INDEX IF NOT EXISTS idx_reservations_host_state
+               ON reservations (host_id, state, activity_id)""",
+
+            # Reviews and calendar of a participant. Covering for the join
+            # with the activities.
+            """CREATE INDEX IF NOT EXISTS idx_reservations_user_state
+               ON reservations (user_id, state, activity_id)""",
+
+            # ShowReviewChain: the users already reviewed in an activity.
+            """CREATE INDEX IF NOT EXISTS idx_review_user_activity_user
+               ON review_user (activity_id, user_id)""",
+
+            # Statistics for the query planner.
+            "ANALYZE",
+        ),
+    ),
+    Migration(
+        version=2,
+        description="Version of the documents of every vector index",
+        statements=(
+            """CREATE TABLE IF NOT EXISTS corpus_versions
+               (index_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP)""",
+        ),
+    ),
+    Migration(
+        version=3,
+        description="Outbox of the writes to the vector indexes",
+        statements=(
+            # Written in the transaction of the row change, drained by the
+            # OutboxWorker. The times are Unix timestamps.
+            """CREATE TABLE IF NOT EXISTS vector_outbox
+               (outbox_id INTEGER PRIMARY KEY,
+                index_name TEXT NOT NULL,
+                operation TEXT NOT NULL
+                    CHECK (operation IN ('upsert', 'delete')),
+                vector_id TEXT NOT NULL,
+                payload TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                processed_at REAL)""",
+
+            # The pending operations, in order.
+            """CREATE INDEX IF NOT EXISTS idx_vector_outbox_pending
+               ON vector_outbox (next_attempt_at, outbox_id)
+               WHERE processed_at IS NULL""",
+
+            # The pending operations of a vector, superseded by a later one.
+            """CREATE INDEX IF NOT EXISTS idx_vector_outbox_vector
+               ON vector_outbox (index_name, vector_id)
+               WHERE processed_at IS NULL""",
+        ),
+    ),
+    Migration(
+        version=4,
+        description="Leases and progress of the scheduled jobs",
+        statements=(
+            # A job runs in the process holding its lease, until
+            # lease_expires_at (a Unix timestamp). The watermark is the
+            # progress of the job between runs.
+            """CREATE TABLE IF NOT EXISTS scheduled_jobs
+               (name TEXT PRIMARY KEY,
+                lease_owner TEXT,
+                lease_expires_at REAL NOT NULL DEFAULT 0,
+                watermark TEXT,
+                last_run_at REAL)""",
+        ),
+    ),
+    Migration(
+        version=5,
+        description="Versions of the calendars of the users",
+        statements=(
+            # Incremented by the triggers below whenever the events of the
+            # calendar of a user change, the cached events of the user are
+            # dropped when it does.
+            """CREATE TABLE IF NOT EXISTS calendar_versions
+               (user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0)""",
+
+            # Calendar page: the activities of a host in a date window.
+            """CREATE INDEX IF NOT EXISTS idx_activities_host_begin
+               ON activities (host_id, date_begin)""",
+
+            # The confirmed reservations are the events of the participant.
+            """CREATE TRIGGER IF NOT EXISTS trg_calendar_reservation_insert
+               AFTER INSERT ON reservations
+               WHEN NEW.state = 'confirmed'
+               BEGIN
+                   INSERT INTO calendar_versions (user_id, version)
+                   VALUES (NEW.user_id, 1)
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+               END""",
+
+            """CREATE TRIGGER IF NOT EXISTS trg_calendar_reservation_delete
+               AFTER DELETE ON reservations
+               WHEN OLD.state = 'confirmed'
+               BEGIN
+                   INSERT INTO calendar_versions (user_id, version)
+                   VALUES (OLD.user_id, 1)
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+               END""",
+
+            """CREATE TRIGGER IF NOT EXISTS trg_calendar_reservation_update
+               AFTER UPDATE OF state, user_id, activity_id ON reservations
+               WHEN OLD.state = 'confirmed' OR NEW.state = 'confirmed'
+               BEGIN
+                   INSERT INTO calendar_versions (user_id, version)
+                   VALUES (OLD.user_id, 1)
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+                   INSERT INTO calendar_versions (user_id, version)
+                   SELECT NEW.user_id, 1 WHERE NEW.user_id != OLD.user_id
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+               END""",
+
+            # The activities are the events of their host and of their
+            # confirmed participants. The changes of the state, the ratings
+            # and the number of participants do not change the events.
+            """CREATE TRIGGER IF NOT EXISTS trg_calendar_activity_insert
+               AFTER INSERT ON activities
+               BEGIN
+                   INSERT INTO calendar_versions (user_id, version)
+                   VALUES (NEW.host_id, 1)
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+               END""",
+
+            """CREATE TRIGGER IF NOT EXISTS trg_calendar_activity_delete
+               AFTER DELETE ON activities
+               BEGIN
+                   INSERT INTO calendar_versions (user_id, version)
+                   SELECT OLD.host_id, 1
+                   UNION
+                   SELECT user_id, 1 FROM reservations
+                   WHERE activity_id = OLD.activity_id
+                   AND state = 'confirmed'
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+               END""",
+
+            """CREATE TRIGGER IF NOT EXISTS trg_calendar_activity_update
+               AFTER UPDATE OF activity_name, location, date_begin,
+                               date_finish, host_id ON activities
+               BEGIN
+                   INSERT INTO calendar_versions (user_id, version)
+                   SELECT OLD.host_id, 1
+                   UNION
+                   SELECT NEW.host_id, 1
+                   UNION
+                   SELECT user_id, 1 FROM reservations
+                   WHERE activity_id = NEW.activity_id
+                   AND state = 'confirmed'
+                   ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+               END""",
+        ),
+    ),
+]
+
+# The schema version of a fully migrated database.
+LATEST_VERSION = MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def get_schema_version(connection: sqlite3.Connection) -> int:
+    """
+    Returns the schema version of the database.
+    """
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection) -> int:
+    """
+    Upgrade the database in place to the latest schema version.
+
+    Every pending migration runs in its own BEGIN IMMEDIATE transaction
+    together with the update of the version, so an interrupted upgrade
+    leaves the database at the last completed version. The version is
+    checked again after the write lock is taken, so several processes can
+    start at the same time.
+
+    Parameters:
+    ----------
+        connection : sqlite3.Connection
+            A connection to the database, not in a transaction.
+
+    Returns:
+    -------
+        int
+            The schema version of the database after the upgrade.
+    """
+    version = get_schema_version(connection)
+    if version >= LATEST_VERSION:
+        return version
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            version = get_schema_version(connection)
+            if migration.version > version:
+                for statement in migration.statements:
+                    connection.execute(statement)
+                # PRAGMA does not accept parameters, the version is an int.
+                connection.execute(
+                    f"PRAGMA user_version = {int(migration.version)}")
+                version = migration.version
+            connection.commit()
+
+        except BaseException:
+            connection.rollback()
+            raise
+
+    return version
+
+
+if __name__ == "__main__":
+    # python -m BeAlive.data.migrations [path/to/database.db]
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else get_sqlite_database_path()
+    connection = sqlite3.connect(db_path)
+    try:
+        before = get_schema_version(connection)
+        after = migrate(connection)
+    finally:
+        connection.close()
+
+    print(f"{db_path}: schema version {before} -> {after}")
@@ -0,0 +1,395 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from BeAlive.data.connection import db_cursor, transaction
+
+logger = logging.getLogger(__name__)
+
+# Operations of the outbox.
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Operations sent to the vector store in a single batch.
+BATCH_SIZE = 64
+
+# Seconds the worker waits for new operations when the outbox is empty.
+POLL_INTERVAL = 2.0
+
+# Attempts of an operation before it is left as failed, and the delay of
+# the retries: RETRY_DELAY * 2 ** (attempts - 1), at most MAX_RETRY_DELAY.
+MAX_ATTEMPTS = 8
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 300.0
+
+# Seconds the processed operations are kept, for the lag metrics.
+RETENTION = 24 * 60 * 60
+
+
+def enqueue_upsert(cursor: sqlite3.Cursor, index_name: str, vector_id: str,
+                   text: str, metadata: Optional[dict] = None):
+    """
+    Record the upsert of a vector, in the transaction of the cursor. The
+    text is embedded by the worker.
+
+    Parameters:
+    ----------
+        cursor : sqlite3.Cursor
+            A cursor in the transaction of the row change.
+        index_name : str
+            The vector index.
+        vector_id : str
+            The id of the vector.
+        text : str
+            The text of the vector.
+        metadata : dict, optional
+            The metadata of the vector.
+    """
+    enqueue_upserts(cursor, index_name, [(vector_id, text, metadata)])
+
+
+def enqueue_upserts(cursor: sqlite3.Cursor, index_name: str,
+                    vectors: Iterable[Tuple[str, str, Optional[dict]]]):
+    """
+    Record the upsert of several vectors, given as (id, text, metadata), in
+    the transaction of the cursor.
+    """
+    now = time.time()
+    cursor.executemany("""INSERT INTO vector_outbox
+                          (index_name, operation, vector_id, payload,
+                           created_at, next_attempt_at)
+                          VALUES (?, ?, ?, ?, ?, ?)""",
+                       [(index_name, UPSERT, str(vector_id),
+                         json.dumps({"text": text,
+                                     "metadata": metadata or {}}),
+                         now, now)
+                        for vector_id, text, metadata in vectors])
+
+
+def enqueue_delete(cursor: sqlite3.Cursor, index_name: str,
+                   vector_ids: Iterable[str]):
+    """
+    Record the deletion of vectors, in the transaction of the cursor.
+
+    Parameters:
+    ----------
+        cursor : sqlite3.Cursor
+            A cursor in the transaction of the row change.
+        index_name : str
+            The vector index.
+        vector_ids : Iterable[str]
+            The ids of the vectors.
+    """
+    now = time.time()
+    cursor.executemany("""INSERT INTO vector_outbox
+                          (index_name, operation, vector_id, created_at,
+                           next_attempt_at)
+                          VALUES (?, ?, ?, ?, ?)""",
+                       [(index_name, DELETE, str(vector_id), now, now)
+                        for vector_id in vector_ids])
+
+
+def outbox_stats(db_path: Optional[str] = None) -> Dict[str, float]:
+    """
+    Returns the state of the outbox, to measure how far the vector indexes
+    are behind the database.
+
+    Returns:
+    -------
+        Dict[str, float]
+            pending (operations not applied yet), failed (pending operations
+            that ran out of attempts), oldest_pending_seconds, and the
+            processed operations of the retention window with their mean and
+            maximum lag in seconds (created to applied).
+    """
+    now = time.time()
+    with db_cursor(db_path) as cursor:
+        pending, failed, oldest = cursor.execute(
+            """SELECT COUNT(*), COALESCE(SUM(attempts >= ?), 0),
+                      MIN(created_at)
+               FROM vector_outbox WHERE processed_at IS NULL""",
+            (MAX_ATTEMPTS,)).fetchone()
+        processed, mean_lag, max_lag = cursor.execute(
+            """SELECT COUNT(*), AVG(processed_at - created_at),
+                      MAX(processed_at - created_at)
+               FROM vector_outbox WHERE processed_at IS NOT NULL""").fetchone()
+
+    return {"pending": pending, "failed": failed,
+            "oldest_pending_seconds": now - oldest if oldest else 0.0,
+            "processed": processed, "mean_lag_seconds": mean_lag or 0.0,
+            "max_lag_seconds": max_lag or 0.0}
+
+
+class OutboxWorker:
+    """
+    Applies the operations of the outbox to the vector indexes, in a
+    background thread.
+
+    The pending operations are read in order, in batches. The operations of
+    a vector in a batch are collapsed into the last one, and the upserts and
+    deletes of an index are sent in one call each (the upserts are embedded
+    together). Applying an operation also marks the older pending operations
+    of its vector as processed, so a retried operation never overwrites a
+    newer one. Upserts by id and deletes are idempotent, so an operation
+    applied twice, after a crash, leaves the same index.
+
+    A failed batch is retried with an exponential backoff, up to
+    MAX_ATTEMPTS times, the error is kept in the outbox.
+
+    Attributes:
+    ----------
+        db_path : str
+            The path to the SQLite database, by default BeAlive.db.
+        batch_size : int
+            The operations read in a batch.
+        poll_interval : float
+            The seconds to wait for new operations when the outbox is empty.
+
+    Methods:
+    -------
+        process_batch() -> int:
+            Applies the next batch of due operations.
+        drain(timeout) -> int:
+            Applies the due operations until there are none left.
+        start():
+            Starts the background thread.
+        wake():
+            Wakes the thread up, called after new operations are committed.
+        stop():
+            Stops the background thread.
+    """
+
+    def __init__(self, db_path: Optional[str] = None,
+                 batch_size: int = BATCH_SIZE,
+                 poll_interval: float = POLL_INTERVAL):
+        """
+        Initializes the worker, the thread is started by start.
+
+        Parameters:
+        ----------
+            db_path : str, optional
+                The path to the SQLite database, by default BeAlive.db.
+            batch_size : int
+                The operations read in a batch.
+            poll_interval : float
+                The seconds to wait for new operations when the outbox is
+                empty.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def _due_operations(self, now: float) -> List[Tuple]:
+        with db_cursor(self.db_path) as cursor:
+            cursor.execute("""SELECT outbox_id, index_name, operation,
+                                     vector_id, payload, attempts
+                              FROM vector_outbox
+                              WHERE processed_at IS NULL
+                              AND next_attempt_at <= ? AND attempts < ?
+                              ORDER BY next_attempt_at, outbox_id
+                              LIMIT ?""",
+                           (now, MAX_ATTEMPTS, self.batch_size))
+            return cursor.fetchall()
+
+    @staticmethod
+    def _apply(index_name: str, operations: Dict[str, Tuple]):
+        """
+        Send the last operation of every vector of an index to its store.
+        """
+        from BeAlive.data.vector_store import get_vector_store
+
+        vector_store = get_vector_store(index_name)
+
+        upserts = [(vector_id, json.loads(operation[4]))
+                   for vector_id, operation in operations.items()
+                   if operation[2] == UPSERT]
+        deletes = [vector_id for vector_id, operation in operations.items()
+                   if operation[2] == DELETE]
+
+        if upserts:
+            vector_store.add_texts(
+                texts=[payload["text"] for _, payload in upserts],
+                metadatas=[payload["metadata"] for _, payload in upserts],
+                ids=[vector_id for vector_id, _ in upserts])
+        if deletes:
+            vector_store.delete(ids=deletes)
+
+    def _mark_processed(self, index_name: str, operations: Dict[str, Tuple]):
+        with transaction(self.db_path) as cursor:
+            cursor.executemany(
+                """UPDATE vector_outbox SET processed_at = ?
+                   WHERE index_name = ? AND vector_id = ?
+                   AND outbox_id <= ? AND processed_at IS NULL""",
+                [(time.time(), index_name, vector_id, operation[0])
+                 for vector_id, operation in operations.items()])
+
+    def _mark_failed(self, rows: List[Tuple], error: Exception):
+        now = time.time()
+        with transaction(self.db_path) as cursor:
+            cursor.executemany(
+                """UPDATE vector_outbox
+                   SET attempts = attempts + 1, last_error = ?,
+                       next_attempt_at = ?
+                   WHERE outbox_id = ?""",
+                [(str(error), now + min(MAX_RETRY_DELAY,
+                                        RETRY_DELAY * 2 ** row[5]), row[0])
+                 for row in rows])
+
+    def _cleanup(self, now: float):
+        """
+        Delete the operations processed before the retention window, at
+        most once an hour.
+        """
+        if now - self._last_cleanup < 60 * 60:
+            return
+
+        with transaction(self.db_path) as cursor:
+            cursor.execute("""DELETE FROM vector_outbox
+                              WHERE processed_at < ?""", (now - RETENTION,))
+        self._last_cleanup = now
+
+    def process_batch(self) -> int:
+        """
+        Applies the next batch of due operations.
+
+        Returns:
+        -------
+            int
+                The number of operations read, 0 when none was due.
+        """
+        with self._lock:
+            rows = self._due_operations(time.time())
+
+            # The last operation of every vector, by index.
+            latest: Dict[str, Dict[str, Tuple]] = {}
+            for row in rows:
+                latest.setdefault(row[1], {})[row[3]] = row
+
+            for index_name, operations in latest.items():
+                try:
+                    self._apply(index_name, operations)
+                except Exception as e:
+                    logger.warning("Vector outbox: %s operations on %s "
+                                   "failed: %s", len(operations), index_name,
+                                   e)
+                    self._mark_failed([row for row in rows
+                                       if row[1] == index_name], e)
+                    continue
+
+                self._mark_processed(index_name, operations)
+
+            return len(rows)
+
+    def drain(self, timeout: Optional[float] = None) -> int:
+        """
+        Applies the due operations until there are none left, or the
+        timeout runs out.
+
+        Returns:
+        -------
+            int
+                The number of operations read.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        total = 0
+        while deadline is None or time.monotonic() < deadline:
+            processed = self.process_batch()
+            if not processed:
+                break
+            total += processed
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.process_batch()
+                self._cleanup(time.time())
+            except Exception as e:
+                logger.warning("Vector outbox worker error: %s", e)
+                processed = 0
+
+            if not processed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def start(self):
+        """
+        Starts the background thread, if it is not running.
+        """
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name="vector-outbox",
+                                            daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """
+        Wakes the thread up, called after new operations are committed.
+        """
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stops the background thread, after the current batch.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+_worker: Optional[OutboxWorker] = None
+_worker_lock = threading.Lock()
+
+
+def get_outbox_worker() -> OutboxWorker:
+    """
+    Returns the outbox worker of the process, started on the first call
+    unless BEALIVE_OUTBOX_WORKER is "0" (when another process drains the
+    outbox).
+    """
+    global _worker
+
+    if _worker is None:
+        with _worker_lock:
+            if _worker is None:
+                worker = OutboxWorker()
+                if os.getenv("BEALIVE_OUTBOX_WORKER", "1") != "0":
+                    worker.start()
+                _worker = worker
+
+    return _worker
+
+
+def notify_outbox():
+    """
+    Wakes the worker of the process up, called after committing new
+    operations so they are applied right away.
+    """
+    get_outbox_worker().wake()
+
+
+if __name__ == "__main__":
+    # python -m BeAlive.data.outbox [--drain]
+    import sys
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    if "--drain" in sys.argv:
+        print(f"Processed {OutboxWorker().drain()} operations.")
+    print(json.dumps(outbox_stats(), indent=2))
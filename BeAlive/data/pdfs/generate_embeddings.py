@@ -1,12 +1,23 @@
+"""
+Ingests the company information PDFs into the vector store incrementally.
+
+Usage:
+    python -m BeAlive.data.pdfs.generate_embeddings [folder] [--dry-run]
+                                                    [--backend local]
+"""
+import hashlib
+import json
 import os
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_core.documents.base import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from pinecone import Index, Pinecone
+from BeAlive.data.vector_store import (EMBEDDING_MODEL, get_vector_store,
+                                       local_vector_dir,
+                                       vector_store_backend)
+from BeAlive.data.corpus import bump_corpus_version
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -41,27 +52,74 @@ def get_text_from_pdf(pdf_file: str) -> List[Document]:
     return pages
 
 
-def create_embeddings():
+# Index of the company information.
+INDEX_NAME = "company-info-rag"
+
+# File, in the folder of the PDFs, with the hashes of the files and chunks
+# ingested into the index of a backend, one per backend.
+MANIFEST_FILE = "ingestion_manifest.{backend}.json"
+
+
+@dataclass
+class IngestionReport:
     """
-    Processes all PDF files in the current directory, splits their text into
-    chunks, and stores their embeddings in a Pinecone vector database.
+    The changes of an ingestion (or the changes it would make, in a dry
+    run).
 
-    Steps:
-    1. Finds all PDF files in the current directory.
-    2. Extracts text from each PDF file.
-    3. Splits the text into manageable chunks for embedding.
-    4. Stores the resulting embeddings in a Pinecone vector database.
+    Attributes:
+    ----------
+        added_files, changed_files, removed_files, unchanged_files : List[str]
+            The PDF files by kind of change.
+        added_chunks, updated_chunks, deleted_chunks : int
+            The chunks embedded and upserted, or deleted.
+        unchanged_chunks : int
+            The chunks of the changed files that were kept.
+        rebuilt : bool
+            Whether the index was rebuilt, since there was no manifest of
+            the index.
+        dry_run : bool
+            Whether the changes were only reported.
     """
-    # Get a list of all PDF files in the current directory
-    pdf_files = [f for f in os.listdir() if f.endswith(".pdf")]
 
-    # Initialize a list to store all extracted documents
-    docs: List[Document] = []
+    added_files: List[str] = field(default_factory=list)
+    changed_files: List[str] = field(default_factory=list)
+    removed_files: List[str] = field(default_factory=list)
+    unchanged_files: List[str] = field(default_factory=list)
+    added_chunks: int = 0
+    updated_chunks: int = 0
+    deleted_chunks: int = 0
+    unchanged_chunks: int = 0
+    rebuilt: bool = False
+    dry_run: bool = False
+
+    @property
+    def changed(self) -> bool:
+        """
+        Whether the ingestion changes the index.
+        """
+        return bool(self.rebuilt or self.added_chunks or self.updated_chunks
+                    or self.deleted_chunks)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
 
-    # Extract text from each PDF file and add to the docs list
-    for pdf_file in pdf_files:
-        docs.extend(get_text_from_pdf(pdf_file))
 
+def file_hash(pdf_file: str) -> str:
+    """
+    Returns the sha256 of the content of a file.
+    """
+    digest = hashlib.sha256()
+    with open(pdf_file, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_pdf(pdf_file: str) -> List[Document]:
+    """
+    Extracts the text of a PDF file and splits it into chunks.
+    """
     # Define a text splitter to split the documents into chunks
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,  # Maximum size of each chunk
@@ -69,21 +127,201 @@ def create_embeddings():
         add_start_index=True,  # Include the starting index of each chunk
     )
 
-    # Split all documents into smaller chunks
-    all_splits = text_splitter.split_documents(docs)
+    return text_splitter.split_documents(get_text_from_pdf(pdf_file))
 
-    # Initialize a connection to Pinecone
-    pc = Pinecone()
-    # Access the "company_info_rag" index in Pinecone
-    index: Index = pc.Index("company-info-rag")
 
-    # Initialize a Pinecone vector store with OpenAI embeddings
-    vector_store = PineconeVectorStore(
-        index=index, embedding=OpenAIEmbeddings(model="text-embedding-3-small")
-    )
+def chunk_ids(pdf_file: str, chunks: List[Document]) -> Dict[str, str]:
+    """
+    Returns the stable {chunk id: chunk hash} of the chunks of a file.
+
+    The id is derived from the file name and the text of the chunk, so it
+    does not change when other chunks are added or removed (a repeated text
+    gets the number of its occurrence). The hash also covers the page, so a
+    chunk that moves to another page is updated. The start_index is left
+    out, otherwise an edit would update every later chunk of the file.
+    """
+    ids: Dict[str, str] = {}
+    occurrences: Dict[str, int] = {}
+
+    for chunk in chunks:
+        text_digest = _sha256(chunk.page_content.encode("utf-8"))
+        occurrence = occurrences.get(text_digest, 0)
+        occurrences[text_digest] = occurrence + 1
+
+        chunk_id = _sha256(f"{os.path.basename(pdf_file)}\0{text_digest}"
+                           f"\0{occurrence}".encode("utf-8"))[:32]
+        ids[chunk_id] = _sha256(
+            f"{text_digest}\0{chunk.metadata.get('page')}".encode("utf-8"))
+
+    return ids
+
+
+def manifest_target(backend: str) -> Dict:
+    """
+    Returns the index a manifest was written for: the backend, the index,
+    the embedding model and, for the local backend, the folder of the
+    indexes.
+    """
+    return {"backend": backend, "index_name": INDEX_NAME,
+            "embedding_model": EMBEDDING_MODEL,
+            "vector_dir": (os.path.abspath(local_vector_dir())
+                           if backend == "local" else None)}
+
+
+def load_manifest(manifest_path: str) -> Dict:
+    """
+    Returns the manifest of the last ingestion, None when there is none.
+    """
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_manifest(manifest_path: str, manifest: Dict):
+    """
+    Writes the manifest atomically.
+    """
+    temporary = manifest_path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    os.replace(temporary, manifest_path)
+
+
+def create_embeddings(folder: str = ".", dry_run: bool = False,
+                      backend: Optional[str] = None) -> IngestionReport:
+    """
+    Processes the PDF files of a folder, splits their text into chunks, and
+    stores their embeddings in the vector store (Pinecone or local, see
+    get_vector_store), incrementally.
+
+    The manifest of the backend keeps the hash of every ingested file and
+    chunk. Only the new or changed chunks are embedded and upserted, the
+    chunks that disappeared are deleted, and the files with the same hash
+    are not even read. Without a manifest, or when it was written for
+    another index (manifest_target), the index is rebuilt.
+
+    Steps:
+    1. Finds all PDF files in the folder and compares their hashes with the
+       manifest.
+    2. Extracts and splits the text of the new and changed files.
+    3. Compares the stable ids and hashes of their chunks with the manifest.
+    4. Upserts the new and changed chunks, deletes the removed ones and
+       saves the manifest.
+
+    Parameters:
+    ----------
+        folder : str
+            The folder of the PDF files, by default the current one.
+        dry_run : bool
+            Only report the changes, without embedding, writing to the
+            vector store or saving the manifest.
+        backend : str, optional
+            The backend of the vector store, by default the one of
+            BEALIVE_VECTOR_STORE.
+
+    Returns:
+    -------
+        IngestionReport
+            The changes of the ingestion.
+    """
+    backend = vector_store_backend(backend)
+    target = manifest_target(backend)
+    manifest_path = os.path.join(folder, MANIFEST_FILE.format(backend=backend))
+    manifest = load_manifest(manifest_path)
+    if manifest is not None and manifest.get("target") != target:
+        # Its chunks are not the ones of this index
+        manifest = None
+    report = IngestionReport(rebuilt=manifest is None, dry_run=dry_run)
+    previous_files = {} if manifest is None else manifest["files"]
+
+    # Get a list of all PDF files in the folder
+    pdf_files = sorted(f for f in os.listdir(folder) if f.endswith(".pdf"))
+
+    files: Dict[str, Dict] = {}
+    upserts: List[Tuple[str, Document]] = []
+    deletes: List[str] = []
+
+    for pdf_file in pdf_files:
+        digest = file_hash(os.path.join(folder, pdf_file))
+        previous = previous_files.get(pdf_file)
+
+        if previous is not None and previous["sha256"] == digest:
+            files[pdf_file] = previous
+            report.unchanged_files.append(pdf_file)
+            continue
+
+        (report.changed_files if previous else report.added_files).append(
+            pdf_file)
+
+        chunks = split_pdf(os.path.join(folder, pdf_file))
+        for chunk in chunks:
+            # The file name, not the path of the current run
+            chunk.metadata["source"] = pdf_file
+        hashes = chunk_ids(pdf_file, chunks)
+        previous_chunks = previous["chunks"] if previous else {}
+
+        for (chunk_id, chunk_hash), chunk in zip(hashes.items(), chunks):
+            if chunk_id not in previous_chunks:
+                report.added_chunks += 1
+                upserts.append((chunk_id, chunk))
+            elif previous_chunks[chunk_id] != chunk_hash:
+                report.updated_chunks += 1
+                upserts.append((chunk_id, chunk))
+            else:
+                report.unchanged_chunks += 1
+
+        deletes.extend(chunk_id for chunk_id in previous_chunks
+                       if chunk_id not in hashes)
+        files[pdf_file] = {"sha256": digest, "chunks": hashes}
+
+    for pdf_file, previous in previous_files.items():
+        if pdf_file not in files:
+            report.removed_files.append(pdf_file)
+            deletes.extend(previous["chunks"])
+
+    report.deleted_chunks = len(deletes)
+
+    if dry_run or not report.changed:
+        return report
+
+    # Access the "company-info-rag" index with OpenAI embeddings
+    vector_store = get_vector_store(INDEX_NAME, backend=backend)
+
+    if report.rebuilt:
+        # The chunks of the previous runs have positional ids
+        vector_store.delete(delete_all=True)
+
+    if deletes:
+        vector_store.delete(ids=deletes)
+
+    if upserts:
+        # Add the documents and their embeddings to the vector store
+        vector_store.add_documents(documents=[chunk for _, chunk in upserts],
+                                   ids=[chunk_id for chunk_id, _ in upserts])
+
+    save_manifest(manifest_path, {"target": target, "files": files})
+
+    # Invalidate the answers cached on the previous documents
+    bump_corpus_version(INDEX_NAME)
+
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
 
-    # Generate unique IDs for each chunk
-    ids = [str(i) for i in range(len(all_splits))]
+    parser = argparse.ArgumentParser(
+        description="Ingest the company information PDFs incrementally.")
+    parser.add_argument("folder", nargs="?", default=os.path.dirname(
+        os.path.abspath(__file__)))
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report what would change.")
+    parser.add_argument("--backend", choices=("pinecone", "local"),
+                        help="Backend of the vector store, by default "
+                             "BEALIVE_VECTOR_STORE.")
+    args = parser.parse_args()
 
-    # Add the documents and their embeddings to the vector store
-    vector_store.add_documents(documents=all_splits, ids=ids)
+    print(json.dumps(create_embeddings(args.folder, args.dry_run,
+                                       args.backend).__dict__, indent=2))
@@ -0,0 +1,675 @@
+import functools
+import inspect
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Service name of the OTLP resource.
+SERVICE_NAME = "bealive-chatbot"
+
+# Characters of the SQL statements kept in the spans.
+STATEMENT_LENGTH = 300
+
+# Attributes of the spans with a name in the OpenTelemetry semantic
+# conventions, the others are exported with a "bealive." prefix.
+OTLP_ATTRIBUTES = {
+    "model": "gen_ai.request.model",
+    "prompt_tokens": "gen_ai.usage.input_tokens",
+    "completion_tokens": "gen_ai.usage.output_tokens",
+    "statement": "db.statement",
+    "rows": "db.response.returned_rows",
+}
+
+# OTLP span kinds: INTERNAL, and CLIENT for the calls to other services.
+_OTLP_KINDS = {"llm": 3, "embedding": 3, "vector": 3, "sql": 3}
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("bealive_span",
+                                                         default=None)
+
+# The LangChain callback handler of the current trace, read by the
+# configure hook registered in _langchain_handler.
+_langchain_handler_var: ContextVar[Optional[Any]] = ContextVar(
+    "bealive_langchain_handler", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+@dataclass
+class Span:
+    """
+    A timed operation of a trace.
+
+    Attributes:
+    ----------
+        name : str
+            The name of the operation (a chain, a tool, a model, a SQL
+            statement).
+        kind : str
+            The kind of operation: "turn", "router", "chain", "agent",
+            "handler", "tool", "llm", "embedding", "vector", "sql" or
+            "internal".
+        trace : Trace
+            The trace of the span.
+        span_id : str
+            The id of the span, 16 hexadecimal characters.
+        parent_id : str, optional
+            The id of the parent span, None for the root.
+        start : float
+            The Unix time of the start.
+        duration_ms : float
+            The milliseconds of the operation, set when it ends.
+        attributes : Dict[str, Any]
+            The model, prompt_tokens, completion_tokens, rows, statement...
+        error : str, optional
+            The error that ended the operation.
+    """
+
+    name: str
+    kind: str
+    trace: "Trace" = field(repr=False)
+    span_id: str = field(default_factory=lambda: _new_id(8))
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any):
+        """
+        Sets attributes of the span, the None values are ignored.
+        """
+        self.attributes.update((key, value) for key, value
+                               in attributes.items() if value is not None)
+
+    def end(self, error: Optional[BaseException] = None):
+        """
+        Ends the span and adds it to its trace.
+        """
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.add(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        The span as a JSON object, a line of the JSONL exporter.
+        """
+        return {"trace_id": self.trace.trace_id, "span_id": self.span_id,
+                "parent_id": self.parent_id, "name": self.name,
+                "kind": self.kind, "start": self.start,
+                "duration_ms": round(self.duration_ms, 3),
+                "attributes": self.attributes, "error": self.error}
+
+
+class Trace:
+    """
+    The spans of a request, a turn of the chatbot.
+
+    Attributes:
+    ----------
+        trace_id : str
+            The id of the trace, 32 hexadecimal characters.
+        root : Span
+            The span of the whole request.
+        spans : List[Span]
+            The spans that ended, in the order they ended.
+
+    Methods:
+    -------
+        add(span):
+            Adds a span that ended.
+        breakdown() -> List[dict]:
+            The spans as a tree, depth first, for display.
+        to_otlp() -> dict:
+            The spans as an OTLP/JSON ExportTraceServiceRequest.
+    """
+
+    def __init__(self, name: str, **attributes: Any):
+        self.trace_id = _new_id(16)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = Span(name, "turn", self)
+        self.root.set(**attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+    def add(self, span: Span):
+        """
+        Adds a span that ended, from any thread.
+        """
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """
+        The spans as a tree, depth first and by start, with their depth, the
+        rows of the debug view of the Chatbot page.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+
+        children: Dict[Optional[str], List[Span]] = {}
+        ids = {span.span_id for span in spans}
+        for span in spans:
+            # The spans whose parent did not end yet are shown at the top
+            parent = span.parent_id if span.parent_id in ids else None
+            if span is not self.root and parent is None:
+                parent = self.root.span_id
+            children.setdefault(parent, []).append(span)
+
+        rows = []
+
+        def visit(span: Span, depth: int):
+            rows.append({"span": "  " * depth + span.name, "kind": span.kind,
+                         "ms": round(span.duration_ms, 1),
+                         "model": span.attributes.get("model"),
+                         "prompt_tokens": span.attributes.get(
+                             "prompt_tokens"),
+                         "completion_tokens": span.attributes.get(
+                             "completion_tokens"),
+                         "rows": span.attributes.get("rows"),
+                         "error": span.error})
+            for child in children.get(span.span_id, []):
+                visit(child, depth + 1)
+
+        visit(self.root, 0)
+        return rows
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        The spans as an OTLP/JSON ExportTraceServiceRequest, the format of
+        the file exporter of the OpenTelemetry Collector.
+        """
+        def value(item: Any) -> Dict[str, Any]:
+            if isinstance(item, bool):
+                return {"boolValue": item}
+            if isinstance(item, int):
+                return {"intValue": str(item)}
+            if isinstance(item, float):
+                return {"doubleValue": item}
+            return {"stringValue": str(item)}
+
+        def otlp_span(span: Span) -> Dict[str, Any]:
+            start = int(span.start * 1e9)
+            attributes = dict(span.attributes, **{"bealive.kind": span.kind})
+            result = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": _OTLP_KINDS.get(span.kind, 1),
+                "startTimeUnixNano": str(start),
+                "endTimeUnixNano": str(start + int(span.duration_ms * 1e6)),
+                "attributes": [
+                    {"key": OTLP_ATTRIBUTES.get(key, key if "." in key
+                                                else f"bealive.{key}"),
+                     "value": value(item)}
+                    for key, item in attributes.items()],
+                "status": ({"code": 2, "message": span.error} if span.error
+                           else {"code": 1}),
+            }
+            if span.parent_id:
+                result["parentSpanId"] = span.parent_id
+            return result
+
+        with self._lock:
+            spans = list(self.spans)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{
+                "key": "service.name",
+                "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__},
+                            "spans": [otlp_span(span) for span in spans]}],
+        }]}
+
+
+class FileExporter:
+    """
+    Appends the traces to a file: one span per line ("jsonl"), or one OTLP/JSON
+    ExportTraceServiceRequest per trace ("otlp"), which the OpenTelemetry
+    Collector can read back with its otlpjsonfile receiver.
+
+    Attributes:
+    ----------
+        path : str
+            The file of the traces.
+        format : str
+            "jsonl" or "otlp".
+    """
+
+    def __init__(self, path: str, format: str = "jsonl"):
+        if format not in ("jsonl", "otlp"):
+            raise ValueError(f"Unknown trace format: {format}")
+
+        self.path = path
+        self.format = format
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace):
+        """
+        Appends a trace to the file.
+        """
+        if self.format == "otlp":
+            lines = [trace.to_otlp()]
+        else:
+            lines = [span.to_dict() for span in trace.spans]
+
+        text = "".join(json.dumps(line, default=str) + "\n" for line in lines)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(text)
+
+
+_exporters: Dict[tuple, FileExporter] = {}
+_exporters_lock = threading.Lock()
+
+
+def get_exporter() -> Optional[FileExporter]:
+    """
+    Returns the exporter of the file of BEALIVE_TRACE_FILE, in the format of
+    BEALIVE_TRACE_FORMAT ("jsonl" by default, or "otlp"), None when the
+    traces are not exported.
+    """
+    path = os.getenv("BEALIVE_TRACE_FILE")
+    if not path:
+        return None
+
+    key = (path, os.getenv("BEALIVE_TRACE_FORMAT", "jsonl").lower())
+    exporter = _exporters.get(key)
+    if exporter is None:
+        with _exporters_lock:
+            exporter = _exporters.get(key)
+            if exporter is None:
+                exporter = _exporters[key] = FileExporter(*key)
+
+    return exporter
+
+
+def tracing_enabled() -> bool:
+    """
+    Whether the requests are traced, unless BEALIVE_TRACING is "0".
+    """
+    return os.getenv("BEALIVE_TRACING", "1") != "0"
+
+
+def current_span() -> Optional[Span]:
+    """
+    The innermost span of the current request, None outside of a trace.
+    """
+    return _current_span.get()
+
+
+def start_span(name: str, kind: str = "internal",
+               parent: Optional[Span] = None,
+               **attributes: Any) -> Optional[Span]:
+    """
+    Starts a span, child of parent or of the current span, that is ended
+    with Span.end. Returns None outside of a trace.
+    """
+    parent = parent or _current_span.get()
+    if parent is None:
+        return None
+
+    span = Span(name, kind, parent.trace, parent_id=parent.span_id)
+    span.set(**attributes)
+    return span
+
+
+@contextmanager
+def span(name: str, kind: str = "internal",
+         **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Context manager that records the block as a span, child of the current
+    span, and makes it the current span. Does nothing outside of a trace.
+
+    Parameters:
+    ----------
+        name : str
+            The name of the operation.
+        kind : str
+            The kind of operation.
+        **attributes :
+            The attributes of the span.
+
+    Yields:
+    -------
+        Span, optional
+            The span, to set more attributes, or None.
+    """
+    current = start_span(name, kind, **attributes)
+    if current is None:
+        yield None
+        return
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+    finally:
+        _reset(_current_span, token)
+
+
+def _reset(variable: ContextVar, token):
+    try:
+        variable.reset(token)
+    except ValueError:
+        # A generator closed from another context
+        pass
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Optional[Trace]]:
+    """
+    Context manager that traces the block as a new request: a trace with a
+    new id whose root span is the block. The LangChain calls of the block
+    (models, tools, retrievers) are recorded as spans, and the trace is
+    exported when the block ends. Yields None when tracing is disabled.
+
+    Parameters:
+    ----------
+        name : str
+            The name of the request.
+        **attributes :
+            The attributes of the root span.
+
+    Yields:
+    -------
+        Trace, optional
+            The trace, complete when the block ends.
+    """
+    if not tracing_enabled():
+        yield None
+        return
+
+    trace = Trace(name, **attributes)
+    span_token = _current_span.set(trace.root)
+    handler = _langchain_handler()
+    handler_token = (_langchain_handler_var.set(handler)
+                     if handler is not None else None)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.root.end(e)
+        raise
+    else:
+        trace.root.end()
+    finally:
+        _reset(_current_span, span_token)
+        if handler_token is not None:
+            _reset(_langchain_handler_var, handler_token)
+
+        exporter = get_exporter()
+        if exporter is not None:
+            try:
+                exporter.export(trace)
+            except OSError:
+                pass
+
+
+def _traced_method(function: Callable, name: str, kind: str) -> Callable:
+    """
+    Wrap a method, a coroutine or a generator to record its calls as spans.
+    """
+    if inspect.iscoroutinefunction(function):
+        async def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return await function(*args, **kwargs)
+
+    elif inspect.isgeneratorfunction(function):
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                yield from function(*args, **kwargs)
+
+    else:
+        def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return function(*args, **kwargs)
+
+    return functools.wraps(function)(wrapper)
+
+
+def traced(kind: str = "chain", name: Optional[str] = None):
+    """
+    Class decorator that records the invoke, ainvoke and stream methods
+    defined by a class as spans named after the class.
+
+    Parameters:
+    ----------
+        kind : str
+            The kind of the spans.
+        name : str, optional
+            The name of the spans, by default the name of the class.
+    """
+    def decorate(cls):
+        for method in ("invoke", "ainvoke", "stream"):
+            function = cls.__dict__.get(method)
+            if function is not None:
+                setattr(cls, method, _traced_method(
+                    function, name or cls.__name__, kind))
+        return cls
+
+    return decorate
+
+
+def _statement(sql: str) -> str:
+    return _WHITESPACE.sub(" ", sql).strip()[:STATEMENT_LENGTH]
+
+
+class TracedCursor:
+    """
+    A sqlite3.Cursor that records every statement as a span, with the rows
+    it changed or the rows fetched from it. The other attributes are the
+    ones of the cursor.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._span: Optional[Span] = None
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+    def _run(self, method: Callable, sql: str, parameters, **attributes):
+        statement = _statement(sql)
+        current = start_span(f"sqlite {statement.split(' ', 1)[0].upper()}",
+                             "sql", statement=statement, **attributes)
+        try:
+            method(sql, parameters)
+        except BaseException as e:
+            if current is not None:
+                current.end(e)
+            raise
+
+        if current is not None:
+            if self._cursor.rowcount >= 0:
+                current.set(rows=self._cursor.rowcount)
+            current.end()
+        self._span = current
+        return self
+
+    def execute(self, sql: str, parameters=()):
+        return self._run(self._cursor.execute, sql, parameters)
+
+    def executemany(self, sql: str, parameters):
+        parameters = list(parameters)
+        return self._run(self._cursor.executemany, sql, parameters,
+                         batch=len(parameters))
+
+    def _fetched(self, rows: int, started: float):
+        """
+        Adds fetched rows, and the time to fetch them, to the span of the
+        last statement.
+        """
+        if self._span is not None:
+            self._span.duration_ms += (time.perf_counter() - started) * 1000
+            self._span.attributes["rows"] = (
+                self._span.attributes.get("rows", 0) + rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(row is not None, started)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        started = time.perf_counter()
+        rows = (self._cursor.fetchmany() if size is None
+                else self._cursor.fetchmany(size))
+        self._fetched(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(len(rows), started)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def _langchain_handler():
+    """
+    The LangChain callback handler that records the models, tools and
+    retrievers of the current trace as spans, created and registered as a
+    configure hook on the first trace. None when LangChain is not
+    installed.
+    """
+    global _handler
+
+    if _handler is not None:
+        return _handler
+
+    with _handler_lock:
+        if _handler is not None:
+            return _handler
+
+        try:
+            from langchain_core.callbacks import BaseCallbackHandler
+            from langchain_core.tracers.context import register_configure_hook
+        except ImportError:
+            return None
+
+        class SpanCallbackHandler(BaseCallbackHandler):
+            """
+            Records the LangChain models, tools and retrievers as spans of
+            the current trace. The tools are the current span while they
+            run, so the chains, models and statements they call are their
+            children.
+            """
+
+            run_inline = True
+
+            def __init__(self):
+                self._spans: Dict[Any, tuple] = {}
+                self._lock = threading.Lock()
+
+            def _start(self, run_id, name: str, kind: str,
+                       current: bool = False, **attributes):
+                started = start_span(name, kind, **attributes)
+                if started is None:
+                    return
+                token = _current_span.set(started) if current else None
+                with self._lock:
+                    self._spans[run_id] = (started, token)
+
+            def _end(self, run_id, error: Optional[BaseException] = None,
+                     **attributes) -> Optional[Span]:
+                with self._lock:
+                    started, token = self._spans.pop(run_id, (None, None))
+                if started is None:
+                    return None
+                started.set(**attributes)
+                started.end(error)
+                if token is not None:
+                    _reset(_current_span, token)
+                return started
+
+            def _model_start(self, serialized, run_id, metadata, kwargs):
+                parameters = kwargs.get("invocation_params") or {}
+                model = (parameters.get("model_name")
+                         or parameters.get("model")
+                         or (metadata or {}).get("ls_model_name"))
+                self._start(run_id, f"llm {model or 'model'}", "llm",
+                            model=model)
+
+            def on_chat_model_start(self, serialized, messages, *, run_id,
+                                    parent_run_id=None, tags=None,
+                                    metadata=None, **kwargs):
+                self._model_start(serialized, run_id, metadata, kwargs)
+
+            def on_llm_start(self, serialized, prompts, *, run_id,
+                             parent_run_id=None, tags=None, metadata=None,
+                             **kwargs):
+                self._model_start(serialized, run_id, metadata, kwargs)
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                usage = (response.llm_output or {}).get("token_usage") or {}
+                prompt_tokens = usage.get("prompt_tokens")
+                completion_tokens = usage.get("completion_tokens")
+
+                for generations in response.generations:
+                    for generation in generations:
+                        metadata = getattr(getattr(generation, "message",
+                                                   None),
+                                           "usage_metadata", None)
+                        if metadata:
+                            prompt_tokens = metadata.get("input_tokens")
+                            completion_tokens = metadata.get(
+                                "output_tokens")
+
+                self._end(run_id, prompt_tokens=prompt_tokens,
+                          completion_tokens=completion_tokens,
+                          model=(response.llm_output or {}).get(
+                              "model_name"))
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._end(run_id, error)
+
+            def on_tool_start(self, serialized, input_str, *, run_id,
+                              **kwargs):
+                self._start(run_id, (serialized or {}).get("name", "tool"),
+                            "tool", current=True)
+
+            def on_tool_end(self, output, *, run_id, **kwargs):
+                self._end(run_id)
+
+            def on_tool_error(self, error, *, run_id, **kwargs):
+                self._end(run_id, error)
+
+            def on_retriever_start(self, serialized, query, *, run_id,
+                                   **kwargs):
+                self._start(run_id, (serialized or {}).get("name",
+                                                            "retriever"),
+                            "vector")
+
+            def on_retriever_end(self, documents, *, run_id, **kwargs):
+                self._end(run_id, rows=len(documents))
+
+            def on_retriever_error(self, error, *, run_id, **kwargs):
+                self._end(run_id, error)
+
+        register_configure_hook(_langchain_handler_var, True)
+        _handler = SpanCallbackHandler()
+
+    return _handler
@@ -0,0 +1,257 @@
+import os
+import threading
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from BeAlive.data.loader import BASE_DIR
+
+# Backend of the vector stores when BEALIVE_VECTOR_STORE is not set:
+# "pinecone" or "local".
+DEFAULT_VECTOR_STORE = "pinecone"
+
+# Folder of the indexes of the local backend when BEALIVE_VECTOR_DIR is not
+# set.
+DEFAULT_VECTOR_DIR = os.path.join(BASE_DIR, "database", "vectors")
+
+# Embedding model used by the indexes.
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain vector store on a LocalVectorIndex, a float32 matrix in a
+    memory-mapped file searched with an exact dot product.
+
+    The relevance scores are the ones of Pinecone with the cosine metric,
+    (cosine + 1) / 2, so the score thresholds of the retrievers work the
+    same with both backends.
+
+    Attributes:
+    ----------
+        index : LocalVectorIndex
+            The index with the vectors, texts and metadata.
+        embedding : Embeddings
+            The embeddings of the texts and queries.
+
+    Methods:
+    -------
+        add_texts(texts, metadatas, ids) -> List[str]:
+            Embeds and stores texts.
+        delete(ids, delete_all) -> bool:
+            Deletes vectors by id, or all of them.
+        similarity_search_with_score(query, k, filter) -> list:
+            Returns the most similar documents and their cosine similarity.
+        similarity_search(query, k, filter) -> List[Document]:
+            Returns the most similar documents.
+    """
+
+    def __init__(self, index_name: str, embedding: Embeddings,
+                 path: Optional[str] = None):
+        """
+        Opens the local index.
+
+        Parameters:
+        ----------
+            index_name : str
+                The name of the index, a folder inside path.
+            embedding : Embeddings
+                The embeddings of the texts and queries.
+            path : str, optional
+                The folder of the local indexes, by default
+                BEALIVE_VECTOR_DIR or DEFAULT_VECTOR_DIR.
+        """
+        from BeAlive.data.local_index import LocalVectorIndex
+
+        path = path or local_vector_dir()
+        self.index = LocalVectorIndex(os.path.join(path, index_name))
+        self.embedding = embedding
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    def add_texts(self, texts: Iterable[str],
+                  metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self.index.upsert(ids, self.embedding.embed_documents(texts), texts,
+                          metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None,
+               delete_all: Optional[bool] = None,
+               **kwargs: Any) -> Optional[bool]:
+        if delete_all:
+            self.index.clear()
+            return True
+
+        if ids is None:
+            raise ValueError("The ids of the vectors to delete are required.")
+
+        self.index.delete(ids)
+        return True
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        return [Document(id=vector_id, page_content=text, metadata=metadata)
+                for vector_id, text, metadata in self.index.get(ids)]
+
+    def similarity_search_by_vector_with_score(
+            self, embedding: List[float], k: int = 4,
+            filter: Optional[dict] = None,
+            **kwargs: Any) -> List[Tuple[Document, float]]:
+        """
+        Returns the k documents most similar to a vector and their cosine
+        similarity.
+        """
+        return [(Document(id=vector_id, page_content=text, metadata=metadata),
+                 score)
+                for vector_id, text, metadata, score
+                in self.index.search(embedding, k, filter)]
+
+    def similarity_search_with_score(
+            self, query: str, k: int = 4, filter: Optional[dict] = None,
+            **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self.embedding.embed_query(query), k, filter)
+
+    async def asimilarity_search_with_score(
+            self, query: str, k: int = 4, filter: Optional[dict] = None,
+            **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            await self.embedding.aembed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [document for document, _ in
+                self.similarity_search_by_vector_with_score(embedding, k,
+                                                            filter)]
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [document for document, _ in
+                self.similarity_search_with_score(query, k, filter)]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None,
+                   index_name: str = "default",
+                   **kwargs: Any) -> "LocalVectorStore":
+        store = cls(index_name, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+
+def vector_store_backend(backend: Optional[str] = None) -> str:
+    """
+    Returns the backend of the vector stores: the given one, or the one of
+    BEALIVE_VECTOR_STORE, "pinecone" by default.
+    """
+    return (backend or os.getenv("BEALIVE_VECTOR_STORE",
+                                 DEFAULT_VECTOR_STORE)).lower()
+
+
+def local_vector_dir() -> str:
+    """
+    Returns the folder of the indexes of the local backend.
+    """
+    return os.getenv("BEALIVE_VECTOR_DIR", DEFAULT_VECTOR_DIR)
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(model: str = EMBEDDING_MODEL) -> Embeddings:
+    """
+    Returns the embeddings used by the vector stores: the OpenAI embeddings
+    behind the persistent embedding cache, shared by the process.
+    """
+    from langchain_openai import OpenAIEmbeddings
+    from BeAlive.data.embedding_cache import CachedEmbeddings
+
+    return CachedEmbeddings(OpenAIEmbeddings(model=model), model)
+
+
+_stores: Dict[Tuple[str, str, str], VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(index_name: str, embedding_model: str = EMBEDDING_MODEL,
+                     backend: Optional[str] = None) -> VectorStore:
+    """
+    Returns the vector store of an index, with the backend selected by the
+    BEALIVE_VECTOR_STORE environment variable: "pinecone" (default) or
+    "local". The stores are created once and shared by the process.
+
+    Parameters:
+    ----------
+        index_name : str
+            The name of the index ("activities" or "company-info-rag").
+        embedding_model : str
+            The name of the embedding model of the index.
+        backend : str, optional
+            Overrides the backend of BEALIVE_VECTOR_STORE.
+
+    Returns:
+    -------
+        VectorStore
+            The LangChain vector store of the index.
+    """
+    backend = vector_store_backend(backend)
+    key = (backend, index_name, embedding_model)
+
+    store = _stores.get(key)
+    if store is not None:
+        return store
+
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is not None:
+            return store
+
+        if backend == "local":
+            store = LocalVectorStore(index_name,
+                                     get_embeddings(embedding_model))
+
+        elif backend == "pinecone":
+            from pinecone import Pinecone
+            from langchain_pinecone import PineconeVectorStore
+            store = PineconeVectorStore(index=Pinecone().Index(index_name),
+                                        embedding=get_embeddings(embedding_model))
+
+        else:
+            raise ValueError(f"Unknown vector store backend: {backend}")
+
+        _stores[key] = store
+        return store
+
+
+def set_vector_store(index_name: str, store: VectorStore,
+                     embedding_model: str = EMBEDDING_MODEL,
+                     backend: Optional[str] = None):
+    """
+    Replaces the vector store of an index, e.g. with a local stand-in for
+    the benchmarks. The chains created afterwards use it.
+
+    Parameters:
+    ----------
+        index_name : str
+            The name of the index.
+        store : VectorStore
+            The LangChain vector store of the index.
+        embedding_model : str
+            The name of the embedding model of the index.
+        backend : str, optional
+            The backend it replaces, by default BEALIVE_VECTOR_STORE.
+    """
+    backend = vector_store_backend(backend)
+    with _stores_lock:
+        _stores[(backend, index_name, embedding_model)] = store
@@ -1,5 +1,5 @@
-import sqlite3
 import streamlit as st
+from BeAlive.data.connection import get_connection
 from BeAlive.pages.users_interact import UserDatabase
 from BeAlive.pages.Registration import is_valid_email
 
@@ -8,7 +8,7 @@ from BeAlive.pages.Registration import is_valid_email
 st.set_page_config(page_title="Account",layout="wide", page_icon=":bust_in_silhouette:")
 
 # Connect to the database
-conn = sqlite3.connect("BeAlive/data/database/BeAlive.db")
+conn = get_connection()
 db = UserDatabase(conn)
 
 # Fetch the current user details
@@ -1,11 +1,14 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 from streamlit_calendar import calendar
-import sqlite3
-import pandas as pd
+from BeAlive.data.calendar_events import get_calendar_provider
 
 
-current_date = datetime.now()
+# The date shown by the calendar, moved by its navigation buttons
+if "calendar_date" not in st.session_state:
+    st.session_state.calendar_date = datetime.now()
+
+current_date = st.session_state.calendar_date
 formatted_date = current_date.strftime("%Y-%m-01")
 
 
@@ -31,50 +34,36 @@ st.markdown(
 st.markdown("<h1 class='header'>Calendar</h1>", unsafe_allow_html=True)
 
 
-def fetch_calendar_events():
+def calendar_window(date: datetime) -> tuple:
     """
-    Retrieve calendar events from the database.
+    The date window of the events loaded for a date: its year, with the
+    days of the neighbouring months shown by the month and week views.
+    Every calendar mode shows a part of it, so switching modes reuses the
+    loaded events.
 
     Returns:
-        events: A list of dictionaries containing calendar events.
-    """
-    conn = sqlite3.connect("BeAlive/data/database/BeAlive.db")
-    query = """
-   SELECT a.activity_name as activity,
-          a.date_begin as start,
-          a.date_finish as end,
-          a.location as location
-    FROM reservations r JOIN activities a
-         ON
-         a.activity_id = r.activity_id
-    WHERE
-        r.state = "confirmed" and
-        r.user_id = ?
-
-    UNION
-
-    SELECT a.activity_name as activity,
-           a.date_begin as start,
-           a.date_finish as end,
-           a.location as location
-    FROM activities a
-    WHERE a.host_id = ?
+        (start, end): The start and the (excluded) end of the window.
     """
+    year = datetime(date.year, 1, 1)
+    return (year - timedelta(days=7),
+            datetime(date.year + 1, 1, 1) + timedelta(days=14))
 
-    df = pd.read_sql_query(query, conn, params=(user_id, user_id))
-    conn.close()
 
-    # Format the events to match calendar expectations
-    events = []
-    for index, row in df.iterrows():
-        event = {
-            "title": row["activity"] + ", " + row["location"],  # This will display as the title of the event
-            "start": row["start"],  # Event start date/time
-            "end": row["end"],  # Event end date/time
-        }
-        events.append(event)
+def fetch_calendar_events(check_version: bool = True):
+    """
+    Retrieve the calendar events of the window of the shown date, from the
+    cache of the process when they were already loaded.
 
-    return events
+    Args:
+        check_version: Whether the cached events may be checked against the
+            version of the calendar, False when only the mode changed.
+
+    Returns:
+        events: A list of dictionaries containing calendar events.
+    """
+    return get_calendar_provider().events(user_id,
+                                          *calendar_window(current_date),
+                                          check_version=check_version)
 
 
 calendar_options = {
@@ -92,7 +81,7 @@ calendar_options = {
         "center": "title",
         "right": "dayGridMonth,timeGridWeek,timeGridDay"
     },
-    "events": fetch_calendar_events(),
+    "initialDate": current_date.strftime("%Y-%m-%d"),
     "selectable": True,
 }
 
@@ -149,6 +138,24 @@ elif mode == "multimonth":
             "initialView": "multiMonthYear",
         }
 
+# A change of mode shows the events already loaded, without a query
+mode_changed = st.session_state.get("calendar_mode", mode) != mode
+st.session_state.calendar_mode = mode
+
 state = calendar(
-    events=st.session_state.get("events", fetch_calendar_events()),
-    options=calendar_options)
+    events=fetch_calendar_events(check_version=not mode_changed),
+    options=calendar_options,
+    callbacks=["datesSet"],
+    key="calendar")
+
+# Load the events of another year when the calendar is moved out of the
+# loaded window
+if state and state.get("callback") == "datesSet":
+    shown = state["datesSet"]
+    shown_start = datetime.fromisoformat(shown["start"]).replace(tzinfo=None)
+    shown_end = datetime.fromisoformat(shown["end"]).replace(tzinfo=None)
+    window_start, window_end = calendar_window(current_date)
+
+    if shown_start < window_start or shown_end > window_end:
+        st.session_state.calendar_date = shown_start + (shown_end - shown_start) / 2
+        st.rerun()
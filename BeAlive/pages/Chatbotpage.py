@@ -1,13 +1,15 @@
+import os
 import streamlit as st
 from dotenv import load_dotenv
 load_dotenv()
 from BeAlive.chatbot.chains.create_activity import CreateActivityChain
-from BeAlive.chatbot.chains.change_state import UpdateActivitiesChain
+from BeAlive.chatbot.services.bulk_import import extract_pdf_text, import_activities
 from BeAlive.chatbot.chains.show_reserv import ShowReservationChain
 from BeAlive.chatbot.chains.show_review import ShowReviewChain
 from BeAlive.chatbot.bot import MainChatbot
-import time
-import pymupdf
+from BeAlive.data.outbox import get_outbox_worker
+from BeAlive.chatbot.services.lifecycle import start_lifecycle_sweeper
+from BeAlive.chatbot.services.warmup import start_warmup
 
 
 st.set_page_config(page_title="Chatbot", layout="wide", page_icon="🤖")
@@ -29,29 +31,6 @@ with st.spinner("Loading Chatbot..."):
 
     st.title("AIventure")
 
-    def simulate_streaming(message):
-        """
-        Simulate a streaming response from the bot.
-
-        Parameters:
-        -----------
-        message: str
-            The message to be streamed.
-        """
-        buffer = ""
-        for char in message:
-            buffer += char
-            if char == " " or char == "\n":
-                yield buffer
-                buffer = ""
-                if char == "\n":  # To simulate line breaks
-                    time.sleep(0.1)  # Longer pause for newlines (optional)
-                else:
-                    time.sleep(0.05)
-        if buffer:  # Yield any remaining characters
-            yield buffer
-
-
     def main(bot: MainChatbot):
         """
         Main interaction loop for the chatbot.
@@ -61,8 +40,6 @@ with st.spinner("Loading Chatbot..."):
         if "messages" not in st.session_state:
             st.session_state.messages = []
 
-            UpdateActivitiesChain().UpdateActivities()
-
             ShowReservations = ShowReservationChain().ShowReservation()
             st.session_state.messages.append({"role": "bot", "content": "PENDING RESERVATIONS: \n\n" + ShowReservations})
 
@@ -84,6 +61,12 @@ with st.spinner("Loading Chatbot..."):
                 with st.chat_message(message["role"], avatar="🕺"):
                     st.markdown(message["content"])
 
+        # Debug view of the spans of the last turn
+        show_trace = st.sidebar.checkbox(
+            "Show the trace of the last answer",
+            value=os.getenv("BEALIVE_TRACE_DEBUG", "0") == "1",
+            key="show_trace")
+
         # User input
         user_input = st.chat_input("You:")
         if user_input:
@@ -92,21 +75,30 @@ with st.spinner("Loading Chatbot..."):
             with st.chat_message("user", avatar="🕺"):
                 st.markdown(user_input)
 
-            try:
-                response = bot.process_user_input({"user_input": user_input})
-            except Exception as e:
-                response = f"Please try again, an error has occured. Error: {str(e)}. "
+            # Display bot response as it is generated
+            with st.chat_message("bot", avatar="🤖"):
+                try:
+                    response = st.write_stream(
+                        bot.stream_user_input({"user_input": user_input}))
+                except Exception as e:
+                    response = f"Please try again, an error has occured. Error: {str(e)}. "
+                    st.markdown(response)
 
             # Append response to session state
             st.session_state.messages.append({"role": "bot", "content": response})
 
-            # Display bot response
-            with st.chat_message("bot", avatar="🤖"):
-                st.write_stream(simulate_streaming(response))
-
             bot.add_messages_memory(message=user_input,
                                     respond=response)
 
+            if show_trace and bot.last_trace is not None:
+                trace = bot.last_trace
+                with st.expander("Trace of the last answer"):
+                    st.caption(f"Trace {trace.trace_id} | "
+                               f"{trace.duration_ms:.0f} ms | "
+                               f"{len(trace.spans)} spans")
+                    st.dataframe(trace.breakdown(), use_container_width=True,
+                                 hide_index=True)
+
         # Add the download and upload buttons at the bottom of the page
         with st.container():
 
@@ -127,10 +119,8 @@ with st.spinner("Loading Chatbot..."):
 
             if activity_upload is not None:
                 try:
-                    with pymupdf.open(stream=activity_upload.read(), filetype="pdf") as pdf:
-                        pdf_text = ""
-                        for page_num, page in enumerate(pdf, start=1):
-                            pdf_text += f"Page {page_num}:\n{page.get_text()}\n\n"
+                    pdf_text = extract_pdf_text((activity_upload.name,
+                                                 activity_upload.read()))
 
                     # Display the extracted text
                     st.text("Extracted Text from PDF:")
@@ -148,17 +138,53 @@ with st.spinner("Loading Chatbot..."):
                     st.error("An error occurred while processing the PDF.")
                     st.error(str(e))
 
+            bulk_upload = st.file_uploader("Bulk Import Activities", type="pdf",
+                                           accept_multiple_files=True,
+                                           key="bulk_upload_button")
+
+            if bulk_upload and st.button("Import Activities", key="bulk_import_button",
+                                         use_container_width=True):
+                try:
+                    with st.spinner(f"Importing {len(bulk_upload)} activities..."):
+                        report = import_activities(
+                            [(upload.name, upload.getvalue()) for upload in bulk_upload],
+                            host_id=st.session_state.user_id)
+
+                    result_bulk = report.to_markdown()
+
+                    # Append response to session state
+                    st.session_state.messages.append({"role": "bot", "content": result_bulk})
+                    st.markdown(result_bulk)
+
+                    bot.add_messages_memory(message="I want to create several activities",
+                                            respond=result_bulk)
+
+                except Exception as e:
+                    st.error("An error occurred while importing the PDFs.")
+                    st.error(str(e))
+
 
     # Notify the user that the bot is starting
     with st.chat_message("bot", avatar="🤖"):
         st.markdown("Starting the bot...")
 
     if "bot" not in st.session_state:
+        # Start applying the vector writes, including the ones left by a
+        # previous run, and finishing the activities on a schedule
+        get_outbox_worker()
+        start_lifecycle_sweeper()
+
+        # Load the router encoder, the chains and the sentiment model in the
+        # background, they are built on their first use until it finishes
+        start_warmup()
+
         st.session_state.bot = MainChatbot()
         st.session_state.bot.user_login(user_id=f"{st.session_state.user_id}")
 
     with st.chat_message("bot", avatar="🤖"):
         st.markdown("Bot initialized.")
+        if not start_warmup().ready.is_set():
+            st.caption("Loading the models in the background, the first answers may take longer.")
 
     # Run the application
     main(st.session_state.bot)
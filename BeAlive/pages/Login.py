@@ -1,10 +1,10 @@
 import streamlit as st
+from BeAlive.data.connection import get_connection
 from BeAlive.pages.users_interact import UserDatabase
-import sqlite3
 
 
 # Database connection
-conn = sqlite3.connect("BeAlive/data/database/BeAlive.db")
+conn = get_connection()
 db = UserDatabase(conn)
 
 # Initialize session state
@@ -1,6 +1,6 @@
 import streamlit as st
 import datetime
-import sqlite3
+from BeAlive.data.connection import get_connection
 from BeAlive.pages.users_interact import UserDatabase
 import regex as re
 
@@ -20,7 +20,7 @@ def is_valid_email(email):
     return re.match(pattern, email) is not None
 
 
-conn = sqlite3.connect("BeAlive/data/database/BeAlive.db")
+conn = get_connection()
 db = UserDatabase(conn)
 
 st.markdown(
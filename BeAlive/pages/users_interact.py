@@ -1,4 +1,4 @@
-from pinecone import Pinecone
+from BeAlive.data.outbox import enqueue_delete, notify_outbox
 
 
 class UserDatabase:
@@ -142,6 +142,7 @@ class UserDatabase:
             self.conn.commit()
             return True
         except Exception:
+            self.conn.rollback()
             return False
         finally:
             cursor.close()
@@ -162,37 +163,37 @@ class UserDatabase:
         cursor = self.conn.cursor()
 
         try:
-            pinecone = Pinecone()
-            pinecone_index = pinecone.Index("activities")
-
             cursor.execute("SELECT activity_id FROM activities WHERE host_id = :user_id", {"user_id": user_id})
             activity_ids = [str(row[0]) for row in cursor.fetchall()]
 
             # Step 2: Delete reviews in review_user and review_activity linked to this user
             cursor.execute("DELETE FROM review_user WHERE user_id = :user_id or host_id = :host_id", {"user_id": user_id,
                                                                                                       "host_id": user_id})
-            self.conn.commit()
 
             cursor.execute("DELETE FROM review_activity WHERE user_id = :user_id", {"user_id": user_id})
-            self.conn.commit()
 
             # Step 3: Delete reservations linked to this user
             cursor.execute("DELETE FROM reservations WHERE user_id = :user_id or host_id = :host_id", {"user_id": user_id,
                                                                                                        "host_id": user_id})
-            self.conn.commit()
             # Step 4: Delete activities hosted by this user
             cursor.execute("DELETE FROM activities WHERE host_id = :user_id", {"user_id": user_id})
-            self.conn.commit()
-
-            if activity_ids:
-                pinecone_index.delete(ids=activity_ids)
 
             # Step 5: Finally, delete the user from the users table
             cursor.execute("DELETE FROM users WHERE user_id = :user_id", {"user_id": user_id})
+
+            # Step 6: Record the deletion of the Pinecone vectors
+            if activity_ids:
+                enqueue_delete(cursor, "activities", activity_ids)
+
+            # All the rows of the user are removed in a single transaction
             self.conn.commit()
 
+            if activity_ids:
+                notify_outbox()
+
             return True
         except Exception:
+            self.conn.rollback()
             return False
         finally:
             cursor.close()
@@ -331,5 +332,8 @@ class UserDatabase:
             cursor.execute(query, {**filtered_kwargs, "username": username})
             self.conn.commit()
             return cursor.rowcount > 0
+        except Exception:
+            self.conn.rollback()
+            raise
         finally:
             cursor.close()
@@ -0,0 +1,190 @@
+"""
+Benchmark of concurrent reservation accepts.
+
+Copies BeAlive.db to a temporary folder, creates an activity with a few
+places and many pending reservations, and accepts all of them at the same
+time from several threads. Reports the throughput, the latency percentiles
+and checks that the activity never goes over its maximum of participants.
+
+The legacy mode runs the statements used before accept_reservation (confirm,
+increment, read back, mark as full) for comparison.
+
+Usage:
+    python -m benchmarks.accept_reservations [--threads 16] [--reservations 400]
+                                             [--places 50] [--legacy]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.data.connection import db_cursor, get_connection
+from BeAlive.chatbot.services.reservations import accept_reservation
+
+
+def _seed(db_path: str, reservations: int, places: int):
+    """
+    Create a host, an open activity with the given places and a pending
+    reservation for each of the new users. Returns (activity_id, host_id,
+    user_ids).
+    """
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+
+    cursor.execute("""INSERT INTO users (username, password, email)
+                      VALUES ('bench_host', 'bench', 'bench_host@example.com')""")
+    host_id = cursor.lastrowid
+
+    cursor.execute("""INSERT INTO activities (host_id, activity_name,
+                      activity_description, location, max_participants, city,
+                      date_begin, date_finish)
+                      VALUES (?, 'Benchmark activity', 'Benchmark', 'Beach', ?,
+                      'Lisbon', '2100-01-01 10:00:00', '2100-01-01 12:00:00')""",
+                   (host_id, places))
+    activity_id = cursor.lastrowid
+
+    user_ids = []
+    for number in range(reservations):
+        cursor.execute("""INSERT INTO users (username, password, email)
+                          VALUES (?, 'bench', ?)""",
+                       (f"b{number}", f"bench_{number}@example.com"))
+        user_ids.append(cursor.lastrowid)
+
+    cursor.executemany("""INSERT INTO reservations (activity_id, host_id,
+                          user_id, message)
+                          VALUES (?, ?, ?, 'Benchmark')""",
+                       [(activity_id, host_id, user_id)
+                        for user_id in user_ids])
+
+    connection.commit()
+    connection.close()
+
+    return activity_id, host_id, user_ids
+
+
+def _legacy_accept(activity_id: int, host_id: int, user_id: int,
+                   db_path: str):
+    """
+    The statements used to accept a reservation before accept_reservation.
+    """
+    with db_cursor(db_path, commit=True) as cursor:
+        cursor.execute("""UPDATE reservations
+                            SET state = 'confirmed'
+                            WHERE activity_id = ? and user_id = ?""",
+                       (activity_id, user_id,))
+        cursor.execute("""UPDATE activities
+                            SET number_participants = number_participants + 1
+                            WHERE activity_id = ?""",
+                       (activity_id,))
+        cursor.execute("""SELECT number_participants, max_participants
+                            FROM activities
+                            WHERE activity_id = ?""",
+                       (activity_id,))
+        participants = cursor.fetchone()
+        if participants[0] == participants[1]:
+            cursor.execute("""UPDATE activities
+                            SET activity_state = 'full'
+                            WHERE activity_id = ?""",
+                           (activity_id,))
+
+
+def _percentile(values, percent: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(threads: int, reservations: int, places: int,
+        legacy: bool = False) -> dict:
+    """
+    Run the benchmark on a copy of the database and return the report.
+    """
+    folder = tempfile.mkdtemp(prefix="bealive_bench_")
+    db_path = os.path.join(folder, "BeAlive.db")
+    shutil.copy(get_sqlite_database_path(), db_path)
+
+    try:
+        activity_id, host_id, user_ids = _seed(db_path, reservations, places)
+        # Open the connection (and run the migrations) before the clock.
+        get_connection(db_path)
+
+        accept = _legacy_accept if legacy else accept_reservation
+        latencies = []
+        statuses = {}
+        errors = 0
+
+        def accept_one(user_id: int):
+            # Every worker thread uses its own connection.
+            start = time.perf_counter()
+            try:
+                result = accept(activity_id, host_id, user_id, db_path)
+                status = "accepted" if result is None else result.status
+            except sqlite3.Error:
+                status = "error"
+            return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for latency, status in executor.map(accept_one, user_ids):
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+                errors += status == "error"
+        elapsed = time.perf_counter() - start
+
+        with db_cursor(db_path) as cursor:
+            cursor.execute("""SELECT number_participants, max_participants,
+                                     activity_state
+                              FROM activities WHERE activity_id = ?""",
+                           (activity_id,))
+            participants, max_participants, state = cursor.fetchone()
+            cursor.execute("""SELECT COUNT(*) FROM reservations
+                              WHERE activity_id = ? AND state = 'confirmed'""",
+                           (activity_id,))
+            confirmed = cursor.fetchone()[0]
+
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        "mode": "legacy" if legacy else "accept_reservation",
+        "threads": threads,
+        "reservations": reservations,
+        "places": places,
+        "seconds": round(elapsed, 4),
+        "accepts_per_second": round(reservations / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 3),
+            "p50": round(_percentile(latencies, 50) * 1000, 3),
+            "p95": round(_percentile(latencies, 95) * 1000, 3),
+            "p99": round(_percentile(latencies, 99) * 1000, 3),
+        },
+        "statuses": statuses,
+        "errors": errors,
+        "number_participants": participants,
+        "confirmed_reservations": confirmed,
+        "activity_state": state,
+        "consistent": (participants == confirmed <= max_participants
+                       and (state == "full") == (participants >= max_participants)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--reservations", type=int, default=400)
+    parser.add_argument("--places", type=int, default=50)
+    parser.add_argument("--legacy", action="store_true",
+                        help="Run the statements used before accept_reservation.")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.threads, args.reservations, args.places,
+                         args.legacy), indent=2))
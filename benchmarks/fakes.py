@@ -0,0 +1,338 @@
+"""
+Deterministic local stand-ins for the OpenAI chat model and embeddings, the
+vector stores and the sentiment model, so the chatbot can be benchmarked
+offline. Each one sleeps a configurable latency per call, to simulate the
+network, and counts its calls in a CallLog.
+
+The chat model answers from the prompt: the JSON of the output schema of a
+PydanticOutputParser, filled with the values of the request being replayed,
+a call of the tool of the intent when tools are bound, and a short text
+otherwise.
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+from BeAlive.chatbot.services.sentiment import SentimentScorer
+from BeAlive.data.vector_store import LocalVectorStore
+
+# The tool called by the agents for every intent.
+INTENT_TOOLS = {
+    "review_user": "ReviewUsersTool",
+    "review_activity": "ReviewActivitesTools",
+    "make_reservation": "MakeActivityReservationTool",
+    "accept_reservation": "AcceptActivityReservationTool",
+    "reject_reservation": "RejectActivityReservationTool",
+    "check_reservations": "CheckActivityReservationTool",
+    "check_reviews": "CheckActivityReviewsTool",
+    "check_number_reservations": "CheckActivityNumberParticipantsTool",
+}
+
+# Words of the text answers of the chat model.
+_WORDS = ("BeAlive", "activity", "great", "people", "city", "weekend",
+          "outdoor", "friends", "adventure", "relax", "explore", "local")
+
+# The counts of the request being replayed, None outside of a request.
+_counts: ContextVar[Optional[Counter]] = ContextVar("bench_counts",
+                                                    default=None)
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"),
+                                          digest_size=8).digest(), "little")
+
+
+def _sleep(seconds: float):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the tokens of a text, about four characters per token.
+    """
+    return max(1, len(text) // 4) if text else 0
+
+
+class CallLog:
+    """
+    Counts the calls of the fakes and the SQL statements, by request.
+
+    The counts of the calls made inside scope() go to the counter of the
+    scope, the others (setup, background summaries) to background.
+
+    Attributes:
+    ----------
+        background : Counter
+            The counts of the calls made outside of a scope.
+
+    Methods:
+    -------
+        scope() -> Counter:
+            Context manager that counts the calls of the block.
+        record(**amounts):
+            Adds amounts to the counts of the current scope.
+    """
+
+    def __init__(self):
+        self.background = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def scope(self) -> Iterator[Counter]:
+        """
+        Counts the calls of the block, and of the threads that copy its
+        context, in a new counter.
+        """
+        counts = Counter()
+        token = _counts.set(counts)
+        try:
+            yield counts
+        finally:
+            _counts.reset(token)
+
+    def record(self, **amounts: int):
+        """
+        Adds amounts to the counts of the current scope.
+        """
+        counts = _counts.get()
+        with self._lock:
+            (self.background if counts is None else counts).update(amounts)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A chat model that answers without any network call.
+
+    Attributes:
+    ----------
+        log : CallLog
+            Where the calls and their estimated tokens are counted.
+        latency : float
+            The seconds slept by every call.
+        completion_words : int
+            The words of the text answers.
+        values : Dict[str, Any]
+            The values of the fields of the output schemas and of the tool
+            arguments, by name. "intent" selects the tool of the agents.
+        model_name : str
+            The name reported in the LLM output.
+    """
+
+    log: Any = Field(default_factory=CallLog)
+    latency: float = 0.0
+    completion_words: int = 30
+    values: Dict[str, Any] = Field(default_factory=dict)
+    model_name: str = "fake-chat"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        return self.bind(tools=[convert_to_openai_tool(tool)
+                                for tool in tools], **kwargs)
+
+    def _value(self, name: str, schema: dict):
+        """
+        The value of a field: from values, or a default of its type.
+        """
+        if name in self.values:
+            return self.values[name]
+
+        options = schema.get("anyOf", [schema])
+        if any(option.get("type") == "null" for option in options):
+            return None
+
+        schema = options[0]
+        if "enum" in schema:
+            return schema["enum"][0]
+        if schema.get("format") == "date-time":
+            return "2099-01-01T00:00:00"
+        return {"integer": 1, "number": 1.0, "boolean": False,
+                "array": [], "object": {}}.get(schema.get("type"),
+                                               "benchmark")
+
+    def _fill(self, schema: dict) -> dict:
+        return {name: self._value(name, field)
+                for name, field in schema.get("properties", {}).items()}
+
+    def _text(self, prompt: str) -> str:
+        seed = _digest(prompt)
+        return " ".join(_WORDS[(seed >> (4 * i)) % len(_WORDS)]
+                        for i in range(self.completion_words)) + "."
+
+    def _answer(self, messages: List[BaseMessage],
+                tools: Optional[List[dict]]) -> AIMessage:
+        prompt = "\n".join(str(message.content) for message in messages)
+
+        if tools and not any(isinstance(message, ToolMessage)
+                             for message in messages):
+            name = INTENT_TOOLS.get(self.values.get("intent"))
+            for tool in tools:
+                function = tool["function"]
+                if function["name"] == name:
+                    return AIMessage(content="", tool_calls=[{
+                        "name": name,
+                        "args": self._fill(function.get("parameters", {})),
+                        "id": f"call_{_digest(prompt) % 10 ** 8}"}])
+
+        marker = prompt.rfind("Here is the output schema:")
+        if marker != -1:
+            start = prompt.find("```", marker) + 3
+            end = prompt.find("```", start)
+            schema = json.loads(prompt[start:end])
+            return AIMessage(content=json.dumps(self._fill(schema),
+                                                default=str))
+
+        return AIMessage(content=self._text(prompt))
+
+    def _generate(self, messages: List[BaseMessage],
+                  stop: Optional[List[str]] = None, run_manager=None,
+                  tools: Optional[List[dict]] = None,
+                  **kwargs: Any) -> ChatResult:
+        _sleep(self.latency)
+        message = self._answer(messages, tools)
+
+        prompt_tokens = sum(estimate_tokens(str(message.content))
+                            for message in messages)
+        completion_tokens = estimate_tokens(
+            message.content or json.dumps(message.tool_calls, default=str))
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+        self.log.record(llm_calls=1, prompt_tokens=prompt_tokens,
+                        completion_tokens=completion_tokens)
+
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"model_name": self.model_name})
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Embeddings of the words of a text hashed into a fixed number of
+    dimensions, deterministic and normalized. Texts with words in common are
+    similar, enough for the retrievers and the router to behave.
+
+    Also callable with a list of texts, the interface of the encoder of the
+    LocalRouterChain.
+
+    Attributes:
+    ----------
+        log : CallLog
+            Where the calls and the embedded texts are counted.
+        latency : float
+            The seconds slept by every call.
+        dimensions : int
+            The size of the vectors.
+        name : str
+            The name of the encoder, part of the key of the router cache.
+    """
+
+    name = "hash-embeddings"
+
+    def __init__(self, log: CallLog, latency: float = 0.0,
+                 dimensions: int = 256):
+        self.log = log
+        self.latency = latency
+        self.dimensions = dimensions
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = _digest(word)
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _sleep(self.latency)
+        self.log.record(embedding_calls=1, embedded_texts=len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+
+class FakeVectorStore(LocalVectorStore):
+    """
+    A LocalVectorStore, in a temporary folder, that sleeps a latency per
+    search or write and counts them.
+
+    Attributes:
+    ----------
+        log : CallLog
+            Where the searches and writes are counted.
+        latency : float
+            The seconds slept by every search or write.
+    """
+
+    def __init__(self, index_name: str, embedding: Embeddings, path: str,
+                 log: CallLog, latency: float = 0.0):
+        super().__init__(index_name, embedding, path)
+        self.log = log
+        self.latency = latency
+
+    def similarity_search_by_vector_with_score(self, embedding, k: int = 4,
+                                               filter: Optional[dict] = None,
+                                               **kwargs: Any):
+        _sleep(self.latency)
+        self.log.record(vector_searches=1)
+        return super().similarity_search_by_vector_with_score(
+            embedding, k, filter, **kwargs)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs: Any):
+        _sleep(self.latency)
+        self.log.record(vector_writes=1)
+        return super().add_texts(texts, metadatas, ids, **kwargs)
+
+    def delete(self, ids=None, delete_all=None, **kwargs: Any):
+        _sleep(self.latency)
+        self.log.record(vector_writes=1)
+        return super().delete(ids, delete_all, **kwargs)
+
+
+class FakeSentimentScorer(SentimentScorer):
+    """
+    A sentiment scorer that returns a score derived from the hash of every
+    text, without loading a model.
+
+    Attributes:
+    ----------
+        log : CallLog
+            Where the calls are counted.
+        latency : float
+            The seconds slept by every call.
+    """
+
+    def __init__(self, log: CallLog, latency: float = 0.0):
+        super().__init__()
+        self.log = log
+        self.latency = latency
+
+    def score_batch(self, texts: Sequence[str]) -> List[float]:
+        if not texts:
+            return []
+
+        _sleep(self.latency)
+        self.log.record(sentiment_calls=1)
+        return [_digest(text) % 1000 / 999 for text in texts]
@@ -0,0 +1,182 @@
+"""
+Benchmark of the import time of the BeAlive modules, to catch cold start
+regressions.
+
+Imports every module in a fresh interpreter with `python -X importtime`,
+several times, and reports the median of the time spent importing it and
+its dependencies (the imports of the interpreter startup are excluded), the
+heaviest dependencies, and the heavy packages that were imported. A module
+fails when its median is over its budget or when it imports a package it
+must load lazily (torch, transformers, the OpenAI client, ...).
+
+The budgets are in milliseconds, for a warm disk cache. Use --scale on
+slower machines.
+
+Usage:
+    python -m benchmarks.import_time [--repeat 5] [--scale 1.0]
+                                     [module ...]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Packages no BeAlive module may import at import time, they are loaded on
+# their first use or by the warm-up.
+HEAVY = ("torch", "transformers", "sentence_transformers", "semantic_router",
+         "pymupdf", "fitz", "pinecone", "langchain_openai", "openai")
+
+# Also loaded lazily by the modules of the request path that do not need
+# LangChain or Streamlit themselves.
+FRAMEWORKS = ("langchain", "langchain_core", "langchain_community",
+              "streamlit", "numpy", "pandas")
+
+
+class ModuleBudget(NamedTuple):
+    """
+    The import budget of a module.
+
+    Attributes:
+    ----------
+        module : str
+            The name of the module.
+        budget_ms : float, optional
+            The maximum median import time, in milliseconds, None to only
+            check the forbidden packages.
+        forbidden : Tuple[str, ...]
+            The packages the module must not import.
+    """
+
+    module: str
+    budget_ms: Optional[float]
+    forbidden: Tuple[str, ...] = HEAVY
+
+
+# The budgets of the modules imported when a worker starts.
+BUDGETS: List[ModuleBudget] = [
+    ModuleBudget("BeAlive.data.tracing", 30, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.data.connection", 50, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.data.outbox", 60, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.llm", 30, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.session", 30, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.registry", 40, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.services.sentiment", 30, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.services.reviews", 60, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.services.lifecycle", 80,
+                 HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.services.warmup", 60, HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.services.bulk_import", 150,
+                 HEAVY + FRAMEWORKS),
+    ModuleBudget("BeAlive.chatbot.bot", 1500),
+    ModuleBudget("BeAlive.chatbot.tools.review_users", 2000),
+    ModuleBudget("BeAlive.chatbot.tools.review_activity", 2000),
+    ModuleBudget("BeAlive.chatbot.tools.make_reservation", 2000),
+]
+
+
+def _import_times(module: Optional[str]) -> Dict[str, Tuple[int, int, int]]:
+    """
+    Import a module in a fresh interpreter. Returns the (self, cumulative,
+    depth) microseconds of every imported module, the depth is 0 for the
+    modules imported directly.
+    """
+    code = f"import {module}" if module else "pass"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             capture_output=True, text=True)
+
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(own), int(cumulative), depth)
+
+    if process.returncode != 0:
+        error = process.stderr.strip().splitlines()
+        raise ImportError(error[-1] if error else f"Cannot import {module}")
+
+    return times
+
+
+def measure(budget: ModuleBudget, startup: set, repeat: int,
+            scale: float) -> dict:
+    """
+    Measure the import of a module against its budget.
+
+    Parameters:
+    ----------
+        budget : ModuleBudget
+            The module and its budget.
+        startup : set
+            The modules imported by the interpreter startup.
+        repeat : int
+            The number of fresh interpreters.
+        scale : float
+            The factor of the budget.
+
+    Returns:
+    -------
+        dict
+            The median, the budget, the heaviest dependencies, the
+            forbidden packages that were imported and whether it passed.
+    """
+    totals = []
+    try:
+        for _ in range(repeat):
+            times = _import_times(budget.module)
+            totals.append(sum(cumulative for name, (_, cumulative, depth)
+                              in times.items()
+                              if depth == 0 and name not in startup))
+    except ImportError as e:
+        return {"module": budget.module, "error": str(e), "passed": False}
+
+    # Of the last run, by their own time
+    heaviest = sorted(((name, own) for name, (own, _, _) in times.items()
+                       if name not in startup),
+                      key=lambda item: item[1], reverse=True)[:5]
+    imported = sorted({name.split(".")[0] for name in times}
+                      & set(budget.forbidden))
+
+    median_ms = statistics.median(totals) / 1000
+    budget_ms = (None if budget.budget_ms is None
+                 else round(budget.budget_ms * scale, 1))
+    return {"module": budget.module,
+            "median_ms": round(median_ms, 1),
+            "budget_ms": budget_ms,
+            "heaviest_ms": {name: round(own / 1000, 1)
+                            for name, own in heaviest},
+            "forbidden_imports": imported,
+            "passed": ((budget_ms is None or median_ms <= budget_ms)
+                       and not imported)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("modules", nargs="*",
+                        help="Only measure these modules.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Fresh interpreters per module.")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Factor of the budgets, for slower machines.")
+    args = parser.parse_args()
+
+    budgets = [budget for budget in BUDGETS
+               if not args.modules or budget.module in args.modules]
+    budgets += [ModuleBudget(module, None)
+                for module in args.modules
+                if module not in {budget.module for budget in BUDGETS}]
+
+    startup = set(_import_times(None))
+    results = [measure(budget, startup, args.repeat, args.scale)
+               for budget in budgets]
+
+    print(json.dumps({"python": sys.version.split()[0],
+                      "repeat": args.repeat,
+                      "modules": results,
+                      "failed": [result["module"] for result in results
+                                 if not result["passed"]]}, indent=2))
+
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
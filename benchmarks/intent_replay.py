@@ -0,0 +1,510 @@
+"""
+Offline benchmark of the chatbot pipeline, replaying the labelled messages
+of the router (BeAlive/chatbot/router/synthetic_intetions.json) through
+MainChatbot.process_user_input. The messages are split by intent with a
+seed: the router is built from the train split and only the held-out
+messages are replayed, so they are routed like new user inputs.
+
+Copies BeAlive.db to a temporary folder and seeds it with a user whose
+activities, reservations and reviews every intent can act on. The OpenAI
+chat model and embeddings, the vector stores and the sentiment model are
+replaced by the deterministic stand-ins of benchmarks/fakes.py, each with a
+configurable latency, so no network or model download is needed and two runs
+with the same arguments make the same calls.
+
+Reports the latency percentiles of every stage (local router, route
+extraction, intent handler, memory), the LLM, embedding, vector store and
+sentiment calls and the SQL statements per message of every intent, and the
+peak memory. The report is JSON, to compare runs over time. The fake chat
+model is given the label of every message, so the accuracy is only reported
+for the messages routed locally.
+
+Usage:
+    python -m benchmarks.intent_replay [--llm-latency 0.0]
+                                       [--embedding-latency 0.0]
+                                       [--vector-latency 0.0]
+                                       [--sentiment-latency 0.0]
+                                       [--session-turns 5] [--limit N]
+                                       [--test-size 0.25] [--seed 0]
+                                       [--trace-memory]
+                                       [--output report.json]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, List
+from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.data.connection import add_connect_hook
+from BeAlive.data.vector_store import set_vector_store
+from BeAlive.chatbot.llm import set_chat_model
+from BeAlive.chatbot.session import session_user
+from BeAlive.chatbot.services.sentiment import set_sentiment_scorer
+from BeAlive.chatbot.registry import COMPONENTS, ComponentRegistry
+from BeAlive.chatbot.bot import MainChatbot
+from BeAlive.chatbot.chains.local_router import (load_utterances,
+                                                 split_utterances)
+from benchmarks.fakes import (CallLog, FakeChatModel, FakeSentimentScorer,
+                              FakeVectorStore, HashEmbeddings)
+
+# The documents of the company information index.
+COMPANY_TEXTS = (
+    "BeAlive is a platform to find and host activities with people nearby.",
+    "Hosts create activities with a date, a place and a maximum of "
+    "participants, and accept or reject the reservations.",
+    "Participants reserve a spot with a message to the host and review the "
+    "activity once it finishes.",
+    "The chatbot searches activities, makes and manages reservations, and "
+    "collects the reviews of activities and participants.",
+    "Creating an account and joining activities is free, hosts pay no fee.",
+    "Contact the BeAlive support team through the webpage for any help "
+    "with your account or reservations.",
+)
+
+# The window of the open activities of the benchmark, the activity search
+# asks for it.
+SEARCH_CITY = "Lisbon"
+SEARCH_START = "2099-01-01 00:00:00"
+SEARCH_END = "2099-12-31 23:59:59"
+
+# The counters reported per message.
+COUNTS = ("llm_calls", "prompt_tokens", "completion_tokens",
+          "embedding_calls", "embedded_texts", "vector_searches",
+          "vector_writes", "sentiment_calls", "sql_statements")
+
+
+def _percentile(values, percent: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _latency_ms(values: List[float]) -> dict:
+    if not values:
+        return {}
+    return {"mean": round(statistics.mean(values) * 1000, 3),
+            "p50": round(_percentile(values, 50) * 1000, 3),
+            "p95": round(_percentile(values, 95) * 1000, 3),
+            "p99": round(_percentile(values, 99) * 1000, 3)}
+
+
+class Scenario:
+    """
+    The user of the replayed session and the values the fake chat model
+    extracts for every intent. Every message that changes the database gets
+    its own activity, reservation or participant, so the replay does not
+    depend on the order of the messages.
+
+    Attributes:
+    ----------
+        user_id : int
+            The user of the session, host and participant.
+        values : Dict[str, Iterator[dict]]
+            The values of every intent, in turn.
+    """
+
+    def __init__(self, user_id: int, values: Dict[str, List[dict]]):
+        self.user_id = user_id
+        self.values = {intent: itertools.cycle(items)
+                       for intent, items in values.items()}
+
+    def values_for(self, intent: str, message: str) -> dict:
+        """
+        The values of the next message of an intent.
+        """
+        values = {"intent": intent, "query": message,
+                  "review": "It was a great benchmark activity",
+                  "rating": 4, "message": "Benchmark reservation",
+                  "city": SEARCH_CITY,
+                  "date_range_start": SEARCH_START.replace(" ", "T"),
+                  "date_range_end": SEARCH_END.replace(" ", "T"),
+                  "host_id": self.user_id}
+        values.update(next(self.values.get(intent, iter([{}])), {}))
+        return values
+
+
+def _seed(db_path: str, counts: Counter) -> Scenario:
+    """
+    Create the user of the session, another host, and the activities,
+    reservations and reviews used by the messages of every intent.
+    """
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+
+    def user(username: str) -> int:
+        cursor.execute("""INSERT INTO users (username, password, email,
+                          birthday, location, interests)
+                          VALUES (?, 'bench', ?, '1990-01-01', ?,
+                          'hiking, surf, music')""",
+                       (username, f"{username}@bench.example", SEARCH_CITY))
+        return cursor.lastrowid
+
+    def activity(host_id: int, name: str, state: str, begin: str,
+                 finish: str) -> int:
+        cursor.execute("""INSERT INTO activities (host_id, activity_name,
+                          activity_description, location, max_participants,
+                          city, date_begin, date_finish, activity_state)
+                          VALUES (?, ?, 'Benchmark activity by the sea',
+                          'Beach', 500, ?, ?, ?, ?)""",
+                       (host_id, name, SEARCH_CITY, begin, finish, state))
+        activity_id = cursor.lastrowid
+        cursor.execute("""UPDATE activities SET pinecone_id = ?
+                          WHERE activity_id = ?""", (activity_id, activity_id))
+        return activity_id
+
+    def reserve(activity_id: int, host_id: int, user_id: int, state: str):
+        cursor.execute("""INSERT INTO reservations (activity_id, host_id,
+                          user_id, message, state)
+                          VALUES (?, ?, ?, 'Benchmark', ?)""",
+                       (activity_id, host_id, user_id, state))
+
+    open_dates = ("2099-06-01 10:00:00", "2099-06-01 12:00:00")
+    finished_dates = ("2000-01-01 10:00:00", "2000-01-01 12:00:00")
+
+    me = user("bench_me")
+    other = user("bench_host")
+    values: Dict[str, List[dict]] = defaultdict(list)
+
+    # Pending reservations of an activity of the user, to accept or reject
+    hike = activity(me, "Bench hike", "open", *open_dates)
+    for number in range(max(1, counts["accept_reservation"]
+                            + counts["reject_reservation"])):
+        username = f"bp{number:04d}"
+        user_id = user(username)
+        reserve(hike, me, user_id, "pending")
+        intent = ("accept_reservation"
+                  if number < counts["accept_reservation"]
+                  else "reject_reservation")
+        values[intent].append({"activity_name": "Bench hike",
+                               "username": username, "user": username,
+                               "activity_id": hike, "user_id": user_id})
+
+    # A finished activity of the user, with participants to review
+    surf = activity(me, "Bench surf", "finished", *finished_dates)
+    for number in range(max(1, counts["review_user"])):
+        username = f"bc{number:04d}"
+        user_id = user(username)
+        reserve(surf, me, user_id, "confirmed")
+        cursor.execute("""INSERT INTO review_activity (activity_id, user_id,
+                          review, rating)
+                          VALUES (?, ?, 'Great benchmark', 5)""",
+                       (surf, user_id))
+        values["review_user"].append({"activity_name": "Bench surf",
+                                      "username": username, "user": username,
+                                      "activity_id": surf,
+                                      "user_id": user_id})
+
+    for intent, name, activity_id in (
+            ("check_reservations", "Bench hike", hike),
+            ("check_number_reservations", "Bench hike", hike),
+            ("check_reviews", "Bench surf", surf)):
+        values[intent].append({"activity_name": name, "user_input": name,
+                               "activity_id": activity_id})
+
+    # Activities of the user to delete
+    for number in range(counts["delete_activities"]):
+        name = f"Bench del {number:04d}"
+        values["delete_activities"].append(
+            {"activity_name": name,
+             "activity_id": activity(me, name, "open", *open_dates)})
+
+    # Finished activities of another host the user took part in, to review
+    for number in range(counts["review_activity"]):
+        name = f"Bench rev {number:04d}"
+        activity_id = activity(other, name, "finished", *finished_dates)
+        reserve(activity_id, other, me, "confirmed")
+        values["review_activity"].append({"activity_name": name,
+                                          "activity_id": activity_id})
+
+    # Open activities of another host, to reserve and to search
+    for number in range(max(3, counts["make_reservation"])):
+        name = f"Bench join {number:04d}"
+        activity_id = activity(other, name, "open", *open_dates)
+        if number < counts["make_reservation"]:
+            values["make_reservation"].append({"activity_name": name,
+                                               "activity_id": activity_id})
+
+    connection.commit()
+    connection.close()
+
+    return Scenario(me, values)
+
+
+def _fill_indexes(db_path: str, embeddings: HashEmbeddings, path: str,
+                  log: CallLog, latency: float):
+    """
+    Create the fake vector stores of the activities and the company
+    information, and use them instead of Pinecone.
+    """
+    connection = sqlite3.connect(db_path)
+    rows = connection.execute("""SELECT activity_id, activity_name,
+                                 activity_description, city
+                                 FROM activities
+                                 WHERE activity_state = 'open'""").fetchall()
+    connection.close()
+
+    activities = FakeVectorStore("activities", embeddings, path, log, latency)
+    activities.add_texts([f"{name}. {description} in {city}"
+                          for _, name, description, city in rows],
+                         [{"pinecone_id": str(activity_id)}
+                          for activity_id, _, _, _ in rows],
+                         [str(activity_id) for activity_id, _, _, _ in rows])
+    set_vector_store("activities", activities)
+
+    company = FakeVectorStore("company-info-rag", embeddings, path, log,
+                              latency)
+    company.add_texts(list(COMPANY_TEXTS))
+    set_vector_store("company-info-rag", company)
+
+
+def _timed(stage: str, function, stages: Counter):
+    """
+    Wrap a function to add its seconds to a stage of the current message.
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            stages[stage] += time.perf_counter() - start
+    return wrapper
+
+
+def _recorded(function, results: List):
+    """
+    Wrap a function to append its results to a list.
+    """
+    def wrapper(*args, **kwargs):
+        result = function(*args, **kwargs)
+        results.append(result)
+        return result
+    return wrapper
+
+
+def run(llm_latency: float = 0.0, embedding_latency: float = 0.0,
+        vector_latency: float = 0.0, sentiment_latency: float = 0.0,
+        session_turns: int = 5, limit: int = None, test_size: float = 0.25,
+        seed: int = 0, trace_memory: bool = False) -> dict:
+    """
+    Run the benchmark on a copy of the database and return the report.
+    """
+    # The router is built from the train split, the held-out messages are
+    # replayed in a random order
+    train, (messages, labels) = split_utterances(*load_utterances(),
+                                                 test_size, seed)
+    items = list(zip(messages, labels))
+    random.Random(seed).shuffle(items)
+    items = items[:limit] if limit else items
+    labels = [label for _, label in items]
+
+    folder = tempfile.mkdtemp(prefix="bealive_bench_")
+    db_path = os.path.join(folder, "BeAlive.db")
+    shutil.copy(get_sqlite_database_path(), db_path)
+
+    # Read by the chains and tools, the chain modules are only imported by
+    # the registry, after this. The deleted vectors stay in the outbox.
+    os.environ["BEALIVE_DB_PATH"] = db_path
+    os.environ["BEALIVE_OUTBOX_WORKER"] = "0"
+
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        scenario = _seed(db_path, Counter(labels))
+
+        log = CallLog()
+        add_connect_hook(lambda connection: connection.set_trace_callback(
+            lambda statement: log.record(sql_statements=1)))
+
+        start = time.perf_counter()
+        llm = FakeChatModel(log=log, latency=llm_latency)
+        embeddings = HashEmbeddings(log, embedding_latency)
+        set_chat_model(llm)
+        set_sentiment_scorer(FakeSentimentScorer(log, sentiment_latency))
+        _fill_indexes(db_path, embeddings, os.path.join(folder, "vectors"),
+                      log, vector_latency)
+
+        specs = dict(COMPONENTS)
+        specs["router"] = specs["router"]._replace(
+            kwargs={"encoder": embeddings, "cache_dir": None,
+                    "utterances": train})
+        registry = ComponentRegistry(llm=llm, specs=specs)
+        for name in specs:
+            registry.get(name)
+        build_seconds = time.perf_counter() - start
+        log.background.clear()
+
+        # Times of the stages of the current message
+        stages = Counter()
+        routes: List[dict] = []
+        router = registry.get("router")
+        router.route = _timed("router", _recorded(router.route, routes),
+                              stages)
+        route_extract = registry.get("route_extract")
+        route_extract.invoke = _timed("route_extract", route_extract.invoke,
+                                      stages)
+
+        bots = []
+        results = []
+        start = time.perf_counter()
+        with session_user(scenario.user_id):
+            for number, (message, label) in enumerate(items):
+                if number % session_turns == 0:
+                    bot = MainChatbot(registry=registry)
+                    bot.intent_handlers = {
+                        intent: _timed("handler", handler, stages)
+                        for intent, handler in bot.intent_handlers.items()}
+                    bots.append(bot)
+
+                llm.values = scenario.values_for(label, message)
+                stages.clear()
+                routes.clear()
+                error = None
+                with log.scope() as counts:
+                    message_start = time.perf_counter()
+                    try:
+                        response = bot.process_user_input(
+                            {"user_input": message})
+                    except Exception as e:
+                        response, error = "", type(e).__name__
+                    stages["total"] = time.perf_counter() - message_start
+
+                    memory_start = time.perf_counter()
+                    bot.add_messages_memory(message, str(response))
+                    stages["memory"] = time.perf_counter() - memory_start
+
+                route = routes[-1] if routes else {}
+                results.append({"intent": label,
+                                "route": route.get("source"),
+                                "routed": route.get("intent"),
+                                "stages": dict(stages),
+                                "counts": dict(counts),
+                                "error": error})
+
+        for bot in bots:
+            bot.summary_memory.wait()
+        replay_seconds = time.perf_counter() - start
+
+        # Hit rate and saved latency of the answers of company_information
+        answer_cache = registry.get("company_information").answer_cache
+        cache_stats = (answer_cache.stats() if answer_cache is not None
+                       else None)
+
+        python_peak = (tracemalloc.get_traced_memory()[1]
+                       if trace_memory else None)
+
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        shutil.rmtree(folder, ignore_errors=True)
+
+    by_intent = defaultdict(list)
+    for result in results:
+        by_intent[result["intent"]].append(result)
+
+    def summary(group: List[dict]) -> dict:
+        # The other messages are classified by the fake chat model, which is
+        # given their label
+        local = [result["routed"] == result["intent"] for result in group
+                 if result["route"] == "local"]
+        return {
+            "messages": len(group),
+            "errors": sum(1 for result in group if result["error"]),
+            "routed_locally": len(local),
+            "local_accuracy": (round(sum(local) / len(local), 3) if local
+                               else None),
+            "latency_ms": {stage: _latency_ms(
+                [result["stages"].get(stage, 0.0) for result in group])
+                for stage in ("router", "route_extract", "handler",
+                              "memory", "total")},
+            "per_message": {count: round(statistics.mean(
+                result["counts"].get(count, 0) for result in group), 2)
+                for count in COUNTS},
+        }
+
+    try:
+        import resource
+        # Kilobytes on Linux, bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss_mb = peak_rss / (1024 ** 2 if sys.platform == "darwin"
+                                  else 1024)
+    except ImportError:
+        peak_rss_mb = None
+
+    return {
+        "python": sys.version.split()[0],
+        "seed": seed,
+        "test_size": test_size,
+        "router_messages": len(train[0]),
+        "latency_s": {"llm": llm_latency, "embedding": embedding_latency,
+                      "vector": vector_latency,
+                      "sentiment": sentiment_latency},
+        "messages": len(results),
+        "sessions": len(bots),
+        "build_seconds": round(build_seconds, 3),
+        "replay_seconds": round(replay_seconds, 3),
+        "messages_per_second": round(len(results) / replay_seconds, 2),
+        "overall": summary(results),
+        "intents": {intent: summary(group)
+                    for intent, group in sorted(by_intent.items())},
+        "totals": {count: sum(result["counts"].get(count, 0)
+                              for result in results) for count in COUNTS},
+        "background": {count: log.background.get(count, 0)
+                       for count in COUNTS},
+        "answer_cache": cache_stats,
+        "memory": {"peak_rss_mb": (round(peak_rss_mb, 1)
+                                   if peak_rss_mb is not None else None),
+                   "python_peak_mb": (round(python_peak / 1024 ** 2, 1)
+                                      if python_peak is not None else None)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds of every chat model call.")
+    parser.add_argument("--embedding-latency", type=float, default=0.0,
+                        help="Seconds of every embedding call.")
+    parser.add_argument("--vector-latency", type=float, default=0.0,
+                        help="Seconds of every vector search or write.")
+    parser.add_argument("--sentiment-latency", type=float, default=0.0,
+                        help="Seconds of every sentiment call.")
+    parser.add_argument("--session-turns", type=int, default=5,
+                        help="Messages of every chat session.")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Only replay the first messages.")
+    parser.add_argument("--test-size", type=float, default=0.25,
+                        help="Share of the messages of every intent held "
+                             "out of the router and replayed.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the split and of the order of the "
+                             "messages.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report the peak of the Python heap "
+                             "(tracemalloc, slows the replay down).")
+    parser.add_argument("--output", help="Also write the report to a file.")
+    args = parser.parse_args()
+
+    report = run(args.llm_latency, args.embedding_latency,
+                 args.vector_latency, args.sentiment_latency,
+                 args.session_turns, args.limit, args.test_size, args.seed,
+                 args.trace_memory)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    print(text)
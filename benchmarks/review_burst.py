@@ -0,0 +1,179 @@
+"""
+Benchmark of a burst of reviews after popular activities finish.
+
+Copies BeAlive.db to a temporary folder, creates finished activities with
+many confirmed participants, and saves at the same time, from several
+threads, the review of every participant about its activity and the review
+of the host about every participant. Reports the throughput, the latency
+percentiles and checks that every review was saved exactly once.
+
+The sentiment scores are random, the benchmark measures the database work
+of save_activity_review and save_user_review.
+
+Usage:
+    python -m benchmarks.review_burst [--threads 16] [--activities 20]
+                                      [--participants 20]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from BeAlive.data.loader import get_sqlite_database_path
+from BeAlive.data.connection import db_cursor, get_connection
+from BeAlive.chatbot.services.reviews import (save_activity_review,
+                                              save_user_review)
+
+
+def _seed(db_path: str, activities: int, participants: int) -> list:
+    """
+    Create finished activities, each with its own host and confirmed
+    participants. Returns the (host_id, activity_id, user_id) of every
+    reservation.
+    """
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+
+    reservations = []
+    for activity in range(activities):
+        cursor.execute("""INSERT INTO users (username, password, email)
+                          VALUES (?, 'bench', ?)""",
+                       (f"h{activity}", f"bench_h{activity}@example.com"))
+        host_id = cursor.lastrowid
+
+        cursor.execute("""INSERT INTO activities (host_id, activity_name,
+                          activity_description, location, number_participants,
+                          max_participants, city, date_begin, date_finish,
+                          activity_state)
+                          VALUES (?, ?, 'Benchmark', 'Beach', ?, ?, 'Lisbon',
+                          '2000-01-01 10:00:00', '2000-01-01 12:00:00',
+                          'finished')""",
+                       (host_id, f"Benchmark {activity}", participants,
+                        participants))
+        activity_id = cursor.lastrowid
+
+        for participant in range(participants):
+            cursor.execute("""INSERT INTO users (username, password, email)
+                              VALUES (?, 'bench', ?)""",
+                           (f"u{activity}_{participant}",
+                            f"bench_u{activity}_{participant}@example.com"))
+            user_id = cursor.lastrowid
+            cursor.execute("""INSERT INTO reservations (activity_id, host_id,
+                              user_id, message, state)
+                              VALUES (?, ?, ?, 'Benchmark', 'confirmed')""",
+                           (activity_id, host_id, user_id))
+            reservations.append((host_id, activity_id, user_id))
+
+    connection.commit()
+    connection.close()
+
+    return reservations
+
+
+def _percentile(values, percent: float) -> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(threads: int, activities: int, participants: int,
+        seed: int = 0) -> dict:
+    """
+    Run the benchmark on a copy of the database and return the report.
+    """
+    folder = tempfile.mkdtemp(prefix="bealive_bench_")
+    db_path = os.path.join(folder, "BeAlive.db")
+    shutil.copy(get_sqlite_database_path(), db_path)
+
+    generator = random.Random(seed)
+
+    try:
+        reservations = _seed(db_path, activities, participants)
+        # Open the connection (and run the migrations) before the clock.
+        get_connection(db_path)
+
+        tasks = []
+        for host_id, activity_id, user_id in reservations:
+            tasks.append((save_activity_review,
+                          (activity_id, user_id, "Great activity!",
+                           generator.choice([-1, 1, 2, 3, 4, 5]),
+                           generator.random(), db_path)))
+            tasks.append((save_user_review,
+                          (host_id, activity_id, user_id, "Great participant!",
+                           generator.choice([-1, 1, 2, 3, 4, 5]),
+                           generator.random(), db_path)))
+        generator.shuffle(tasks)
+
+        def save_one(task):
+            # Every worker thread uses its own connection.
+            function, arguments = task
+            start = time.perf_counter()
+            try:
+                status = function(*arguments).status
+            except sqlite3.Error:
+                status = "error"
+            return time.perf_counter() - start, status
+
+        latencies = []
+        statuses = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for latency, status in executor.map(save_one, tasks):
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+        elapsed = time.perf_counter() - start
+
+        with db_cursor(db_path) as cursor:
+            cursor.execute("""SELECT COUNT(*) FROM review_activity ra
+                              JOIN activities a
+                                  ON a.activity_id = ra.activity_id
+                              WHERE a.activity_name LIKE 'Benchmark %'""")
+            activity_reviews = cursor.fetchone()[0]
+            cursor.execute("""SELECT COUNT(*) FROM review_user ru
+                              JOIN activities a
+                                  ON a.activity_id = ru.activity_id
+                              WHERE a.activity_name LIKE 'Benchmark %'""")
+            user_reviews = cursor.fetchone()[0]
+
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        "threads": threads,
+        "activities": activities,
+        "participants": participants,
+        "reviews": len(tasks),
+        "seconds": round(elapsed, 4),
+        "reviews_per_second": round(len(tasks) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 3),
+            "p50": round(_percentile(latencies, 50) * 1000, 3),
+            "p95": round(_percentile(latencies, 95) * 1000, 3),
+            "p99": round(_percentile(latencies, 99) * 1000, 3),
+        },
+        "statuses": statuses,
+        "activity_reviews": activity_reviews,
+        "user_reviews": user_reviews,
+        "consistent": activity_reviews == user_reviews == len(reservations),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--activities", type=int, default=20)
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.threads, args.activities, args.participants,
+                         args.seed), indent=2))
@@ -0,0 +1,44 @@
+from BeAlive.chatbot.resolvers.activity_index import ActivityNameIndex
+
+# Nested names of BeAlive.db: a name and the longer names that start with it.
+ACTIVITIES = [
+    (28, "Photography Walk"),
+    (7, "Photography Walk: Capture the City"),
+    (17, "Photography Walk: Urban Exploration"),
+    (26, "Art Workshop"),
+    (19, "Art Workshop: Creative Painting"),
+    (48, "Ocean Kayaking Adventure"),
+]
+
+
+def test_exact_name_of_a_nested_pair():
+    index = ActivityNameIndex(ACTIVITIES)
+
+    assert index.resolve("Photography Walk").id == 28
+    assert index.resolve("Photography Walk: Capture the City").id == 7
+    assert index.resolve("Art Workshop").id == 26
+
+
+def test_contained_name_without_words_of_a_longer_name():
+    index = ActivityNameIndex(ACTIVITIES)
+
+    assert index.resolve("I want to join the Photography Walk").id == 28
+    assert index.resolve("Activity name: Ocean Kayaking").id == 48
+
+
+def test_partial_longer_name_is_not_resolved_to_its_prefix():
+    index = ActivityNameIndex(ACTIVITIES)
+
+    for query, longer_id, prefix_id in (
+            ("Photography Walk: Capture", 7, 28),
+            ("Art Workshop creative", 19, 26),
+            ("Photography Walk urban", 17, 28)):
+        match = index.resolve(query)
+        assert match.id != prefix_id
+        if match.status == "ambiguous":
+            # Left to the GetActivityIDChain, with the longer name as a
+            # candidate
+            assert longer_id in [candidate[0]
+                                 for candidate in match.candidates]
+        else:
+            assert match.id == longer_id